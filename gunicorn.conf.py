@@ -0,0 +1,25 @@
+"""
+Configuração do gunicorn (lida pelo Procfile e pelo render.yaml)
+"""
+import os
+
+# Worker com threads: o stream de progresso (/api/analise/progresso, SSE)
+# ocupa uma thread enquanto a análise roda, e não o worker inteiro como no
+# worker sync; as análises de /iniciar rodam em threads do próprio worker
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+# No gthread o timeout só derruba um worker travado: o laço principal segue
+# avisando o master enquanto as threads atendem uploads e streams longos
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 10000)}"
+
+
+def worker_exit(server, worker):
+    # Análises de /iniciar ainda em andamento morrem com o worker: avisa quem acompanha
+    from src.services.progresso import interromper_em_andamento
+    interromper_em_andamento()
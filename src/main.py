@@ -6,6 +6,8 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from src.models.user import db
+from src.models.analise import Analise, MetricaFornecedor, MetricaFilial, MetricaFaixaValor
+from src.models.sessao import SessaoAprovacao, ItemSessao, TotalGrupoSessao
 from src.routes.user import user_bp
 from src.routes.analise import analise_bp
 
@@ -0,0 +1,100 @@
+from sqlalchemy.orm import declared_attr
+from src.models.user import db
+
+
+class Analise(db.Model):
+    """
+    Uma análise processada, com as métricas gerais
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(120), unique=True, nullable=False)
+    data = db.Column(db.DateTime, nullable=False, index=True)
+    modo = db.Column(db.String(20))
+    total_itens = db.Column(db.Integer, nullable=False)
+    total_fornecedores = db.Column(db.Integer, nullable=False)
+    total_filiais = db.Column(db.Integer, nullable=False)
+    valor_total = db.Column(db.Float, nullable=False)
+    cobertura_media = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f'<Analise {self.nome}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'nome': self.nome,
+            'data': self.data.isoformat(),
+            'modo': self.modo,
+            'total_itens': self.total_itens,
+            'total_fornecedores': self.total_fornecedores,
+            'total_filiais': self.total_filiais,
+            'valor_total': self.valor_total,
+            'cobertura_media': self.cobertura_media
+        }
+
+
+class MetricasCobertura:
+    """
+    Colunas comuns às métricas de um grupo em uma análise. As somas e
+    contagens permitem recombinar grupos de várias análises; `data` repete
+    a data da análise para os índices por grupo e data.
+    """
+
+    @declared_attr
+    def analise_id(cls):
+        return db.Column(db.Integer, db.ForeignKey('analise.id', ondelete='CASCADE'), nullable=False, index=True)
+
+    id = db.Column(db.Integer, primary_key=True)
+    data = db.Column(db.DateTime, nullable=False)
+    itens = db.Column(db.Integer, nullable=False)
+    soma_cobertura = db.Column(db.Float, nullable=False)
+    valor = db.Column(db.Float, nullable=False)
+    cobertura_media = db.Column(db.Float, nullable=False)
+    recomendacao = db.Column(db.String(20))
+
+    def to_dict(self):
+        return {coluna.name: getattr(self, coluna.name) for coluna in self.__table__.columns}
+
+
+class MetricasFaixasCobertura(MetricasCobertura):
+    """
+    Distribuição por faixa de cobertura e quantis (fornecedores e filiais)
+    """
+    ate_44 = db.Column(db.Integer, nullable=False)
+    entre_45_70 = db.Column(db.Integer, nullable=False)
+    acima_71 = db.Column(db.Integer, nullable=False)
+    p50 = db.Column(db.Float)
+    p90 = db.Column(db.Float)
+    p99 = db.Column(db.Float)
+
+
+class MetricaFornecedor(MetricasFaixasCobertura, db.Model):
+    fornecedor = db.Column(db.String(255), nullable=False)
+    total_cargas = db.Column(db.Integer)
+    total_pedidos = db.Column(db.Integer)
+    total_codigos = db.Column(db.Integer)
+    filiais = db.Column(db.Integer)
+
+    __table_args__ = (db.Index('ix_metrica_fornecedor_fornecedor_data', 'fornecedor', 'data'),)
+
+    def __repr__(self):
+        return f'<MetricaFornecedor {self.fornecedor} {self.data}>'
+
+
+class MetricaFilial(MetricasFaixasCobertura, db.Model):
+    filial = db.Column(db.String(255), nullable=False)
+
+    __table_args__ = (db.Index('ix_metrica_filial_filial_data', 'filial', 'data'),)
+
+    def __repr__(self):
+        return f'<MetricaFilial {self.filial} {self.data}>'
+
+
+class MetricaFaixaValor(MetricasCobertura, db.Model):
+    faixa = db.Column(db.Integer, nullable=False)
+    nome_faixa = db.Column(db.String(80), nullable=False)
+
+    __table_args__ = (db.Index('ix_metrica_faixa_valor_faixa_data', 'faixa', 'data'),)
+
+    def __repr__(self):
+        return f'<MetricaFaixaValor {self.nome_faixa} {self.data}>'
@@ -0,0 +1,108 @@
+from sqlalchemy.orm import declared_attr
+from src.models.user import db
+from src.services.regras import APROVAR, REVISAR, REJEITAR
+
+# Decisões acompanhadas nos totais da sessão (as mesmas das recomendações)
+DECISOES_SESSAO = [APROVAR, REVISAR, REJEITAR]
+
+
+class TotaisDecisao:
+    """
+    Itens e saldo por decisão, ajustados a cada mudança de decisão de um
+    item (sem recalcular a partir dos itens)
+    """
+    itens_aprovar = db.Column(db.Integer, nullable=False, default=0)
+    valor_aprovar = db.Column(db.Float, nullable=False, default=0.0)
+    itens_revisar = db.Column(db.Integer, nullable=False, default=0)
+    valor_revisar = db.Column(db.Float, nullable=False, default=0.0)
+    itens_rejeitar = db.Column(db.Integer, nullable=False, default=0)
+    valor_rejeitar = db.Column(db.Float, nullable=False, default=0.0)
+
+    def totais(self):
+        return {
+            decisao: {'itens': getattr(self, f'itens_{decisao}'), 'valor': getattr(self, f'valor_{decisao}')}
+            for decisao in DECISOES_SESSAO
+        }
+
+
+class SessaoAprovacao(TotaisDecisao, db.Model):
+    """
+    Sessão de aprovação sobre uma análise salva; a economia potencial é o
+    saldo dos itens rejeitados
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    analise = db.Column(db.String(120), nullable=False, index=True)
+    criada = db.Column(db.DateTime, nullable=False)
+    atualizada = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<SessaoAprovacao {self.id} {self.analise}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'analise': self.analise,
+            'criada': self.criada.isoformat(),
+            'atualizada': self.atualizada.isoformat(),
+            'totais': self.totais(),
+            'economia_potencial': self.valor_rejeitar
+        }
+
+
+class MembroSessao:
+    """
+    Coluna de ligação com a sessão (removida junto com ela)
+    """
+
+    @declared_attr
+    def sessao_id(cls):
+        return db.Column(
+            db.Integer, db.ForeignKey('sessao_aprovacao.id', ondelete='CASCADE'), nullable=False, index=True
+        )
+
+
+class ItemSessao(MembroSessao, db.Model):
+    """
+    Item da agenda com a decisão atual do comprador
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    posicao = db.Column(db.Integer, nullable=False)
+    carga = db.Column(db.String(60))
+    pedido = db.Column(db.String(60))
+    codigo = db.Column(db.String(60))
+    fornecedor = db.Column(db.String(255), nullable=False)
+    filial = db.Column(db.String(255), nullable=False)
+    mercadoria = db.Column(db.String(255))
+    faixa = db.Column(db.Integer, nullable=False)
+    saldo = db.Column(db.Float, nullable=False)
+    cobertura = db.Column(db.Float, nullable=False)
+    decisao = db.Column(db.String(20), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_item_sessao_sessao_fornecedor', 'sessao_id', 'fornecedor'),
+        db.Index('ix_item_sessao_sessao_decisao', 'sessao_id', 'decisao'),
+    )
+
+    def __repr__(self):
+        return f'<ItemSessao {self.id} {self.decisao}>'
+
+    def to_dict(self):
+        return {coluna.name: getattr(self, coluna.name) for coluna in self.__table__.columns}
+
+
+class TotalGrupoSessao(TotaisDecisao, MembroSessao, db.Model):
+    """
+    Totais por decisão de um fornecedor, filial ou faixa de valor na sessão
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(20), nullable=False)
+    grupo = db.Column(db.String(255), nullable=False)
+
+    __table_args__ = (db.Index('ix_total_grupo_sessao_grupo', 'sessao_id', 'tipo', 'grupo', unique=True),)
+
+    def __repr__(self):
+        return f'<TotalGrupoSessao {self.tipo} {self.grupo}>'
+
+    def to_dict(self):
+        return {'tipo': self.tipo, 'grupo': self.grupo, 'totais': self.totais(),
+                'economia_potencial': self.valor_rejeitar}
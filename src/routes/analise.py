@@ -2,17 +2,126 @@ import os
 import pandas as pd
 import numpy as np
 from datetime import datetime
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, Response, stream_with_context, current_app
 from werkzeug.utils import secure_filename
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 import tempfile
+import threading
+import json
+import uuid
 import io
+from src.services.agregados import (
+    AgregadosParciais, FAIXAS_VALOR, combinar_agregados, primeiras_linhas, mesclar_primeiras
+)
+from src.services.detalhes import (
+    COLUNAS_DETALHE, DetalhesMemoria, DetalhesEmDisco, DetalhesOrdenados, separar_por_fornecedor,
+    selecionar_posicoes, dataframe_detalhes
+)
+from src.services.paralelo import PROCESSOS_PADRAO, agregar_por_filial, mapear_em_ordem, pool_processos
+from src.services.pacote import compactar_em_fluxo
+from src.services.planilha import criar_planilha
+from src.services.modelos import (
+    ESTILO_TEXTO, ESTILO_TITULO_RESUMO, ESTILO_SECAO_RESUMO, ESTILO_SECAO_FILIAL, ESTILO_SECAO_FAIXA,
+    ESTILO_SUBCABECALHO, ESTILO_TOTAL, ESTILOS_RECOMENDACAO, ESTILOS_RECOMENDACAO_CENTRO,
+    ESTILOS_RECOMENDACAO_ESQUERDA, ESTILOS_RECOMENDACAO_DESTAQUE, ESTILOS_RECOMENDACAO_DETALHAMENTO,
+    MODELO_RESUMO_EXECUTIVO, MODELO_ANALISE_FORNECEDOR, MODELO_DETALHES_MERCADORIA, MODELO_FAIXAS_FILIAL,
+    MODELO_FAIXAS_FORNECEDOR_FILIAL, MODELO_DISTRIBUICAO_VALOR, MODELO_RESUMO_FORNECEDOR,
+    MODELO_FILIAIS_FORNECEDOR, MODELO_ALTERACOES, ESTILOS_SITUACAO, CABECALHOS_DETALHAMENTO_FILIAL,
+    CABECALHOS_DETALHAMENTO_FAIXA, MODELO_RESUMO_SESSAO, MODELO_SESSAO_FORNECEDOR, MODELO_SESSAO_FILIAL,
+    MODELO_SESSAO_FAIXA, MODELO_ITENS_SESSAO, MODELO_CONCILIACAO, ESTILOS_CONCILIACAO, MODELO_QUALIDADE,
+    ESTILOS_QUALIDADE, MODELO_ARQUIVOS
+)
+from src.services.quantis import QUANTIS_COBERTURA
+from src.services.distintos import CONTAGEM_EXATA, CONTAGEM_APROXIMADA
+from src.services.leitura import (
+    TAMANHO_LOTE_PADRAO, EXTENSOES_EM_FLUXO, PARQUET_DISPONIVEL, AgendaInvalida, extensao_arquivo, verificar_agenda,
+    ler_agenda_em_lotes, filtrar_aprovacao, limpar_agenda, linhas_descartadas
+)
+from src.services.backends import obter_backend
+from src.services.admissao import CapacidadeEsgotada, estimar_memoria, reservar_memoria
+from src.services.coalescencia import chave_analise, executar_uma_vez, hash_conteudo
+from src.services.progresso import Progresso, ProgressoNulo, acompanhar, existe, remover_expirados
+from src.services.estado import (
+    existe_estado, salvar_estado, carregar_estado, carregar_extras, carregar_assinaturas, arquivo_estado,
+    ler_estado
+)
+from src.services.delta import (
+    INCLUIDA, REMOVIDA, ROTULOS_SITUACAO, DeltaAgenda, assinar_linhas, comparar_assinaturas
+)
+from src.services.conciliacao import ROTULOS_CONCILIACAO, ListagemInvalida, ler_listagem, conciliar
+from src.services.qualidade import ROTULOS_QUALIDADE, QualidadeParcial
+from src.services.sessao import GRUPOS_SESSAO, abrir_sessao, obter_sessao, decidir, totais_grupos, listar_itens
+from src.models.sessao import DECISOES_SESSAO
+from src.services.regras import APROVAR, REVISAR, REJEITAR, ROTULOS_RECOMENDACAO, aplicar_regras
+from src.services.historico import (
+    GRUPOS_HISTORICO, DIAS_TENDENCIA, registrar_analise, serie_tendencia, comparar_analises, analises_recentes
+)
 
 analise_bp = Blueprint('analise', __name__)
 
 UPLOAD_FOLDER = '/tmp/uploads'
-ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
+# Parquet só é aceito com o pyarrow instalado (dependência opcional)
+ALLOWED_EXTENSIONS = {'xlsx', 'xls', 'csv'} | ({'parquet'} if PARQUET_DISPONIVEL else set())
+
+# Arquivos aceitos em um único upload consolidado (um por CD)
+MAXIMO_ARQUIVOS_LOTE = int(os.environ.get('ANALISE_MAXIMO_ARQUIVOS', 50))
+
+# Modos de processamento: tudo em memória, em lotes (agendas muito grandes)
+# ou em paralelo, com a agregação separada por filial em vários processos.
+# No automático a dimensão da aba decide entre memória e lotes. Com uma
+# análise base (incremental) só os grupos com linhas alteradas são reagregados.
+# Vários arquivos (um por CD) são lidos em paralelo e consolidados em uma análise.
+MODO_MEMORIA = 'memoria'
+MODO_LOTES = 'lotes'
+MODO_PARALELO = 'paralelo'
+MODO_AUTOMATICO = 'automatico'
+MODO_DELTA = 'delta'
+MODO_CONSOLIDADO = 'consolidado'
+
+# Valor do parâmetro `base` que escolhe a análise mais recente como base
+BASE_ULTIMA = 'ultima'
+
+# Abas do relatório e perfis: quais abas cada perfil gera, na ordem do workbook
+ABA_RESUMO_EXECUTIVO = 'resumo_executivo'
+ABA_ANALISE_FORNECEDOR = 'analise_fornecedor'
+ABA_DETALHES_MERCADORIA = 'detalhes_mercadoria'
+ABA_FAIXAS_FILIAL = 'faixas_filial'
+ABA_FAIXAS_FORNECEDOR_FILIAL = 'faixas_fornecedor_filial'
+ABA_DISTRIBUICAO_VALOR = 'distribuicao_valor'
+ABA_ALTERACOES = 'alteracoes'
+ABA_CONCILIACAO = 'conciliacao'
+ABA_QUALIDADE = 'qualidade'
+ABA_ARQUIVOS = 'arquivos'
+
+PERFIL_EXECUTIVO = 'executivo'
+PERFIL_FORNECEDOR = 'fornecedor'
+PERFIL_COMPLETO = 'completo'
+PERFIS_RELATORIO = {
+    PERFIL_EXECUTIVO: [ABA_RESUMO_EXECUTIVO, ABA_ANALISE_FORNECEDOR, ABA_FAIXAS_FILIAL],
+    PERFIL_FORNECEDOR: [ABA_RESUMO_EXECUTIVO, ABA_ANALISE_FORNECEDOR, ABA_FAIXAS_FORNECEDOR_FILIAL,
+                        ABA_DISTRIBUICAO_VALOR],
+    PERFIL_COMPLETO: [ABA_RESUMO_EXECUTIVO, ABA_ANALISE_FORNECEDOR, ABA_DETALHES_MERCADORIA,
+                      ABA_FAIXAS_FILIAL, ABA_FAIXAS_FORNECEDOR_FILIAL, ABA_DISTRIBUICAO_VALOR],
+}
+PERFIL_PADRAO = os.environ.get('ANALISE_PERFIL', PERFIL_COMPLETO)
+
+# Planilha gerada junto com a análise ou só no primeiro download
+PLANILHA_IMEDIATA = 'imediata'
+PLANILHA_SOB_DEMANDA = 'sob_demanda'
+PLANILHA_PADRAO = os.environ.get('ANALISE_PLANILHA', PLANILHA_IMEDIATA)
+
+# Tarefas da exportação por fornecedor para cada processo do pool: cada
+# tarefa relê os detalhes do estado uma vez para todos os seus fornecedores
+TAREFAS_EXPORTACAO_POR_PROCESSO = int(os.environ.get('ANALISE_TAREFAS_EXPORTACAO', 4))
+
+# Acima desta quantidade de linhas o modo automático processa em lotes
+LIMITE_LINHAS_MEMORIA = int(os.environ.get('ANALISE_LIMITE_LINHAS_MEMORIA', 200000))
+
+# Observação exibida para cada recomendação na aba de distribuição por valor
+OBSERVACOES_FAIXA = {
+    APROVAR: "Faixa com boa rotatividade",
+    REVISAR: "Atenção à cobertura média",
+    REJEITAR: "Cobertura alta - risco de estoque parado",
+}
 
 # Criar pasta de upload se não existir
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -62,75 +171,550 @@ def formatar_percentual_brasileiro(valor):
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def processar_arquivo_cargas(filepath):
+def escolher_modo(modo, linhas=None):
+    """
+    Resolve o modo automático pela quantidade de linhas declarada no arquivo
+    """
+    if modo != MODO_AUTOMATICO:
+        return modo
+    if linhas is not None and linhas > LIMITE_LINHAS_MEMORIA:
+        return MODO_LOTES
+    return MODO_MEMORIA
+
+def verificar_arquivo(filepath):
+    """
+    Verificação prévia de um arquivo (.xlsx, CSV e Parquet; só .xlsx e
+    Parquet declaram a dimensão); levanta AgendaInvalida
+    """
+    if extensao_arquivo(filepath) in EXTENSOES_EM_FLUXO:
+        return verificar_agenda(filepath)
+    return {'linhas': None, 'colunas': None}
+
+def escolher_contagem(modo, contagem=None):
+    """
+    Contagem distinta exata em todos os modos; a aproximada (HyperLogLog)
+    só quando pedida explicitamente
+    """
+    if contagem == CONTAGEM_APROXIMADA:
+        return CONTAGEM_APROXIMADA
+    return CONTAGEM_EXATA
+
+class AnaliseRecusada(ValueError):
+    """
+    Entrada recusada pela análise (mensagem devolvida ao usuário)
+    """
+
+class AnaliseCarregada:
+    """
+    Resultado da ingestão: agregados, detalhes e estado de qualidade, com o
+    modo e a contagem usados e a memória reservada. O pós-processamento
+    acrescenta seções em `extras` (as abas opcionais da planilha).
+    """
+    
+    def __init__(self, modo, contagem, consolidado, total_aprovacao, agregados, detalhes, qualidade, reserva):
+        self.modo = modo
+        self.contagem = contagem
+        self.consolidado = consolidado
+        self.total_aprovacao = total_aprovacao
+        self.agregados = agregados
+        self.detalhes = detalhes
+        self.qualidade = qualidade
+        self.reserva = reserva
+        self.extras = {}
+    
+    def liberar(self):
+        """
+        Descarta os detalhes e o estado de qualidade (arquivos de lote em
+        disco) e devolve a reserva de memória
+        """
+        if self.detalhes is not None:
+            self.detalhes.descartar()
+            self.detalhes = None
+        if self.qualidade is not None:
+            self.qualidade.descartar()
+            self.qualidade = None
+        if self.reserva is not None:
+            self.reserva.liberar()
+            self.reserva = None
+
+def planejar_analise(filepath, modo=MODO_AUTOMATICO, tamanho_lote=TAMANHO_LOTE_PADRAO, base=None):
+    """
+    Verificação prévia (sem ler os dados) e escolha do modo; retorna
+    (modo, linhas declaradas, delta em lotes, memória estimada em bytes).
+    Levanta AnaliseRecusada.
+    """
+    # Verificação prévia: recusa o arquivo (ou o lote) antes de ler os dados
+    consolidado = isinstance(filepath, list)
+    arquivos = filepath if consolidado else [filepath]
+    dimensoes = []
+    for caminho in arquivos:
+        try:
+            dimensoes.append(verificar_arquivo(caminho))
+        except AgendaInvalida as e:
+            raise AnaliseRecusada(f"{os.path.basename(caminho)}: {e}" if consolidado else str(e))
+    if consolidado and base:
+        raise AnaliseRecusada("Análise incremental não disponível para um lote de arquivos")
+    linhas = None
+    if all(dimensao['linhas'] is not None for dimensao in dimensoes):
+        linhas = sum(dimensao['linhas'] for dimensao in dimensoes)
+    
+    # Na análise incremental a agenda atual também é lida em lotes quando grande
+    delta_em_lotes = False
+    if consolidado:
+        modo = MODO_CONSOLIDADO
+    else:
+        delta_em_lotes = escolher_modo(modo, linhas) == MODO_LOTES and extensao_arquivo(filepath) in EXTENSOES_EM_FLUXO
+        modo = MODO_DELTA if base else escolher_modo(modo, linhas)
+    
+    # No lote, os arquivos ficam em memória ao mesmo tempo
+    memoria = sum(
+        estimar_memoria(os.path.getsize(caminho), dimensao['linhas'], dimensao['colunas'],
+                        tamanho_lote if modo == MODO_LOTES or delta_em_lotes else None)
+        for caminho, dimensao in zip(arquivos, dimensoes)
+    )
+    return modo, linhas, delta_em_lotes, memoria
+
+def carregar_analise(filepath, modo=MODO_AUTOMATICO, tamanho_lote=TAMANHO_LOTE_PADRAO, contagem=None,
+                     backend=None, progresso=None, base=None, reserva=None):
     """
-    Processa arquivo de cargas e gera análise completa
+    Ingestão: verificação prévia, escolha do modo, reserva de memória (ou a
+    `reserva` já feita por quem chama) e leitura da agenda (ou do lote de
+    arquivos, ou comparada com a análise `base`). Levanta AnaliseRecusada;
+    quem recebe a AnaliseCarregada chama liberar() ao terminar.
     """
+    progresso = progresso or ProgressoNulo()
+    consolidado = isinstance(filepath, list)
+    modo, linhas, delta_em_lotes, memoria = planejar_analise(filepath, modo, tamanho_lote, base)
+    contagem = escolher_contagem(modo, contagem)
+    progresso.emitir('verificacao', linhas=linhas, modo=modo)
+    
+    # Controle de admissão: reserva a memória estimada no orçamento do host
+    if reserva is None:
+        reserva = reservar_memoria(memoria)
+    
+    extras = {}
     try:
-        # Carregar dados originais
-        df_original = pd.read_excel(filepath, sheet_name='Agenda Recebimento')
-        
-        # Filtrar apenas "Em Aprovação"
-        df_aprovacao = df_original[df_original['Status'] == 'Em Aprovação'].copy()
-        
-        if len(df_aprovacao) == 0:
-            return None, "Nenhum registro encontrado com status 'Em Aprovação'"
-        
-        # Converter dados numéricos
-        df_aprovacao['Cobertura Atual'] = pd.to_numeric(df_aprovacao['Cobertura Atual'], errors='coerce')
-        df_aprovacao['Saldo Pedido'] = pd.to_numeric(df_aprovacao['Saldo Pedido'], errors='coerce')
-        df_aprovacao['Quantidade<br />Entrega'] = pd.to_numeric(df_aprovacao['Quantidade<br />Entrega'], errors='coerce')
-        
-        # Limpar dados
-        df_clean = df_aprovacao[
-            df_aprovacao['Cobertura Atual'].notna() & 
-            df_aprovacao['Fornecedor'].notna() &
-            df_aprovacao['Filial'].notna() &
-            df_aprovacao['Mercadoria'].notna()
-        ].copy()
-        
-        if len(df_clean) == 0:
-            return None, "Nenhum registro válido encontrado após limpeza dos dados"
-        
-        # Gerar arquivo Excel
-        output_file = gerar_excel_analise(df_clean)
+        if modo == MODO_CONSOLIDADO:
+            total_aprovacao, agregados, detalhes, qualidade, extras['arquivos'] = carregar_arquivos(
+                filepath, contagem, backend, progresso)
+        elif modo == MODO_DELTA:
+            total_aprovacao, agregados, detalhes, qualidade, extras['delta'] = carregar_com_delta(
+                filepath, base, obter_backend(backend), progresso, tamanho_lote if delta_em_lotes else None)
+            contagem = agregados.contagem
+        elif modo == MODO_LOTES and extensao_arquivo(filepath) in EXTENSOES_EM_FLUXO:
+            total_aprovacao, agregados, detalhes, qualidade = carregar_em_lotes(
+                filepath, tamanho_lote, contagem, progresso)
+        else:
+            total_aprovacao, agregados, detalhes, qualidade = carregar_em_memoria(
+                filepath, modo == MODO_PARALELO, contagem, obter_backend(backend), progresso)
+    except BaseException:
+        reserva.liberar()
+        raise
+    
+    analise = AnaliseCarregada(modo, contagem, consolidado, total_aprovacao, agregados, detalhes, qualidade, reserva)
+    analise.extras.update(extras)
+    
+    if total_aprovacao == 0 or agregados.total_itens == 0:
+        analise.liberar()
+        if total_aprovacao == 0:
+            raise AnaliseRecusada("Nenhum registro encontrado com status 'Em Aprovação'")
+        raise AnaliseRecusada("Nenhum registro válido encontrado após limpeza dos dados")
+    return analise
+
+def verificar_qualidade(analise, progresso=None):
+    """
+    Pós-processamento: fecha a verificação de qualidade (duplicidades,
+    valores atípicos e linhas descartadas) relendo os detalhes lote a lote.
+    No lote de arquivos as posições não dizem de qual arquivo a linha veio.
+    """
+    progresso = progresso or ProgressoNulo()
+    com_linhas = not analise.consolidado
+    analise.extras['qualidade'] = analise.qualidade.avaliar(analise.detalhes.iterar_lotes(), com_linhas, com_linhas)
+    progresso.emitir('qualidade', **analise.extras['qualidade'].resumo())
+
+def conciliar_analise(analise, listagem, progresso=None):
+    """
+    Pós-processamento: concilia a agenda com a listagem de NF/pedidos
+    """
+    progresso = progresso or ProgressoNulo()
+    try:
+        analise.extras['conciliacao'] = conciliar(dataframe_detalhes(analise.detalhes), ler_listagem(listagem))
+    except ListagemInvalida as e:
+        raise AnaliseRecusada(str(e))
+    progresso.emitir('conciliacao', **analise.extras['conciliacao'].resumo())
+
+def resumir_analise(analise, progresso=None):
+    """
+    Resumo da resposta (publicado antes da planilha ficar pronta), com as
+    seções do pós-processamento que rodaram
+    """
+    progresso = progresso or ProgressoNulo()
+    agregados = analise.agregados
+    progresso.emitir(
+        'agregacao', itens=agregados.total_itens, fornecedores=len(agregados.fornecedores),
+        filiais=len(agregados.filiais), pares=len(agregados.pares)
+    )
+    
+    resumo = gerar_resumo_analise(agregados)
+    resumo['metricas_gerais']['contagem_distinta'] = analise.contagem
+    resumo['metricas_gerais']['modo_processamento'] = analise.modo
+    extras = analise.extras
+    if 'delta' in extras:
+        resumo['alteracoes'] = extras['delta'].resumo()
+    if 'conciliacao' in extras:
+        resumo['conciliacao'] = extras['conciliacao'].resumo()
+    if 'qualidade' in extras:
+        resumo['qualidade'] = extras['qualidade'].resumo()
+    if 'arquivos' in extras:
+        resumo['arquivos'] = extras['arquivos']
+    progresso.emitir('resumo', resumo=resumo)
+    return resumo
+
+def gerar_saidas(analise, perfil=None, gerar_planilha=True, nome_estado=None, historico=False, progresso=None):
+    """
+    Saída: planilha (abas conforme o `perfil`), estado salvo com `nome_estado`
+    (para outros perfis e planilhas sob demanda) e histórico no banco
+    (requer app context). Retorna o caminho da planilha ou, sem ela, `nome_estado`.
+    """
+    output_file = None
+    if gerar_planilha:
+        output_file = gerar_excel_analise(analise.agregados, analise.detalhes, progresso, perfil, extras=analise.extras)
+    
+    if nome_estado is not None:
+        # Assinaturas das linhas para servir de base a análises incrementais
+        # (no lote de arquivos as posições se repetem entre os arquivos)
+        assinaturas = None if analise.consolidado else analise.qualidade.assinaturas()
+        salvar_estado(nome_estado, analise.agregados, analise.detalhes, analise.extras, assinaturas)
+    
+    if historico:
+        registrar_analise(nome_estado, analise.agregados, analise.modo)
+    
+    return output_file or nome_estado
+
+def processar_arquivo_cargas(filepath, modo=MODO_AUTOMATICO, tamanho_lote=TAMANHO_LOTE_PADRAO, contagem=None,
+                             backend=None, progresso=None, nome_estado=None, perfil=None, gerar_planilha=True,
+                             historico=False, base=None, listagem=None, reserva=None):
+    """
+    Processa arquivo de cargas e gera análise completa, encadeando as etapas:
+    ingestão (carregar_analise: modo, backend, lotes, lote de arquivos ou
+    comparação com a `base`, com a `reserva` de memória se já feita), pós-processamento (verificar_qualidade, e
+    conciliar_analise com a `listagem`) e saída (resumir_analise e
+    gerar_saidas). Retorna (planilha ou nome_estado, resumo) ou (None, erro).
+    """
+    progresso = progresso or ProgressoNulo()
+    analise = None
+    try:
+        analise = carregar_analise(filepath, modo, tamanho_lote, contagem, backend, progresso, base, reserva)
         
-        # Gerar resumo para resposta
-        resumo = gerar_resumo_analise(df_clean)
+        verificar_qualidade(analise, progresso)
+        if listagem is not None:
+            conciliar_analise(analise, listagem, progresso)
         
-        return output_file, resumo
+        resumo = resumir_analise(analise, progresso)
+        return gerar_saidas(analise, perfil, gerar_planilha, nome_estado, historico, progresso), resumo
         
+    except AnaliseRecusada as e:
+        return None, str(e)
+    except CapacidadeEsgotada:
+        raise
     except Exception as e:
         return None, f"Erro ao processar arquivo: {str(e)}"
+    finally:
+        if analise is not None:
+            analise.liberar()
+
+def carregar_em_memoria(filepath, paralelo=False, contagem=CONTAGEM_EXATA, backend=None, progresso=None):
+    """
+    Lê a agenda inteira, limpa e calcula os agregados de uma vez.
+    Retorna também o estado da verificação de qualidade (QualidadeParcial).
+    """
+    backend = backend or obter_backend()
+    progresso = progresso or ProgressoNulo()
+    
+    # Carregar dados originais
+    df_original = backend.ler(filepath)
+    progresso.emitir('leitura', linhas_lidas=len(df_original))
+    
+    # Filtrar apenas "Em Aprovação" e limpar dados
+    df_aprovacao = backend.filtrar_aprovacao(df_original)
+    df_clean = backend.limpar(df_aprovacao)
+    
+    colunas = backend.codificar(df_clean)
+    if paralelo:
+        agregados = agregar_por_filial(colunas, contagem=contagem)
+    else:
+        agregados = AgregadosParciais.de_colunas(colunas, contagem)
+    
+    df_detalhes = backend.detalhes(df_clean)
+    qualidade = QualidadeParcial.de_dataframe(df_detalhes, backend.descartadas(df_aprovacao))
+    return len(df_aprovacao), agregados, DetalhesMemoria(df_detalhes), qualidade
 
-def gerar_excel_analise(df):
+def carregar_com_delta(filepath, base, backend=None, progresso=None, tamanho_lote=None):
     """
-    Gera arquivo Excel com análise completa
+    Lê e limpa a agenda (em lotes com `tamanho_lote`), compara as linhas com
+    as da análise `base` pelas assinaturas (hash da chave Carga/Pedido/Cód.
+    e do conteúdo) e reagrega só os fornecedores e filiais com linhas
+    incluídas, removidas ou alteradas; os demais grupos vêm dos agregados
+    salvos da base, com a ordem de exibição da agenda atual.
+    
+    Custo: a agenda atual é lida, limpa e assinada inteira (as assinaturas
+    são as da verificação de qualidade, calculadas de qualquer forma), e
+    cada grupo tocado é reagregado sobre todas as suas linhas atuais, já
+    que contagens distintas e quantis não se subtraem. A economia é não
+    reler nem reassinar a base (assinaturas salvas com o estado; estados
+    antigos, sem elas, são assinados a partir dos detalhes) e não reagregar
+    os grupos intocados; com quase todos os grupos tocados, o custo é o de
+    uma análise completa mais a comparação.
     """
+    backend = backend or obter_backend()
+    progresso = progresso or ProgressoNulo()
     
-    # Criar workbook
-    wb = Workbook()
-    wb.remove(wb.active)
+    agregados_base, detalhes_base = carregar_estado(base)
+    assinaturas_base = carregar_assinaturas(base)
+    if assinaturas_base is None:
+        assinaturas_base = assinar_linhas(dataframe_detalhes(detalhes_base))
     
-    # 1. ABA RESUMO EXECUTIVO
-    ws_resumo = wb.create_sheet("📊 Resumo Executivo")
+    if tamanho_lote is not None:
+        total_aprovacao, detalhes, qualidade, primeiras = ler_detalhes_em_lotes(filepath, tamanho_lote, progresso)
+    else:
+        df_original = backend.ler(filepath)
+        progresso.emitir('leitura', linhas_lidas=len(df_original))
+        
+        df_aprovacao = backend.filtrar_aprovacao(df_original)
+        df_clean = backend.detalhes(backend.limpar(df_aprovacao))
+        total_aprovacao = len(df_aprovacao)
+        detalhes = DetalhesMemoria(df_clean)
+        qualidade = QualidadeParcial.de_dataframe(df_clean, backend.descartadas(df_aprovacao))
+        primeiras = primeiras_linhas(df_clean)
+    
+    try:
+        posicoes = comparar_assinaturas(assinaturas_base, qualidade.assinaturas())
+        delta = DeltaAgenda(
+            base,
+            selecionar_posicoes(detalhes, posicoes[INCLUIDA]),
+            selecionar_posicoes(detalhes_base, posicoes[REMOVIDA]),
+            selecionar_posicoes(detalhes_base, posicoes['alteradas_anterior']),
+            selecionar_posicoes(detalhes, posicoes['alteradas_atual']),
+        )
+        fornecedores, filiais = delta.grupos_tocados()
+        progresso.emitir('delta', **delta.resumo())
+        
+        parcial = AgregadosParciais()
+        lista_fornecedores, lista_filiais = list(fornecedores), list(filiais)
+        for lote in detalhes.iterar_lotes():
+            tocadas = lote['Fornecedor'].isin(lista_fornecedores) | lote['Filial'].isin(lista_filiais)
+            parcial.mesclar(AgregadosParciais.de_dataframe(lote[tocadas], agregados_base.contagem))
+        agregados = agregados_base.substituir_grupos(parcial, fornecedores, filiais).reordenar(primeiras)
+    except Exception:
+        detalhes.descartar()
+        qualidade.descartar()
+        raise
+    
+    return total_aprovacao, agregados, detalhes, qualidade, delta
+
+def ler_detalhes_em_lotes(filepath, tamanho_lote=TAMANHO_LOTE_PADRAO, progresso=None):
+    """
+    Como carregar_em_lotes, mas sem agregar: grava os detalhes e o estado de
+    qualidade de cada lote em disco e guarda a primeira linha de cada grupo
+    (para a ordem de exibição). Usado pela análise incremental.
+    """
+    progresso = progresso or ProgressoNulo()
+    linhas_lidas = 0
+    total_aprovacao = 0
+    primeiras = None
+    qualidade = QualidadeParcial(pasta=UPLOAD_FOLDER)
+    detalhes = DetalhesEmDisco(pasta=UPLOAD_FOLDER)
+    
+    try:
+        for lote in ler_agenda_em_lotes(filepath, tamanho_lote):
+            lote_aprovacao = filtrar_aprovacao(lote)
+            lote_clean = limpar_agenda(lote_aprovacao)
+            
+            total_aprovacao += len(lote_aprovacao)
+            primeiras = mesclar_primeiras(primeiras, primeiras_linhas(lote_clean))
+            qualidade.mesclar(QualidadeParcial.de_dataframe(lote_clean, linhas_descartadas(lote_aprovacao)))
+            detalhes.adicionar_lote(lote_clean)
+            
+            linhas_lidas += len(lote)
+            progresso.emitir('leitura', linhas_lidas=linhas_lidas)
+    except Exception:
+        detalhes.descartar()
+        qualidade.descartar()
+        raise
+    
+    return total_aprovacao, detalhes, qualidade, primeiras or {}
+
+def carregar_em_lotes(filepath, tamanho_lote=TAMANHO_LOTE_PADRAO, contagem=CONTAGEM_EXATA, progresso=None):
+    """
+    Lê a agenda em lotes, combinando agregados parciais e gravando em disco
+    os detalhes de cada lote e o estado da verificação de qualidade
+    (assinaturas das linhas e linhas descartadas na limpeza). Em memória
+    ficam só os parciais e os momentos por fornecedor.
+    """
+    progresso = progresso or ProgressoNulo()
+    linhas_lidas = 0
+    total_aprovacao = 0
+    agregados = AgregadosParciais()
+    qualidade = QualidadeParcial(pasta=UPLOAD_FOLDER)
+    detalhes = DetalhesEmDisco(pasta=UPLOAD_FOLDER)
+    
+    try:
+        for lote in ler_agenda_em_lotes(filepath, tamanho_lote):
+            lote_aprovacao = filtrar_aprovacao(lote)
+            lote_clean = limpar_agenda(lote_aprovacao)
+            
+            total_aprovacao += len(lote_aprovacao)
+            agregados.mesclar(AgregadosParciais.de_dataframe(lote_clean, contagem))
+            qualidade.mesclar(QualidadeParcial.de_dataframe(lote_clean, linhas_descartadas(lote_aprovacao)))
+            detalhes.adicionar_lote(lote_clean)
+            
+            linhas_lidas += len(lote)
+            progresso.emitir('leitura', linhas_lidas=linhas_lidas)
+    except Exception:
+        detalhes.descartar()
+        qualidade.descartar()
+        raise
+    
+    return total_aprovacao, agregados, detalhes, qualidade
+
+def carregar_arquivo_do_lote(tarefa):
+    """
+    Executado no processo filho: lê, limpa e agrega um arquivo do lote em memória
+    """
+    filepath, contagem, backend = tarefa
+    total_aprovacao, agregados, detalhes, qualidade = carregar_em_memoria(
+        filepath, contagem=contagem, backend=obter_backend(backend))
+    return total_aprovacao, agregados, detalhes.df[COLUNAS_DETALHE], qualidade
+
+def resumo_arquivo(filepath, total_aprovacao, agregados, qualidade):
+    """
+    Números principais de um arquivo do lote, antes da consolidação
+    """
+    itens = agregados.total_itens
+    return {
+        'arquivo': os.path.basename(filepath),
+        'linhas_aprovacao': int(total_aprovacao),
+        'total_itens': int(itens),
+        'linhas_descartadas': qualidade.total_descartadas,
+        'total_fornecedores': 0 if agregados.fornecedores is None else len(agregados.fornecedores),
+        'total_filiais': 0 if agregados.filiais is None else len(agregados.filiais),
+        'valor_total': float(agregados.geral['valor']),
+        'cobertura_media': float(agregados.geral['soma_cobertura'] / itens) if itens else 0.0,
+    }
+
+def carregar_arquivos(filepaths, contagem=CONTAGEM_EXATA, backend=None, progresso=None):
+    """
+    Lê cada arquivo do lote em um processo do pool e combina os agregados
+    parciais na ordem dos arquivos. As posições das linhas de cada arquivo
+    são deslocadas para depois das do anterior, então o resultado é o
+    mesmo de uma agenda única com os arquivos em sequência. Retorna também
+    o resumo de cada arquivo.
+    """
+    progresso = progresso or ProgressoNulo()
+    tarefas = [(filepath, contagem, backend) for filepath in filepaths]
+    total_aprovacao = 0
+    parciais = []
+    agendas = []
+    qualidade = QualidadeParcial()
+    resumos = []
+    deslocamento = 0
+    
+    with pool_processos(max(1, min(PROCESSOS_PADRAO, len(tarefas)))) as pool:
+        resultados = pool.map(carregar_arquivo_do_lote, tarefas)
+        for concluidos, (filepath, resultado) in enumerate(zip(filepaths, resultados), 1):
+            aprovacao, agregados, agenda, qualidade_arquivo = resultado
+            resumos.append(resumo_arquivo(filepath, aprovacao, agregados, qualidade_arquivo))
+            
+            parciais.append(agregados.deslocar_ordem(deslocamento))
+            agenda.index = agenda.index + deslocamento
+            agendas.append(agenda)
+            qualidade.mesclar(qualidade_arquivo.deslocar(deslocamento))
+            total_aprovacao += aprovacao
+            deslocamento = max([deslocamento] + [df.index.max() + 1 for df in [agenda] + qualidade_arquivo.descartadas
+                                                 if len(df)])
+            
+            progresso.emitir('leitura', arquivo=resumos[-1]['arquivo'], arquivos_lidos=concluidos,
+                             total_arquivos=len(filepaths))
+    
+    detalhes = DetalhesMemoria(pd.concat(agendas))
+    return total_aprovacao, combinar_agregados(parciais), detalhes, qualidade, resumos
+
+def gerar_excel_analise(agregados, detalhes, progresso=None, perfil=None, escritor=None, extras=None):
+    """
+    Gera arquivo Excel a partir dos agregados e das linhas de detalhe,
+    apenas com as abas do perfil de relatório escolhido, mais as abas dos
+    `extras` presentes (arquivos consolidados, alterações da análise
+    incremental, conciliação, qualidade)
+    """
+    progresso = progresso or ProgressoNulo()
+    extras = extras or {}
+    abas = list(PERFIS_RELATORIO[perfil or PERFIL_PADRAO])
+    if 'arquivos' in extras:
+        abas.append(ABA_ARQUIVOS)
+    if 'delta' in extras:
+        abas.append(ABA_ALTERACOES)
+    if 'conciliacao' in extras:
+        abas.append(ABA_CONCILIACAO)
+    if 'qualidade' in extras:
+        abas.append(ABA_QUALIDADE)
+    
+    # Criar workbook (gravado em fluxo, aba por aba, direto no arquivo temporário)
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx')
+    temp_file.close()
+    wb = criar_planilha(temp_file.name, escritor)
+    
+    construtores = {
+        ABA_RESUMO_EXECUTIVO: lambda: criar_aba_resumo_executivo(wb, agregados),
+        ABA_ANALISE_FORNECEDOR: lambda: criar_aba_analise_fornecedor(wb, agregados),
+        ABA_DETALHES_MERCADORIA: lambda: criar_aba_detalhes_mercadoria(wb, detalhes),
+        ABA_FAIXAS_FILIAL: lambda: criar_aba_faixas_por_filial(wb, agregados),
+        ABA_FAIXAS_FORNECEDOR_FILIAL: lambda: criar_aba_faixas_fornecedor_filial(wb, agregados),
+        ABA_DISTRIBUICAO_VALOR: lambda: criar_aba_distribuicao_valor(wb, agregados),
+        ABA_ALTERACOES: lambda: criar_aba_alteracoes(wb, extras['delta']),
+        ABA_CONCILIACAO: lambda: criar_aba_conciliacao(wb, extras['conciliacao']),
+        ABA_QUALIDADE: lambda: criar_aba_qualidade(wb, extras['qualidade']),
+        ABA_ARQUIVOS: lambda: criar_aba_arquivos(wb, extras['arquivos']),
+    }
+    
+    try:
+        for concluidas, aba in enumerate(abas, 1):
+            construtores[aba]()
+            progresso.emitir('planilha', aba=wb.abas[-1].title, concluidas=concluidas, total=len(abas))
+        
+        # Salvar arquivo temporário
+        wb.salvar()
+    except Exception:
+        os.remove(temp_file.name)
+        raise
+    
+    return temp_file.name
+
+def criar_aba_resumo_executivo(wb, agregados):
+    """
+    Cria aba com as métricas gerais, faixas de cobertura e resumo por filial
+    """
+    
+    ws_resumo = MODELO_RESUMO_EXECUTIVO.abrir(wb)
     
     # Calcular métricas principais
-    total_fornecedores = df['Fornecedor'].nunique()
-    total_cargas = df['Carga'].nunique()
-    total_itens = len(df)
-    total_filiais = df['Filial'].nunique()
-    valor_total = df['Saldo Pedido'].sum()
-    cobertura_media_geral = df['Cobertura Atual'].mean()
+    metricas = agregados.metricas_gerais()
+    total_fornecedores = metricas['total_fornecedores']
+    total_cargas = metricas['total_cargas']
+    total_pedidos = metricas['total_pedidos']
+    total_codigos = metricas['total_codigos']
+    total_itens = metricas['total_itens']
+    total_filiais = metricas['total_filiais']
+    valor_total = metricas['valor_total']
+    cobertura_media_geral = metricas['cobertura_media']
     
     # Análise por faixas
-    ate_44 = len(df[df['Cobertura Atual'] <= 44])
-    entre_45_70 = len(df[(df['Cobertura Atual'] >= 45) & (df['Cobertura Atual'] <= 70)])
-    acima_71 = len(df[df['Cobertura Atual'] >= 71])
+    ate_44 = metricas['ate_44']
+    entre_45_70 = metricas['entre_45_70']
+    acima_71 = metricas['acima_71']
     
-    perc_ate_44 = (ate_44 / total_itens) * 100
-    perc_45_70 = (entre_45_70 / total_itens) * 100
-    perc_acima_71 = (acima_71 / total_itens) * 100
+    perc_ate_44 = metricas['perc_ate_44']
+    perc_45_70 = metricas['perc_45_70']
+    perc_acima_71 = metricas['perc_acima_71']
     
     # Dados do resumo com formatação brasileira
     dados_resumo = [
@@ -140,6 +724,8 @@ def gerar_excel_analise(df):
         ["MÉTRICAS GERAIS", ""],
         ["Total de Fornecedores", formatar_numero_brasileiro(total_fornecedores)],
         ["Total de Cargas", formatar_numero_brasileiro(total_cargas)],
+        ["Total de Pedidos", formatar_numero_brasileiro(total_pedidos)],
+        ["Total de Códigos", formatar_numero_brasileiro(total_codigos)],
         ["Total de Itens", formatar_numero_brasileiro(total_itens)],
         ["Total de Filiais", formatar_numero_brasileiro(total_filiais)],
         ["Valor Total", formatar_moeda_brasileira(valor_total)],
@@ -154,84 +740,64 @@ def gerar_excel_analise(df):
     ]
     
     # Adicionar dados por filial com formatação brasileira
-    for filial in df['Filial'].unique():
-        dados_filial = df[df['Filial'] == filial]
-        cobertura_filial = dados_filial['Cobertura Atual'].mean()
-        valor_filial = dados_filial['Saldo Pedido'].sum()
-        dados_resumo.append([filial, f"{formatar_numero_brasileiro(len(dados_filial))} itens, {formatar_numero_brasileiro(cobertura_filial)} dias, {formatar_moeda_brasileira(valor_filial)}"])
+    for filial, dados_filial in agregados.tabela_filiais().iterrows():
+        cobertura_filial = dados_filial['cobertura_media']
+        valor_filial = dados_filial['valor']
+        dados_resumo.append([filial, f"{formatar_numero_brasileiro(dados_filial['itens'])} itens, {formatar_numero_brasileiro(cobertura_filial)} dias, {formatar_moeda_brasileira(valor_filial)}"])
     
     # Preencher dados
     for row, (label, valor) in enumerate(dados_resumo, 1):
-        cell_a = ws_resumo.cell(row=row, column=1, value=label)
-        cell_b = ws_resumo.cell(row=row, column=2, value=valor)
-        
         # Formatação
         if "ANÁLISE DE CARGAS" in str(label):
-            cell_a.font = Font(bold=True, size=16, color="FFFFFF")
-            cell_a.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+            estilo = ESTILO_TITULO_RESUMO
         elif label in ["MÉTRICAS GERAIS", "DISTRIBUIÇÃO POR FAIXAS DE COBERTURA", "DISTRIBUIÇÃO POR FILIAL"]:
-            cell_a.font = Font(bold=True, size=12)
-            cell_a.fill = PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid")
+            estilo = ESTILO_SECAO_RESUMO
+        else:
+            estilo = ESTILO_TEXTO
         
-        cell_a.alignment = Alignment(horizontal="left", vertical="center")
-        cell_b.alignment = Alignment(horizontal="left", vertical="center")
-    
-    # Ajustar larguras
-    ws_resumo.column_dimensions['A'].width = 40
-    ws_resumo.column_dimensions['B'].width = 30
-    
-    # 2. ABA ANÁLISE POR FORNECEDOR
-    ws_fornecedores = wb.create_sheet("🏭 Análise por Fornecedor")
-    
-    # Cabeçalhos
-    headers = [
-        'Fornecedor', 'Total Itens', 'Total Cargas', 'Filiais Atendidas', 
-        'Cobertura Média', 'Valor Total (R$)', '% Até 44 dias', 
-        '% Entre 45-70 dias', '% Acima 71 dias', 'Recomendação'
-    ]
+        ws_resumo.escrever(row, 1, label, estilo)
+        ws_resumo.escrever(row, 2, valor, ESTILO_TEXTO)
+
+def criar_aba_analise_fornecedor(wb, agregados):
+    """
+    Cria aba com totais, quantis de cobertura e recomendação por fornecedor
+    """
     
-    # Criar cabeçalho
-    for col, header in enumerate(headers, 1):
-        cell = ws_fornecedores.cell(row=1, column=col, value=header)
-        cell.font = Font(bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
-        cell.alignment = Alignment(horizontal="center", vertical="center")
+    # Aba com título e cabeçalho do modelo
+    ws_fornecedores = MODELO_ANALISE_FORNECEDOR.abrir(wb)
     
     # Analisar cada fornecedor
     fornecedores_analise = []
     
-    for fornecedor in df['Fornecedor'].unique():
-        dados_forn = df[df['Fornecedor'] == fornecedor]
+    tabela_fornecedores = aplicar_regras('fornecedores', agregados.tabela_fornecedores())
+    for fornecedor, dados_forn in tabela_fornecedores.iterrows():
         
-        total_itens = len(dados_forn)
-        total_cargas = dados_forn['Carga'].nunique()
-        filiais = dados_forn['Filial'].nunique()
-        cobertura_media = dados_forn['Cobertura Atual'].mean()
-        valor_total = dados_forn['Saldo Pedido'].sum()
+        total_itens = int(dados_forn['itens'])
+        total_cargas = int(dados_forn['total_cargas'])
+        total_pedidos = int(dados_forn['total_pedidos'])
+        total_codigos = int(dados_forn['total_codigos'])
+        filiais = int(dados_forn['filiais'])
+        cobertura_media = dados_forn['cobertura_media']
+        valor_total = dados_forn['valor']
         
         # Distribuição por faixas
-        ate_44 = len(dados_forn[dados_forn['Cobertura Atual'] <= 44])
-        entre_45_70 = len(dados_forn[(dados_forn['Cobertura Atual'] >= 45) & (dados_forn['Cobertura Atual'] <= 70)])
-        acima_71 = len(dados_forn[dados_forn['Cobertura Atual'] >= 71])
-        
-        perc_ate_44 = (ate_44 / total_itens) * 100
-        perc_45_70 = (entre_45_70 / total_itens) * 100
-        perc_acima_71 = (acima_71 / total_itens) * 100
-        
-        # Recomendação
-        if perc_acima_71 > 50 or cobertura_media > 100:
-            recomendacao = "❌ REJEITAR"
-        elif perc_acima_71 > 25 or cobertura_media > 70:
-            recomendacao = "⚠️ REVISAR"
-        else:
-            recomendacao = "✅ APROVAR"
+        perc_ate_44 = dados_forn['perc_ate_44']
+        perc_45_70 = dados_forn['perc_45_70']
+        perc_acima_71 = dados_forn['perc_acima_71']
+        
+        recomendacao = dados_forn['recomendacao']
         
         fornecedores_analise.append({
             'Fornecedor': fornecedor,
             'Total_Itens': total_itens,
             'Total_Cargas': total_cargas,
+            'Total_Pedidos': total_pedidos,
+            'Total_Codigos': total_codigos,
             'Filiais': filiais,
             'Cobertura_Media': cobertura_media,
+            'Cobertura_P50': dados_forn['p50'],
+            'Cobertura_P90': dados_forn['p90'],
+            'Cobertura_P99': dados_forn['p99'],
             'Valor_Total': valor_total,
             'Perc_Ate_44': perc_ate_44,
             'Perc_45_70': perc_45_70,
@@ -243,170 +809,235 @@ def gerar_excel_analise(df):
     fornecedores_analise.sort(key=lambda x: x['Cobertura_Media'], reverse=True)
     
     # Preencher dados com formatação brasileira
-    for row, forn in enumerate(fornecedores_analise, 2):
+    for row, forn in enumerate(fornecedores_analise, MODELO_ANALISE_FORNECEDOR.primeira_linha):
         dados = [
             forn['Fornecedor'][:40],
             formatar_numero_brasileiro(forn['Total_Itens']),
             formatar_numero_brasileiro(forn['Total_Cargas']),
+            formatar_numero_brasileiro(forn['Total_Pedidos']),
+            formatar_numero_brasileiro(forn['Total_Codigos']),
             formatar_numero_brasileiro(forn['Filiais']),
             formatar_numero_brasileiro(forn['Cobertura_Media']),
+            formatar_numero_brasileiro(forn['Cobertura_P50']),
+            formatar_numero_brasileiro(forn['Cobertura_P90']),
+            formatar_numero_brasileiro(forn['Cobertura_P99']),
             formatar_moeda_brasileira(forn['Valor_Total']),
             formatar_percentual_brasileiro(forn['Perc_Ate_44']),
             formatar_percentual_brasileiro(forn['Perc_45_70']),
             formatar_percentual_brasileiro(forn['Perc_Acima_71']),
-            forn['Recomendacao']
+            ROTULOS_RECOMENDACAO[forn['Recomendacao']]
         ]
         
+        # Colorir baseado na recomendação
+        estilo = ESTILOS_RECOMENDACAO[forn['Recomendacao']]
         for col, valor in enumerate(dados, 1):
-            cell = ws_fornecedores.cell(row=row, column=col, value=valor)
-            
-            # Colorir baseado na recomendação
-            if forn['Recomendacao'] == "❌ REJEITAR":
-                cell.fill = PatternFill(start_color="FFD6D6", end_color="FFD6D6", fill_type="solid")
-            elif forn['Recomendacao'] == "⚠️ REVISAR":
-                cell.fill = PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid")
-            else:
-                cell.fill = PatternFill(start_color="E6F3E6", end_color="E6F3E6", fill_type="solid")
-    
-    # Ajustar larguras
-    larguras = [40, 12, 12, 12, 15, 18, 12, 15, 12, 15]
-    for col, largura in enumerate(larguras, 1):
-        from openpyxl.utils import get_column_letter
-        ws_fornecedores.column_dimensions[get_column_letter(col)].width = largura
-    
-    # 3. ABA DETALHAMENTO POR MERCADORIA
-    ws_mercadorias = wb.create_sheet("🛍️ Detalhes por Mercadoria")
-    
-    # Cabeçalhos
-    headers_merc = [
-        'Carga', 'Pedido', 'Fornecedor', 'Filial', 'Código', 'Mercadoria', 
-        'Quantidade Entrega', 'Saldo Pedido', 'Cobertura Atual', 
-        'Nota Fiscal', 'Faixa Cobertura', 'Observação'
-    ]
-    
-    for col, header in enumerate(headers_merc, 1):
-        cell = ws_mercadorias.cell(row=1, column=col, value=header)
-        cell.font = Font(bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        cell.alignment = Alignment(horizontal="center", vertical="center")
+            ws_fornecedores.escrever(row, col, valor, estilo)
+
+def criar_aba_detalhes_mercadoria(wb, detalhes):
+    """
+    Cria aba com uma linha por mercadoria, da maior para a menor cobertura
+    """
     
-    # Ordenar dados por cobertura (mais críticos primeiro)
-    df_ordenado = df.sort_values('Cobertura Atual', ascending=False)
+    # Aba com cabeçalho do modelo
+    ws_mercadorias = MODELO_DETALHES_MERCADORIA.abrir(wb)
     
-    # Preencher dados linha por linha com formatação brasileira
-    for row, (_, item) in enumerate(df_ordenado.iterrows(), 2):
+    # Preencher dados linha por linha (mais críticos primeiro) com formatação brasileira
+    for row, item in enumerate(detalhes.iterar_ordenado(), MODELO_DETALHES_MERCADORIA.primeira_linha):
+        carga, pedido, fornecedor, filial, codigo, mercadoria, quantidade, saldo, cobertura, nota_fiscal = item
         
         # Determinar faixa de cobertura
-        cobertura = item['Cobertura Atual']
         if cobertura <= 44:
             faixa = "✅ Até 44 dias"
-            cor = "E6F3E6"
+            estilo = ESTILOS_RECOMENDACAO_ESQUERDA[APROVAR]
             obs = "OK para aprovação"
         elif cobertura <= 70:
             faixa = "⚠️ 45-70 dias"
-            cor = "FFF2CC"
+            estilo = ESTILOS_RECOMENDACAO_ESQUERDA[REVISAR]
             obs = "Atenção - revisar necessidade"
         else:
             faixa = "❌ Acima 71 dias"
-            cor = "FFD6D6"
+            estilo = ESTILOS_RECOMENDACAO_ESQUERDA[REJEITAR]
             obs = "CRÍTICO - considerar rejeição"
         
         dados = [
-            item['Carga'],
-            item['Pedido'],
-            item['Fornecedor'][:25],
-            item['Filial'],
-            item['Cód.'],
-            item['Mercadoria'][:40],
-            formatar_numero_brasileiro(item['Quantidade<br />Entrega']),
-            formatar_moeda_brasileira(item['Saldo Pedido']),
+            carga,
+            pedido,
+            fornecedor[:25],
+            filial,
+            codigo,
+            mercadoria[:40],
+            formatar_numero_brasileiro(quantidade),
+            formatar_moeda_brasileira(saldo),
             formatar_numero_brasileiro(cobertura),
-            item['Nota Fiscal'] if pd.notna(item['Nota Fiscal']) else 'Sem NF',
+            nota_fiscal if pd.notna(nota_fiscal) else 'Sem NF',
             faixa,
             obs
         ]
         
         for col, valor in enumerate(dados, 1):
-            cell = ws_mercadorias.cell(row=row, column=col, value=valor)
-            cell.fill = PatternFill(start_color=cor, end_color=cor, fill_type="solid")
-            cell.alignment = Alignment(horizontal="left", vertical="center")
+            ws_mercadorias.escrever(row, col, valor, estilo)
+
+def criar_aba_alteracoes(wb, delta):
+    """
+    Cria aba com as linhas alteradas, incluídas e removidas em relação à análise base
+    """
     
-    # Ajustar larguras
-    larguras_merc = [10, 12, 25, 20, 12, 40, 15, 15, 12, 15, 15, 30]
-    for col, largura in enumerate(larguras_merc, 1):
-        from openpyxl.utils import get_column_letter
-        ws_mercadorias.column_dimensions[get_column_letter(col)].width = largura
+    # Aba com título principal e cabeçalhos do modelo
+    ws = MODELO_ALTERACOES.abrir(wb)
     
-    # 4. ABA FAIXAS POR FILIAL
-    criar_aba_faixas_por_filial(wb, df)
+    for row, item in enumerate(delta.tabela().itertuples(index=False, name=None), MODELO_ALTERACOES.primeira_linha):
+        (situacao, carga, pedido, codigo, fornecedor, filial, mercadoria,
+         saldo_anterior, saldo_atual, cobertura_anterior, cobertura_atual, campos) = item
+        
+        dados = [
+            ROTULOS_SITUACAO[situacao],
+            carga,
+            pedido,
+            codigo,
+            fornecedor[:25],
+            filial,
+            mercadoria[:40],
+            formatar_moeda_brasileira(saldo_anterior) if pd.notna(saldo_anterior) else '-',
+            formatar_moeda_brasileira(saldo_atual) if pd.notna(saldo_atual) else '-',
+            formatar_numero_brasileiro(cobertura_anterior) if pd.notna(cobertura_anterior) else '-',
+            formatar_numero_brasileiro(cobertura_atual) if pd.notna(cobertura_atual) else '-',
+            campos
+        ]
+        
+        estilo = ESTILOS_SITUACAO[situacao]
+        for col, valor in enumerate(dados, 1):
+            ws.escrever(row, col, valor, estilo)
+
+def criar_aba_conciliacao(wb, conciliacao):
+    """
+    Cria aba com as chaves (Pedido, Código) não conciliadas com a listagem de NF/pedidos
+    """
+    
+    # Aba com título principal e cabeçalhos do modelo
+    ws = MODELO_CONCILIACAO.abrir(wb)
     
-    # 5. ABA FAIXAS POR FORNECEDOR E FILIAL
-    criar_aba_faixas_fornecedor_filial(wb, df)
+    linhas = conciliacao.divergencias.itertuples(index=False, name=None)
+    for row, item in enumerate(linhas, MODELO_CONCILIACAO.primeira_linha):
+        (situacao, pedido, codigo, fornecedor, filial, mercadoria, nota_agenda, nota_listagem,
+         quantidade_agenda, quantidade_listagem, diferenca) = item
+        
+        dados = [
+            ROTULOS_CONCILIACAO[situacao],
+            pedido,
+            codigo,
+            fornecedor[:25] if pd.notna(fornecedor) else '-',
+            filial if pd.notna(filial) else '-',
+            mercadoria[:40] if pd.notna(mercadoria) else '-',
+            nota_agenda if pd.notna(nota_agenda) else 'Sem NF',
+            nota_listagem if pd.notna(nota_listagem) else 'Sem NF',
+            formatar_numero_brasileiro(quantidade_agenda) if pd.notna(quantidade_agenda) else '-',
+            formatar_numero_brasileiro(quantidade_listagem) if pd.notna(quantidade_listagem) else '-',
+            formatar_numero_brasileiro(diferenca) if pd.notna(diferenca) else '-'
+        ]
+        
+        estilo = ESTILOS_CONCILIACAO[situacao]
+        for col, valor in enumerate(dados, 1):
+            ws.escrever(row, col, valor, estilo)
 
-    # 6. ABA DISTRIBUIÇÃO POR VALOR
-    criar_aba_distribuicao_valor(wb, df)
+def criar_aba_qualidade(wb, qualidade):
+    """
+    Cria aba com as linhas duplicadas, atípicas por fornecedor e descartadas na limpeza
+    """
     
-    # Salvar arquivo temporário
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx')
-    wb.save(temp_file.name)
-    temp_file.close()
+    # Aba com título principal e cabeçalhos do modelo
+    ws = MODELO_QUALIDADE.abrir(wb)
     
-    return temp_file.name
+    linhas = qualidade.ocorrencias.itertuples(index=False, name=None)
+    for row, item in enumerate(linhas, MODELO_QUALIDADE.primeira_linha):
+        tipo, linha, carga, pedido, codigo, fornecedor, filial, mercadoria, valor, media, z, detalhe = item
+        
+        dados = [
+            ROTULOS_QUALIDADE[tipo],
+            int(linha) if pd.notna(linha) else '-',
+            carga if pd.notna(carga) else '-',
+            pedido if pd.notna(pedido) else '-',
+            codigo if pd.notna(codigo) else '-',
+            fornecedor[:25] if pd.notna(fornecedor) else '-',
+            filial if pd.notna(filial) else '-',
+            mercadoria[:40] if pd.notna(mercadoria) else '-',
+            formatar_numero_brasileiro(valor) if pd.notna(valor) else '-',
+            formatar_numero_brasileiro(media) if pd.notna(media) else '-',
+            formatar_numero_brasileiro(z) if pd.notna(z) else '-',
+            detalhe
+        ]
+        
+        estilo = ESTILOS_QUALIDADE[tipo]
+        for col, valor_celula in enumerate(dados, 1):
+            ws.escrever(row, col, valor_celula, estilo)
+
+def criar_aba_arquivos(wb, arquivos):
+    """
+    Cria aba com o resumo de cada arquivo de uma análise consolidada
+    """
+    
+    # Aba com título principal e cabeçalhos do modelo
+    ws = MODELO_ARQUIVOS.abrir(wb)
+    
+    for row, arquivo in enumerate(arquivos, MODELO_ARQUIVOS.primeira_linha):
+        dados = [
+            arquivo['arquivo'],
+            arquivo['linhas_aprovacao'],
+            arquivo['total_itens'],
+            arquivo['linhas_descartadas'],
+            arquivo['total_fornecedores'],
+            arquivo['total_filiais'],
+            formatar_moeda_brasileira(arquivo['valor_total']),
+            formatar_numero_brasileiro(arquivo['cobertura_media'])
+        ]
+        
+        for col, valor in enumerate(dados, 1):
+            ws.escrever(row, col, valor, ESTILO_TEXTO)
 
-def gerar_resumo_analise(df):
+def gerar_resumo_analise(agregados):
     """
     Gera resumo da análise para resposta JSON
     """
     
-    total_fornecedores = df['Fornecedor'].nunique()
-    total_itens = len(df)
-    valor_total = df['Saldo Pedido'].sum()
-    cobertura_media = df['Cobertura Atual'].mean()
+    metricas = agregados.metricas_gerais()
+    total_fornecedores = metricas['total_fornecedores']
+    total_itens = metricas['total_itens']
+    valor_total = metricas['valor_total']
+    cobertura_media = metricas['cobertura_media']
     
     # Análise por faixas
-    ate_44 = len(df[df['Cobertura Atual'] <= 44])
-    entre_45_70 = len(df[(df['Cobertura Atual'] >= 45) & (df['Cobertura Atual'] <= 70)])
-    acima_71 = len(df[df['Cobertura Atual'] >= 71])
-    
-    perc_ate_44 = (ate_44 / total_itens) * 100
-    perc_45_70 = (entre_45_70 / total_itens) * 100
-    perc_acima_71 = (acima_71 / total_itens) * 100
-    
-    # Análise de recomendações
-    fornecedores_aprovar = 0
-    fornecedores_revisar = 0
-    fornecedores_rejeitar = 0
-    valor_rejeitar = 0
-    
-    for fornecedor in df['Fornecedor'].unique():
-        dados_forn = df[df['Fornecedor'] == fornecedor]
-        cobertura_media_forn = dados_forn['Cobertura Atual'].mean()
-        acima_71_forn = len(dados_forn[dados_forn['Cobertura Atual'] >= 71])
-        perc_acima_71_forn = (acima_71_forn / len(dados_forn)) * 100
-        valor_forn = dados_forn['Saldo Pedido'].sum()
-        
-        if perc_acima_71_forn > 50 or cobertura_media_forn > 100:
-            fornecedores_rejeitar += 1
-            valor_rejeitar += valor_forn
-        elif perc_acima_71_forn > 25 or cobertura_media_forn > 70:
-            fornecedores_revisar += 1
-        else:
-            fornecedores_aprovar += 1
+    ate_44 = metricas['ate_44']
+    entre_45_70 = metricas['entre_45_70']
+    acima_71 = metricas['acima_71']
+    
+    perc_ate_44 = metricas['perc_ate_44']
+    perc_45_70 = metricas['perc_45_70']
+    perc_acima_71 = metricas['perc_acima_71']
+    
+    # Análise de recomendações (todas as linhas classificadas de uma vez)
+    tabela_fornecedores = aplicar_regras('fornecedores', agregados.tabela_fornecedores())
+    por_recomendacao = tabela_fornecedores['recomendacao'].value_counts()
+    fornecedores_aprovar = int(por_recomendacao.get(APROVAR, 0))
+    fornecedores_revisar = int(por_recomendacao.get(REVISAR, 0))
+    fornecedores_rejeitar = int(por_recomendacao.get(REJEITAR, 0))
+    valor_rejeitar = float(tabela_fornecedores.loc[tabela_fornecedores['recomendacao'] == REJEITAR, 'valor'].sum())
     
     # Distribuição por filial
     filiais_info = []
-    for filial in df['Filial'].unique():
-        dados_filial = df[df['Filial'] == filial]
+    for filial, dados_filial in agregados.tabela_filiais().iterrows():
         filiais_info.append({
             'nome': filial,
-            'itens': len(dados_filial),
-            'cobertura_media': dados_filial['Cobertura Atual'].mean(),
-            'valor': dados_filial['Saldo Pedido'].sum()
+            'itens': int(dados_filial['itens']),
+            'cobertura_media': float(dados_filial['cobertura_media']),
+            'valor': float(dados_filial['valor']),
+            'quantis_cobertura': {nome: float(dados_filial[nome]) for nome in QUANTIS_COBERTURA}
         })
     
     resumo = {
         'metricas_gerais': {
             'total_fornecedores': total_fornecedores,
+            'total_cargas': metricas['total_cargas'],
+            'total_pedidos': metricas['total_pedidos'],
+            'total_codigos': metricas['total_codigos'],
             'total_itens': total_itens,
             'valor_total': valor_total,
             'cobertura_media': cobertura_media
@@ -427,72 +1058,48 @@ def gerar_resumo_analise(df):
     
     return resumo
 
-def criar_aba_faixas_por_filial(wb, df):
+def criar_aba_faixas_por_filial(wb, agregados):
     """
     Cria aba com análise detalhada de faixas por filial
     """
     
-    ws = wb.create_sheet("📍 Faixas por Filial")
-    
-    # Título principal
-    ws.cell(row=1, column=1, value="ANÁLISE DE FAIXAS DE COBERTURA POR FILIAL").font = Font(bold=True, size=16, color="FFFFFF")
-    ws.cell(row=1, column=1).fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    ws.merge_cells('A1:J1')
-    
-    # Cabeçalhos
-    headers = [
-        'Filial', 'Total Itens', 'Valor Total (R$)', 'Cobertura Média',
-        'Até 44 dias', '% Até 44', 'Entre 45-70 dias', '% 45-70',
-        'Acima 71 dias', '% Acima 71'
-    ]
-    
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=3, column=col, value=header)
-        cell.font = Font(bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
-        cell.alignment = Alignment(horizontal="center", vertical="center")
+    # Aba com título principal e cabeçalhos do modelo
+    ws = MODELO_FAIXAS_FILIAL.abrir(wb)
     
     # Analisar cada filial
     filiais_analise = []
     
-    for filial in df['Filial'].unique():
-        dados_filial = df[df['Filial'] == filial]
-        total_itens = len(dados_filial)
-        valor_total = dados_filial['Saldo Pedido'].sum()
-        cobertura_media = dados_filial['Cobertura Atual'].mean()
-        
-        # Distribuição por faixas
-        ate_44 = len(dados_filial[dados_filial['Cobertura Atual'] <= 44])
-        entre_45_70 = len(dados_filial[(dados_filial['Cobertura Atual'] >= 45) & (dados_filial['Cobertura Atual'] <= 70)])
-        acima_71 = len(dados_filial[dados_filial['Cobertura Atual'] >= 71])
-        
-        perc_ate_44 = (ate_44 / total_itens) * 100
-        perc_45_70 = (entre_45_70 / total_itens) * 100
-        perc_acima_71 = (acima_71 / total_itens) * 100
-        
+    for filial, dados_filial in aplicar_regras('filiais', agregados.tabela_filiais()).iterrows():
         filiais_analise.append({
             'filial': filial,
-            'total_itens': total_itens,
-            'valor_total': valor_total,
-            'cobertura_media': cobertura_media,
-            'ate_44': ate_44,
-            'perc_ate_44': perc_ate_44,
-            'entre_45_70': entre_45_70,
-            'perc_45_70': perc_45_70,
-            'acima_71': acima_71,
-            'perc_acima_71': perc_acima_71
+            'total_itens': dados_filial['itens'],
+            'valor_total': dados_filial['valor'],
+            'cobertura_media': dados_filial['cobertura_media'],
+            'p50': dados_filial['p50'],
+            'p90': dados_filial['p90'],
+            'p99': dados_filial['p99'],
+            'ate_44': dados_filial['ate_44'],
+            'perc_ate_44': dados_filial['perc_ate_44'],
+            'entre_45_70': dados_filial['entre_45_70'],
+            'perc_45_70': dados_filial['perc_45_70'],
+            'acima_71': dados_filial['acima_71'],
+            'perc_acima_71': dados_filial['perc_acima_71'],
+            'recomendacao': dados_filial['recomendacao']
         })
     
     # Ordenar por % acima de 71 dias (mais críticos primeiro)
     filiais_analise.sort(key=lambda x: x['perc_acima_71'], reverse=True)
     
     # Preencher dados com formatação brasileira
-    for row, filial_data in enumerate(filiais_analise, 4):
+    for row, filial_data in enumerate(filiais_analise, MODELO_FAIXAS_FILIAL.primeira_linha):
         dados = [
             filial_data['filial'],
             formatar_numero_brasileiro(filial_data['total_itens']),
             formatar_moeda_brasileira(filial_data['valor_total']),
             formatar_numero_brasileiro(filial_data['cobertura_media']),
+            formatar_numero_brasileiro(filial_data['p50']),
+            formatar_numero_brasileiro(filial_data['p90']),
+            formatar_numero_brasileiro(filial_data['p99']),
             formatar_numero_brasileiro(filial_data['ate_44']),
             formatar_percentual_brasileiro(filial_data['perc_ate_44']),
             formatar_numero_brasileiro(filial_data['entre_45_70']),
@@ -501,55 +1108,44 @@ def criar_aba_faixas_por_filial(wb, df):
             formatar_percentual_brasileiro(filial_data['perc_acima_71'])
         ]
         
+        # Colorir baseado na criticidade
+        estilo = ESTILOS_RECOMENDACAO_CENTRO[filial_data['recomendacao']]
         for col, valor in enumerate(dados, 1):
-            cell = ws.cell(row=row, column=col, value=valor)
-            
-            # Colorir baseado na criticidade
-            if filial_data['perc_acima_71'] > 50:
-                cell.fill = PatternFill(start_color="FFD6D6", end_color="FFD6D6", fill_type="solid")
-            elif filial_data['perc_acima_71'] > 25:
-                cell.fill = PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid")
-            else:
-                cell.fill = PatternFill(start_color="E6F3E6", end_color="E6F3E6", fill_type="solid")
-            
-            cell.alignment = Alignment(horizontal="center", vertical="center")
+            ws.escrever(row, col, valor, estilo)
     
     # Adicionar detalhamento por fornecedor dentro de cada filial
-    row_atual = len(filiais_analise) + 6
+    row_atual = MODELO_FAIXAS_FILIAL.primeira_linha + len(filiais_analise) + 2
+    pares = aplicar_regras('pares', agregados.tabela_pares())
     
     for filial_data in filiais_analise:
         filial = filial_data['filial']
-        dados_filial = df[df['Filial'] == filial]
+        dados_filial = pares[pares['Filial'] == filial]
         
         # Título da filial
-        ws.cell(row=row_atual, column=1, value=f"DETALHAMENTO - {filial}").font = Font(bold=True, size=12)
-        ws.cell(row=row_atual, column=1).fill = PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid")
-        ws.merge_cells(f'A{row_atual}:J{row_atual}')
+        ws.escrever(row_atual, 1, f"DETALHAMENTO - {filial}", ESTILO_SECAO_FILIAL)
+        ws.merge_cells(f'A{row_atual}:M{row_atual}')
         
         row_atual += 2
         
         # Cabeçalhos do detalhamento
-        headers_det = ['Fornecedor', 'Itens', 'Até 44d', '% 44d', '45-70d', '% 45-70d', 'Acima 71d', '% 71d', 'Cobertura Média']
-        for col, header in enumerate(headers_det, 1):
-            cell = ws.cell(row=row_atual, column=col, value=header)
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color="F2F2F2", end_color="F2F2F2", fill_type="solid")
+        for col, header in enumerate(CABECALHOS_DETALHAMENTO_FILIAL, 1):
+            ws.escrever(row_atual, col, header, ESTILO_SUBCABECALHO)
         
         row_atual += 1
         
         # Analisar fornecedores da filial
-        for fornecedor in dados_filial['Fornecedor'].unique():
-            dados_forn_filial = dados_filial[dados_filial['Fornecedor'] == fornecedor]
-            total_itens_forn = len(dados_forn_filial)
-            cobertura_media_forn = dados_forn_filial['Cobertura Atual'].mean()
+        for _, dados_forn_filial in dados_filial.iterrows():
+            fornecedor = dados_forn_filial['Fornecedor']
+            total_itens_forn = dados_forn_filial['itens']
+            cobertura_media_forn = dados_forn_filial['cobertura_media']
             
-            ate_44_forn = len(dados_forn_filial[dados_forn_filial['Cobertura Atual'] <= 44])
-            entre_45_70_forn = len(dados_forn_filial[(dados_forn_filial['Cobertura Atual'] >= 45) & (dados_forn_filial['Cobertura Atual'] <= 70)])
-            acima_71_forn = len(dados_forn_filial[dados_forn_filial['Cobertura Atual'] >= 71])
+            ate_44_forn = dados_forn_filial['ate_44']
+            entre_45_70_forn = dados_forn_filial['entre_45_70']
+            acima_71_forn = dados_forn_filial['acima_71']
             
-            perc_ate_44_forn = (ate_44_forn / total_itens_forn) * 100
-            perc_45_70_forn = (entre_45_70_forn / total_itens_forn) * 100
-            perc_acima_71_forn = (acima_71_forn / total_itens_forn) * 100
+            perc_ate_44_forn = dados_forn_filial['perc_ate_44']
+            perc_45_70_forn = dados_forn_filial['perc_45_70']
+            perc_acima_71_forn = dados_forn_filial['perc_acima_71']
             
             dados_forn = [
                 fornecedor[:25],
@@ -563,102 +1159,64 @@ def criar_aba_faixas_por_filial(wb, df):
                 formatar_numero_brasileiro(cobertura_media_forn)
             ]
             
+            # Colorir baseado na criticidade do fornecedor
+            estilo = ESTILOS_RECOMENDACAO_DETALHAMENTO[dados_forn_filial['recomendacao']]
             for col, valor in enumerate(dados_forn, 1):
-                cell = ws.cell(row=row_atual, column=col, value=valor)
-                
-                # Colorir baseado na criticidade do fornecedor
-                if perc_acima_71_forn > 50:
-                    cell.fill = PatternFill(start_color="FFE6E6", end_color="FFE6E6", fill_type="solid")
-                elif perc_acima_71_forn > 25:
-                    cell.fill = PatternFill(start_color="FFF9E6", end_color="FFF9E6", fill_type="solid")
+                ws.escrever(row_atual, col, valor, estilo)
             
             row_atual += 1
         
         row_atual += 2
-    
-    # Ajustar larguras
-    larguras = [25, 10, 15, 10, 10, 10, 10, 10, 15]
-    for col, largura in enumerate(larguras, 1):
-        from openpyxl.utils import get_column_letter
-        ws.column_dimensions[get_column_letter(col)].width = largura
 
-def criar_aba_faixas_fornecedor_filial(wb, df):
+def criar_aba_faixas_fornecedor_filial(wb, agregados):
 
     # 6. ABA DISTRIBUIÇÃO POR VALOR
     """
     Cria aba com análise detalhada de faixas por fornecedor e filial (TODOS)
     """
     
-    ws = wb.create_sheet("🏭 Faixas Fornecedor x Filial")
-    
-    # Título principal
-    ws.cell(row=1, column=1, value="ANÁLISE DE FAIXAS POR FORNECEDOR E FILIAL - TODOS").font = Font(bold=True, size=16, color="FFFFFF")
-    ws.cell(row=1, column=1).fill = PatternFill(start_color="C5504B", end_color="C5504B", fill_type="solid")
-    ws.merge_cells('A1:K1')
-    
-    # Cabeçalhos
-    headers = [
-        'Fornecedor', 'Filial', 'Total Itens', 'Valor Total (R$)', 'Cobertura Média',
-        'Até 44 dias', '% Até 44', 'Entre 45-70 dias', '% 45-70',
-        'Acima 71 dias', '% Acima 71'
-    ]
-    
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=3, column=col, value=header)
-        cell.font = Font(bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color="C5504B", end_color="C5504B", fill_type="solid")
-        cell.alignment = Alignment(horizontal="center", vertical="center")
+    # Aba com título principal e cabeçalhos do modelo
+    ws = MODELO_FAIXAS_FORNECEDOR_FILIAL.abrir(wb)
     
     # Analisar cada combinação fornecedor-filial
     combinacoes_analise = []
     
-    for fornecedor in df['Fornecedor'].unique():
-        dados_forn = df[df['Fornecedor'] == fornecedor]
-        
-        for filial in dados_forn['Filial'].unique():
-            dados_forn_filial = dados_forn[dados_forn['Filial'] == filial]
-            
-            if len(dados_forn_filial) == 0:
-                continue
-            
-            total_itens = len(dados_forn_filial)
-            valor_total = dados_forn_filial['Saldo Pedido'].sum()
-            cobertura_media = dados_forn_filial['Cobertura Atual'].mean()
-            
-            # Distribuição por faixas
-            ate_44 = len(dados_forn_filial[dados_forn_filial['Cobertura Atual'] <= 44])
-            entre_45_70 = len(dados_forn_filial[(dados_forn_filial['Cobertura Atual'] >= 45) & (dados_forn_filial['Cobertura Atual'] <= 70)])
-            acima_71 = len(dados_forn_filial[dados_forn_filial['Cobertura Atual'] >= 71])
-            
-            perc_ate_44 = (ate_44 / total_itens) * 100
-            perc_45_70 = (entre_45_70 / total_itens) * 100
-            perc_acima_71 = (acima_71 / total_itens) * 100
-            
-            combinacoes_analise.append({
-                'fornecedor': fornecedor,
-                'filial': filial,
-                'total_itens': total_itens,
-                'valor_total': valor_total,
-                'cobertura_media': cobertura_media,
-                'ate_44': ate_44,
-                'perc_ate_44': perc_ate_44,
-                'entre_45_70': entre_45_70,
-                'perc_45_70': perc_45_70,
-                'acima_71': acima_71,
-                'perc_acima_71': perc_acima_71
-            })
+    # Fornecedores na ordem de primeira ocorrência e, dentro de cada um, suas filiais
+    pares = aplicar_regras('pares', agregados.tabela_pares()).sort_values(['ordem_fornecedor', 'ordem'])
+    
+    for _, dados_forn_filial in pares.iterrows():
+        combinacoes_analise.append({
+            'fornecedor': dados_forn_filial['Fornecedor'],
+            'filial': dados_forn_filial['Filial'],
+            'total_itens': dados_forn_filial['itens'],
+            'valor_total': dados_forn_filial['valor'],
+            'cobertura_media': dados_forn_filial['cobertura_media'],
+            'p50': dados_forn_filial['p50'],
+            'p90': dados_forn_filial['p90'],
+            'p99': dados_forn_filial['p99'],
+            'ate_44': dados_forn_filial['ate_44'],
+            'perc_ate_44': dados_forn_filial['perc_ate_44'],
+            'entre_45_70': dados_forn_filial['entre_45_70'],
+            'perc_45_70': dados_forn_filial['perc_45_70'],
+            'acima_71': dados_forn_filial['acima_71'],
+            'perc_acima_71': dados_forn_filial['perc_acima_71'],
+            'recomendacao': dados_forn_filial['recomendacao']
+        })
     
     # Ordenar por % acima de 71 dias (mais críticos primeiro)
     combinacoes_analise.sort(key=lambda x: x['perc_acima_71'], reverse=True)
     
     # Preencher dados com formatação brasileira
-    for row, comb_data in enumerate(combinacoes_analise, 4):
+    for row, comb_data in enumerate(combinacoes_analise, MODELO_FAIXAS_FORNECEDOR_FILIAL.primeira_linha):
         dados = [
             comb_data['fornecedor'][:25],
             comb_data['filial'],
             formatar_numero_brasileiro(comb_data['total_itens']),
             formatar_moeda_brasileira(comb_data['valor_total']),
             formatar_numero_brasileiro(comb_data['cobertura_media']),
+            formatar_numero_brasileiro(comb_data['p50']),
+            formatar_numero_brasileiro(comb_data['p90']),
+            formatar_numero_brasileiro(comb_data['p99']),
             formatar_numero_brasileiro(comb_data['ate_44']),
             formatar_percentual_brasileiro(comb_data['perc_ate_44']),
             formatar_numero_brasileiro(comb_data['entre_45_70']),
@@ -667,87 +1225,729 @@ def criar_aba_faixas_fornecedor_filial(wb, df):
             formatar_percentual_brasileiro(comb_data['perc_acima_71'])
         ]
         
+        # Colorir baseado na criticidade
+        estilo = ESTILOS_RECOMENDACAO_CENTRO[comb_data['recomendacao']]
         for col, valor in enumerate(dados, 1):
-            cell = ws.cell(row=row, column=col, value=valor)
-            
-            # Colorir baseado na criticidade
-            if comb_data['perc_acima_71'] > 50:
-                cell.fill = PatternFill(start_color="FFD6D6", end_color="FFD6D6", fill_type="solid")
-            elif comb_data['perc_acima_71'] > 25:
-                cell.fill = PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid")
-            else:
-                cell.fill = PatternFill(start_color="E6F3E6", end_color="E6F3E6", fill_type="solid")
-            
-            cell.alignment = Alignment(horizontal="center", vertical="center")
+            ws.escrever(row, col, valor, estilo)
+
+def preparar_planilhas_fornecedores(agregados, quantidade):
+    """
+    Separa, a partir dos agregados de uma análise, os dados da planilha de
+    cada fornecedor (índice, fornecedor, totais, linhas por filial) em até
+    `quantidade` tarefas de fornecedores consecutivos
+    """
+    fornecedores = aplicar_regras('fornecedores', agregados.tabela_fornecedores())
+    pares = aplicar_regras('pares', agregados.tabela_pares()).sort_values(['ordem_fornecedor', 'ordem'])
+    filiais_por_fornecedor = {
+        fornecedor: grupo.to_dict('records') for fornecedor, grupo in pares.groupby('Fornecedor', sort=False)
+    }
     
-    # Ajustar larguras
-    larguras = [25, 20, 10, 15, 12, 10, 10, 12, 10, 10, 15]
-    for col, largura in enumerate(larguras, 1):
-        from openpyxl.utils import get_column_letter
-        ws.column_dimensions[get_column_letter(col)].width = largura
+    planilhas = [
+        (indice, fornecedor, dados_forn.to_dict(), filiais_por_fornecedor.get(fornecedor, []))
+        for indice, (fornecedor, dados_forn) in enumerate(fornecedores.sort_values('ordem').iterrows(), 1)
+    ]
+    tamanho = -(-len(planilhas) // max(1, quantidade))
+    return [planilhas[inicio:inicio + tamanho] for inicio in range(0, len(planilhas), tamanho)]
 
-@analise_bp.route('/upload', methods=['POST'])
-def upload_arquivo():
+# Detalhes do estado aberto por este processo do pool da exportação
+_detalhes_abertos = {}
+
+def gerar_planilhas_fornecedores(tarefa):
     """
-    Endpoint para upload e processamento do arquivo
+    Executado no processo filho: lê do estado salvo só as linhas dos
+    fornecedores da tarefa e gera em memória a planilha de cada um;
+    retorna [(nome do arquivo, bytes)]
+    """
+    caminho_estado, planilhas = tarefa
+    if caminho_estado not in _detalhes_abertos:
+        _detalhes_abertos.clear()
+        _detalhes_abertos[caminho_estado] = ler_estado(caminho_estado)[1]
+    linhas_por_fornecedor = separar_por_fornecedor(
+        _detalhes_abertos[caminho_estado], [fornecedor for _, fornecedor, _, _ in planilhas])
+    
+    arquivos = []
+    for indice, fornecedor, dados_forn, filiais in planilhas:
+        buffer = io.BytesIO()
+        wb = criar_planilha(buffer)
+        criar_aba_resumo_fornecedor(wb, fornecedor, dados_forn)
+        criar_aba_filiais_fornecedor(wb, filiais)
+        criar_aba_detalhes_mercadoria(wb, DetalhesOrdenados(linhas_por_fornecedor.pop(fornecedor)))
+        
+        wb.salvar()
+        nome = secure_filename(str(fornecedor)) or 'fornecedor'
+        arquivos.append((f"{indice:03d}_{nome}.xlsx", buffer.getvalue()))
+    return arquivos
+
+def criar_aba_resumo_fornecedor(wb, fornecedor, dados_forn):
+    """
+    Cria aba com os totais e a recomendação de um fornecedor
+    """
+    
+    ws = MODELO_RESUMO_FORNECEDOR.abrir(wb)
+    
+    recomendacao = dados_forn['recomendacao']
+    dados_resumo = [
+        [str(fornecedor), ""],
+        ["Data", datetime.now().strftime("%d/%m/%Y %H:%M")],
+        ["", ""],
+        ["Total de Itens", formatar_numero_brasileiro(dados_forn['itens'])],
+        ["Total de Cargas", formatar_numero_brasileiro(dados_forn['total_cargas'])],
+        ["Total de Pedidos", formatar_numero_brasileiro(dados_forn['total_pedidos'])],
+        ["Total de Códigos", formatar_numero_brasileiro(dados_forn['total_codigos'])],
+        ["Filiais Atendidas", formatar_numero_brasileiro(dados_forn['filiais'])],
+        ["Valor Total", formatar_moeda_brasileira(dados_forn['valor'])],
+        ["Cobertura Média", f"{formatar_numero_brasileiro(dados_forn['cobertura_media'])} dias"],
+        ["Cobertura P50 / P90 / P99", " / ".join(formatar_numero_brasileiro(dados_forn[q]) for q in QUANTIS_COBERTURA)],
+        ["% Até 44 dias", formatar_percentual_brasileiro(dados_forn['perc_ate_44'])],
+        ["% Entre 45-70 dias", formatar_percentual_brasileiro(dados_forn['perc_45_70'])],
+        ["% Acima 71 dias", formatar_percentual_brasileiro(dados_forn['perc_acima_71'])],
+        ["Recomendação", ROTULOS_RECOMENDACAO[recomendacao]],
+    ]
+    
+    for row, (label, valor) in enumerate(dados_resumo, 1):
+        ws.escrever(row, 1, label, ESTILO_TITULO_RESUMO if row == 1 else ESTILO_TEXTO)
+        
+        # Colorir a recomendação
+        ws.escrever(row, 2, valor, ESTILOS_RECOMENDACAO_DESTAQUE[recomendacao] if row == len(dados_resumo) else ESTILO_TEXTO)
+
+def criar_aba_filiais_fornecedor(wb, filiais):
+    """
+    Cria aba com as faixas de cobertura de um fornecedor em cada filial
+    """
+    
+    ws = MODELO_FILIAIS_FORNECEDOR.abrir(wb)
+    
+    for row, dados_filial in enumerate(filiais, MODELO_FILIAIS_FORNECEDOR.primeira_linha):
+        dados = [
+            dados_filial['Filial'],
+            formatar_numero_brasileiro(dados_filial['itens']),
+            formatar_moeda_brasileira(dados_filial['valor']),
+            formatar_numero_brasileiro(dados_filial['cobertura_media']),
+            formatar_numero_brasileiro(dados_filial['p90']),
+            formatar_numero_brasileiro(dados_filial['ate_44']),
+            formatar_percentual_brasileiro(dados_filial['perc_ate_44']),
+            formatar_numero_brasileiro(dados_filial['entre_45_70']),
+            formatar_percentual_brasileiro(dados_filial['perc_45_70']),
+            formatar_numero_brasileiro(dados_filial['acima_71']),
+            formatar_percentual_brasileiro(dados_filial['perc_acima_71'])
+        ]
+        
+        estilo = ESTILOS_RECOMENDACAO_CENTRO[dados_filial['recomendacao']]
+        for col, valor in enumerate(dados, 1):
+            ws.escrever(row, col, valor, estilo)
+
+def arquivo_planilha(nome_estado, perfil):
+    """
+    Nome do arquivo da planilha de uma análise em um perfil
+    """
+    if perfil == PERFIL_COMPLETO:
+        return f"{nome_estado}.xlsx"
+    return f"{nome_estado}_{perfil}.xlsx"
+
+def identificar_planilha(filename):
+    """
+    Separa o nome de arquivo de uma planilha em (nome do estado, perfil)
+    """
+    nome = os.path.splitext(filename)[0]
+    for perfil in PERFIS_RELATORIO:
+        if nome.endswith(f"_{perfil}"):
+            return nome[:-len(perfil) - 1], perfil
+    return nome, PERFIL_COMPLETO
+
+def executar_analise(filepath, timestamp, modo, tamanho_lote, contagem, backend, planilha, perfil,
+                     progresso=None, base=None, listagem=None):
+    """
+    Processa o arquivo salvo e move a planilha para a pasta de downloads.
+    O estado da análise fica salvo para gerar outros perfis; com planilha
+    'sob_demanda' a planilha só é gerada no primeiro download. Uploads
+    idênticos simultâneos (mesmo conteúdo e parâmetros) esperam um único
+    cálculo; com `base` a análise é incremental em relação a essa análise
+    e com `listagem` a agenda é conciliada com a listagem de NF/pedidos.
+    A memória é reservada antes de entrar na coalescência, para que a espera
+    por admissão não segure os uploads idênticos (levanta CapacidadeEsgotada).
+    Retorna {'download_url', 'resumo'} ou {'error'}.
+    """
+    def admitir():
+        try:
+            memoria = planejar_analise(filepath, modo, tamanho_lote, base)[-1]
+        except AnaliseRecusada:
+            # A ingestão recusa o arquivo de novo, com a mensagem
+            return None
+        return reservar_memoria(memoria)
+    
+    def analisar(reserva):
+        # Nome do estado, da planilha e do histórico: o timestamp só tem
+        # segundos, e o sufixo aleatório separa análises do mesmo segundo
+        nome_estado = f"analise_{timestamp}_{uuid.uuid4().hex}"
+        output_filename = arquivo_planilha(nome_estado, perfil)
+        gerar_planilha = planilha != PLANILHA_SOB_DEMANDA
+        
+        output_file, resultado = processar_arquivo_cargas(
+            filepath, modo, tamanho_lote, contagem, backend, progresso, nome_estado, perfil, gerar_planilha,
+            historico=True, base=base, listagem=listagem, reserva=reserva)
+        
+        if output_file is None:
+            return {'error': resultado}
+        
+        if gerar_planilha:
+            # Mover arquivo temporário para local permanente
+            import shutil
+            shutil.move(output_file, os.path.join(UPLOAD_FOLDER, output_filename))
+        
+        return {
+            'download_url': f'/api/analise/download/{output_filename}',
+            'resumo': resultado
+        }
+    
+    chave = chave_analise(filepath, modo, tamanho_lote, contagem, backend, planilha, perfil, base,
+                          listagem and hash_conteudo(listagem))
+    return executar_uma_vez(chave, analisar, admitir)
+
+def gerar_planilha_sob_demanda(filename):
+    """
+    Gera (uma única vez entre os workers) a planilha de uma análise a partir
+    do estado salvo; retorna False se não houver estado para esse arquivo
     """
+    nome_estado, perfil = identificar_planilha(filename)
+    if not existe_estado(nome_estado):
+        return False
     
+    filepath = os.path.join(UPLOAD_FOLDER, filename)
+    
+    def gerar():
+        if not os.path.exists(filepath):
+            agregados, detalhes = carregar_estado(nome_estado)
+            output_file = gerar_excel_analise(agregados, detalhes, perfil=perfil, extras=carregar_extras(nome_estado))
+            import shutil
+            shutil.move(output_file, filepath)
+        return {'arquivo': filename}
+    
+    executar_uma_vez(f"planilha_{os.path.splitext(filename)[0]}", gerar)
+    return os.path.exists(filepath)
+
+def gerar_planilha_sessao(sessao):
+    """
+    Gera o workbook final de uma sessão de aprovação: totais por decisão,
+    decisões por fornecedor, filial e faixa de valor e todos os itens
+    """
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx')
+    temp_file.close()
+    wb = criar_planilha(temp_file.name)
+    
+    try:
+        criar_aba_resumo_sessao(wb, sessao)
+        for tipo, modelo in (('fornecedor', MODELO_SESSAO_FORNECEDOR), ('filial', MODELO_SESSAO_FILIAL),
+                             ('faixa', MODELO_SESSAO_FAIXA)):
+            criar_aba_decisoes_sessao(wb, modelo, totais_grupos(sessao, tipo=tipo))
+        criar_aba_itens_sessao(wb, sessao)
+        wb.salvar()
+    except Exception:
+        os.remove(temp_file.name)
+        raise
+    
+    return temp_file.name
+
+def criar_aba_resumo_sessao(wb, sessao):
+    """
+    Cria aba com itens e valor por decisão e a economia potencial da sessão
+    """
+    ws = MODELO_RESUMO_SESSAO.abrir(wb)
+    
+    row = MODELO_RESUMO_SESSAO.primeira_linha
+    totais = sessao.totais()
+    for decisao in DECISOES_SESSAO:
+        dados = [
+            ROTULOS_RECOMENDACAO[decisao],
+            formatar_numero_brasileiro(totais[decisao]['itens']),
+            formatar_moeda_brasileira(totais[decisao]['valor'])
+        ]
+        for col, valor in enumerate(dados, 1):
+            ws.escrever(row, col, valor, ESTILOS_RECOMENDACAO_ESQUERDA[decisao])
+        row += 1
+    
+    total_itens = sum(total['itens'] for total in totais.values())
+    total_valor = sum(total['valor'] for total in totais.values())
+    for col, valor in enumerate(["TOTAL", formatar_numero_brasileiro(total_itens),
+                                 formatar_moeda_brasileira(total_valor)], 1):
+        ws.escrever(row, col, valor, ESTILO_TOTAL)
+    
+    row += 2
+    informacoes = [
+        ("Análise", sessao.analise),
+        ("Economia Potencial", formatar_moeda_brasileira(sessao.valor_rejeitar)),
+        ("Atualizada em", sessao.atualizada.strftime('%d/%m/%Y %H:%M')),
+    ]
+    for rotulo, valor in informacoes:
+        ws.escrever(row, 1, rotulo, ESTILO_SUBCABECALHO)
+        ws.escrever(row, 2, valor, ESTILO_TEXTO)
+        row += 1
+
+def criar_aba_decisoes_sessao(wb, modelo, totais):
+    """
+    Cria aba com itens e valor por decisão de cada grupo (fornecedor, filial ou faixa)
+    """
+    ws = modelo.abrir(wb)
+    
+    for row, total in enumerate(totais, modelo.primeira_linha):
+        dados = [total.grupo]
+        for decisao in DECISOES_SESSAO:
+            dados.append(formatar_numero_brasileiro(getattr(total, f'itens_{decisao}')))
+            dados.append(formatar_moeda_brasileira(getattr(total, f'valor_{decisao}')))
+        
+        # Destaca grupos com itens rejeitados ou ainda em revisão
+        if total.itens_rejeitar:
+            estilo = ESTILOS_RECOMENDACAO[REJEITAR]
+        elif total.itens_revisar:
+            estilo = ESTILOS_RECOMENDACAO[REVISAR]
+        else:
+            estilo = ESTILOS_RECOMENDACAO[APROVAR]
+        for col, valor in enumerate(dados, 1):
+            ws.escrever(row, col, valor, estilo)
+
+def criar_aba_itens_sessao(wb, sessao):
+    """
+    Cria aba com todos os itens da sessão e a decisão de cada um, da maior para a menor cobertura
+    """
+    ws = MODELO_ITENS_SESSAO.abrir(wb)
+    
+    for row, item in enumerate(listar_itens(sessao).yield_per(1000), MODELO_ITENS_SESSAO.primeira_linha):
+        dados = [
+            item.carga,
+            item.pedido,
+            item.codigo,
+            item.fornecedor[:25],
+            item.filial,
+            item.mercadoria[:40],
+            formatar_moeda_brasileira(item.saldo),
+            formatar_numero_brasileiro(item.cobertura),
+            ROTULOS_RECOMENDACAO[item.decisao]
+        ]
+        for col, valor in enumerate(dados, 1):
+            ws.escrever(row, col, valor, ESTILOS_RECOMENDACAO_ESQUERDA[item.decisao])
+
+def ler_parametros_analise():
+    """
+    Parâmetros de processamento enviados com o arquivo
+    ('lotes' para agendas maiores que a memória, 'paralelo' para agendas nacionais)
+    """
+    return (
+        request.form.get('modo', MODO_AUTOMATICO),
+        request.form.get('tamanho_lote', TAMANHO_LOTE_PADRAO, type=int),
+        request.form.get('contagem'),
+        request.form.get('backend'),
+        request.form.get('planilha', PLANILHA_PADRAO),
+        request.form.get('perfil', PERFIL_PADRAO),
+    )
+
+def ler_base_delta():
+    """
+    Análise base de uma análise incremental (parâmetro `base`: nome da análise,
+    nome da planilha ou 'ultima'); retorna (base, None) ou (None, resposta de erro)
+    """
+    base = request.form.get('base')
+    if not base:
+        return None, None
+    
+    if base == BASE_ULTIMA:
+        base = next((analise.nome for analise in analises_recentes() if existe_estado(analise.nome)), None)
+        if base is None:
+            return None, (jsonify({'error': 'Nenhuma análise anterior disponível para comparação'}), 400)
+    else:
+        base = identificar_planilha(os.path.basename(base))[0]
+        if not existe_estado(base):
+            return None, (jsonify({'error': f'Análise base não encontrada: {base}'}), 404)
+    return base, None
+
+def salvar_upload():
+    """
+    Valida e salva o arquivo enviado, ou os arquivos de um lote (vários
+    campos 'file', um por CD); retorna (filepath ou lista de filepaths,
+    timestamp) ou (None, resposta de erro)
+    """
     if 'file' not in request.files:
-        return jsonify({'error': 'Nenhum arquivo enviado'}), 400
+        return None, (jsonify({'error': 'Nenhum arquivo enviado'}), 400)
     
-    file = request.files['file']
+    files = request.files.getlist('file')
     
-    if file.filename == '':
-        return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
+    if any(file.filename == '' for file in files):
+        return None, (jsonify({'error': 'Nenhum arquivo selecionado'}), 400)
     
-    if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    if not all(file and allowed_file(file.filename) for file in files):
+        return None, (jsonify({'error': 'Tipo de arquivo não permitido'}), 400)
+    
+    if len(files) > MAXIMO_ARQUIVOS_LOTE:
+        return None, (jsonify({'error': f'Máximo de {MAXIMO_ARQUIVOS_LOTE} arquivos por lote'}), 400)
+    
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    if len(files) == 1:
+        filename = secure_filename(files[0].filename)
         filename = f"{timestamp}_{filename}"
         filepath = os.path.join(UPLOAD_FOLDER, filename)
+        files[0].save(filepath)
+        return filepath, timestamp
+    
+    # Lote: uma pasta por upload e a posição no nome (os CDs exportam com o mesmo nome)
+    pasta = tempfile.mkdtemp(prefix=f"{timestamp}_lote_", dir=UPLOAD_FOLDER)
+    filepaths = []
+    for posicao, file in enumerate(files, 1):
+        filepath = os.path.join(pasta, f"{posicao:02d}_{secure_filename(file.filename)}")
+        file.save(filepath)
+        filepaths.append(filepath)
+    return filepaths, timestamp
+
+def salvar_listagem(timestamp):
+    """
+    Salva a listagem de NF/pedidos opcional (campo 'conciliacao');
+    retorna (filepath ou None, None) ou (None, resposta de erro)
+    """
+    file = request.files.get('conciliacao')
+    if file is None or file.filename == '':
+        return None, None
+    
+    if not allowed_file(file.filename):
+        return None, (jsonify({'error': 'Tipo de arquivo de conciliação não permitido'}), 400)
+    
+    filepath = os.path.join(UPLOAD_FOLDER, f"{timestamp}_conciliacao_{secure_filename(file.filename)}")
+    file.save(filepath)
+    return filepath, None
+
+def remover_uploads(*caminhos):
+    for caminho in caminhos:
+        if isinstance(caminho, list):
+            # Lote: os arquivos e a pasta do lote
+            import shutil
+            if caminho:
+                shutil.rmtree(os.path.dirname(caminho[0]), ignore_errors=True)
+        elif caminho and os.path.exists(caminho):
+            os.remove(caminho)
+
+@analise_bp.route('/upload', methods=['POST'])
+def upload_arquivo():
+    """
+    Endpoint para upload e processamento do arquivo
+    """
+    filepath, timestamp = salvar_upload()
+    if filepath is None:
+        return timestamp
+    listagem = None
+    
+    try:
+        listagem, erro = salvar_listagem(timestamp)
+        if erro:
+            return erro
+        
+        parametros = ler_parametros_analise()
+        if parametros[-1] not in PERFIS_RELATORIO:
+            return jsonify({'error': f'Perfil de relatório desconhecido: {parametros[-1]}'}), 400
+        
+        base, erro = ler_base_delta()
+        if erro:
+            return erro
         
+        resultado = executar_analise(filepath, timestamp, *parametros, base=base, listagem=listagem)
+        
+        if 'error' in resultado:
+            return jsonify({'error': resultado['error']}), 400
+        
+        return jsonify({
+            'success': True,
+            'message': 'Arquivo processado com sucesso!',
+            'download_url': resultado['download_url'],
+            'resumo': resultado['resumo']
+        })
+        
+    except CapacidadeEsgotada as e:
+        resposta = jsonify({'error': str(e)})
+        resposta.headers['Retry-After'] = str(e.tentar_novamente_em)
+        return resposta, 429
+    except Exception as e:
+        return jsonify({'error': f'Erro ao processar arquivo: {str(e)}'}), 500
+    finally:
+        # Limpar arquivos enviados
+        remover_uploads(filepath, listagem)
+
+@analise_bp.route('/iniciar', methods=['POST'])
+def iniciar_analise():
+    """
+    Endpoint que recebe o arquivo e processa em segundo plano; o andamento
+    é acompanhado por /api/analise/progresso/<id> (server-sent events)
+    """
+    filepath, timestamp = salvar_upload()
+    if filepath is None:
+        return timestamp
+    
+    listagem, erro = salvar_listagem(timestamp)
+    if erro:
+        remover_uploads(filepath)
+        return erro
+    
+    parametros = ler_parametros_analise()
+    if parametros[-1] not in PERFIS_RELATORIO:
+        remover_uploads(filepath, listagem)
+        return jsonify({'error': f'Perfil de relatório desconhecido: {parametros[-1]}'}), 400
+    
+    base, erro = ler_base_delta()
+    if erro:
+        remover_uploads(filepath, listagem)
+        return erro
+    
+    remover_expirados()
+    progresso = Progresso()
+    app = current_app._get_current_object()
+    
+    def executar():
         try:
-            file.save(filepath)
-            
-            # Processar arquivo
-            output_file, resultado = processar_arquivo_cargas(filepath)
-            
-            if output_file is None:
-                return jsonify({'error': resultado}), 400
-            
-            # Salvar caminho do arquivo gerado na sessão ou cache
-            # Para simplificar, vamos usar um nome baseado no timestamp
-            output_filename = f"analise_{timestamp}.xlsx"
-            final_output_path = os.path.join(UPLOAD_FOLDER, output_filename)
-            
-            # Mover arquivo temporário para local permanente
-            import shutil
-            shutil.move(output_file, final_output_path)
-            
-            # Limpar arquivo original
-            os.remove(filepath)
-            
-            return jsonify({
-                'success': True,
-                'message': 'Arquivo processado com sucesso!',
-                'download_url': f'/api/analise/download/{output_filename}',
-                'resumo': resultado
-            })
-            
+            with app.app_context():
+                resultado = executar_analise(
+                    filepath, timestamp, *parametros, progresso=progresso, base=base, listagem=listagem)
+            if 'error' in resultado:
+                progresso.emitir('erro', error=resultado['error'])
+            else:
+                progresso.emitir('concluido', download_url=resultado['download_url'], resumo=resultado['resumo'])
+        except CapacidadeEsgotada as e:
+            progresso.emitir('erro', error=str(e), tentar_novamente_em=e.tentar_novamente_em)
         except Exception as e:
-            return jsonify({'error': f'Erro ao processar arquivo: {str(e)}'}), 500
+            progresso.emitir('erro', error=f'Erro ao processar arquivo: {str(e)}')
+        finally:
+            remover_uploads(filepath, listagem)
+    
+    # A thread morre com o worker: o acompanhamento percebe e emite 'erro'
+    progresso.assumir()
+    threading.Thread(target=executar, daemon=True).start()
+    
+    return jsonify({
+        'success': True,
+        'id': progresso.id,
+        'progresso_url': f'/api/analise/progresso/{progresso.id}'
+    }), 202
+
+@analise_bp.route('/progresso/<id_analise>')
+def progresso_analise(id_analise):
+    """
+    Stream de eventos (SSE) com as etapas da análise, o resumo e o link final
+    """
+    if not id_analise.isalnum() or not existe(id_analise):
+        return jsonify({'error': 'Análise não encontrada'}), 404
+    
+    def eventos():
+        for evento in acompanhar(id_analise):
+            dados = json.dumps(evento['dados'], ensure_ascii=False)
+            yield f"event: {evento['evento']}\ndata: {dados}\n\n"
+    
+    return Response(
+        stream_with_context(eventos()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@analise_bp.route('/fornecedores/<filename>')
+def exportar_fornecedores(filename):
+    """
+    Endpoint que gera uma planilha por fornecedor a partir do estado salvo
+    da análise (sem reler o upload), em um pool de processos, e devolve
+    todas em um zip enviado conforme as planilhas ficam prontas, na ordem.
+    Cada processo lê do estado só as linhas dos fornecedores da sua
+    tarefa; a memória estimada passa pelo controle de admissão, como no
+    upload.
+    """
+    nome_estado = identificar_planilha(os.path.basename(filename))[0]
+    if not existe_estado(nome_estado):
+        return jsonify({'error': 'Análise não encontrada'}), 404
+    
+    caminho_estado = arquivo_estado(nome_estado)
+    agregados, detalhes = carregar_estado(nome_estado)
+    tarefas = [(caminho_estado, planilhas) for planilhas in
+               preparar_planilhas_fornecedores(agregados, PROCESSOS_PADRAO * TAREFAS_EXPORTACAO_POR_PROCESSO)]
+    processos = max(1, min(PROCESSOS_PADRAO, len(tarefas)))
+    
+    # Detalhes em memória são lidos inteiros por cada processo; em disco,
+    # cada tarefa guarda só as linhas dos seus fornecedores
+    if isinstance(detalhes, DetalhesMemoria):
+        linhas_por_processo = len(detalhes)
+    else:
+        linhas_por_processo = -(-len(detalhes) // max(1, len(tarefas)))
+    del detalhes
+    try:
+        reserva = reservar_memoria(processos * estimar_memoria(
+            os.path.getsize(caminho_estado), linhas_por_processo, len(COLUNAS_DETALHE)))
+    except CapacidadeEsgotada as e:
+        resposta = jsonify({'error': str(e)})
+        resposta.headers['Retry-After'] = str(e.tentar_novamente_em)
+        return resposta, 429
+    
+    def gerar():
+        try:
+            with pool_processos(processos) as pool:
+                lotes = mapear_em_ordem(pool, gerar_planilhas_fornecedores, tarefas, processos)
+                yield from compactar_em_fluxo(planilha for planilhas in lotes for planilha in planilhas)
+        finally:
+            reserva.liberar()
+    
+    # Também ao fechar a resposta, para o caso de o stream nem começar
+    resposta = Response(
+        stream_with_context(gerar()),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename=Fornecedores_{nome_estado}.zip'}
+    )
+    resposta.call_on_close(reserva.liberar)
+    return resposta
+
+@analise_bp.route('/tendencias')
+def tendencias():
+    """
+    Séries históricas por fornecedor ou filial (?grupo=, ?nome=, ?dias=);
+    com ?analise_a=&analise_b= compara duas análises gravadas
+    """
+    grupo = request.args.get('grupo', 'fornecedor')
+    if grupo not in GRUPOS_HISTORICO:
+        return jsonify({'error': f'Grupo desconhecido: {grupo}'}), 400
+    
+    try:
+        # Aceita o nome da análise ou o nome do arquivo da planilha
+        analise_a, analise_b = [
+            identificar_planilha(nome)[0] if nome and nome.endswith('.xlsx') else nome
+            for nome in (request.args.get('analise_a'), request.args.get('analise_b'))
+        ]
+        if analise_a or analise_b:
+            if not (analise_a and analise_b):
+                return jsonify({'error': 'Informe analise_a e analise_b para comparar'}), 400
+            comparacao, erro = comparar_analises(grupo, analise_a, analise_b)
+            if comparacao is None:
+                return jsonify({'error': erro}), 404
+            return jsonify(comparacao)
+        
+        dias = request.args.get('dias', DIAS_TENDENCIA, type=int)
+        return jsonify(serie_tendencia(grupo, request.args.get('nome'), dias))
+        
+    except Exception as e:
+        return jsonify({'error': f'Erro ao consultar histórico: {str(e)}'}), 500
+
+@analise_bp.route('/sessoes', methods=['POST'])
+def criar_sessao():
+    """
+    Abre uma sessão de aprovação sobre uma análise salva (JSON {"analise": nome ou arquivo})
+    """
+    dados = request.get_json(silent=True) or {}
+    nome_estado = identificar_planilha(os.path.basename(dados.get('analise') or ''))[0]
+    if not nome_estado or not existe_estado(nome_estado):
+        return jsonify({'error': 'Análise não encontrada'}), 404
+    
+    try:
+        sessao = abrir_sessao(nome_estado)
+        return jsonify(sessao.to_dict()), 201
+    except Exception as e:
+        return jsonify({'error': f'Erro ao abrir sessão: {str(e)}'}), 500
+
+@analise_bp.route('/sessoes/<int:id_sessao>')
+def consultar_sessao(id_sessao):
+    """
+    Totais da sessão e por grupo (?tipo=fornecedor|filial|faixa restringe os grupos)
+    """
+    sessao = obter_sessao(id_sessao)
+    if sessao is None:
+        return jsonify({'error': 'Sessão não encontrada'}), 404
+    
+    tipo = request.args.get('tipo')
+    if tipo is not None and tipo not in GRUPOS_SESSAO:
+        return jsonify({'error': f'Grupo desconhecido: {tipo}'}), 400
+    
+    return jsonify({
+        'sessao': sessao.to_dict(),
+        'grupos': [total.to_dict() for total in totais_grupos(sessao, tipo=tipo)]
+    })
+
+@analise_bp.route('/sessoes/<int:id_sessao>/itens')
+def itens_sessao(id_sessao):
+    """
+    Itens da sessão por cobertura, com filtros ?decisao=, ?fornecedor=, ?filial= e paginação ?limite=&inicio=
+    """
+    sessao = obter_sessao(id_sessao)
+    if sessao is None:
+        return jsonify({'error': 'Sessão não encontrada'}), 404
+    
+    decisao = request.args.get('decisao')
+    if decisao is not None and decisao not in DECISOES_SESSAO:
+        return jsonify({'error': f'Decisão desconhecida: {decisao}'}), 400
+    
+    itens = listar_itens(
+        sessao, decisao, request.args.get('fornecedor'), request.args.get('filial'),
+        request.args.get('limite', 100, type=int), request.args.get('inicio', 0, type=int)
+    )
+    return jsonify({'itens': [item.to_dict() for item in itens]})
+
+@analise_bp.route('/sessoes/<int:id_sessao>/decisoes', methods=['POST'])
+def registrar_decisoes(id_sessao):
+    """
+    Aplica uma decisão a itens ou a um fornecedor inteiro
+    (JSON {"decisao": ..., "itens": [ids]} ou {"decisao": ..., "fornecedor": nome});
+    devolve os totais atualizados da sessão e dos grupos afetados
+    """
+    sessao = obter_sessao(id_sessao)
+    if sessao is None:
+        return jsonify({'error': 'Sessão não encontrada'}), 404
+    
+    dados = request.get_json(silent=True) or {}
+    decisao = dados.get('decisao')
+    itens = dados.get('itens')
+    fornecedor = dados.get('fornecedor')
+    if decisao not in DECISOES_SESSAO:
+        return jsonify({'error': f'Decisão desconhecida: {decisao}'}), 400
+    if (itens is None) == (fornecedor is None):
+        return jsonify({'error': 'Informe os itens ou o fornecedor'}), 400
+    
+    try:
+        alterados, grupos = decidir(sessao, decisao, itens, fornecedor)
+        return jsonify({
+            'alterados': alterados,
+            'sessao': sessao.to_dict(),
+            'grupos': [total.to_dict() for total in grupos]
+        })
+    except Exception as e:
+        return jsonify({'error': f'Erro ao registrar decisões: {str(e)}'}), 500
+
+@analise_bp.route('/sessoes/<int:id_sessao>/planilha')
+def exportar_sessao(id_sessao):
+    """
+    Workbook final da sessão com as decisões tomadas
+    """
+    sessao = obter_sessao(id_sessao)
+    if sessao is None:
+        return jsonify({'error': 'Sessão não encontrada'}), 404
     
-    return jsonify({'error': 'Tipo de arquivo não permitido'}), 400
+    try:
+        output_file = gerar_planilha_sessao(sessao)
+        with open(output_file, 'rb') as arquivo:
+            conteudo = io.BytesIO(arquivo.read())
+        os.remove(output_file)
+        
+        return send_file(
+            conteudo,
+            as_attachment=True,
+            download_name=f"Sessao_Aprovacao_{sessao.id}_{sessao.analise}.xlsx",
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+    except Exception as e:
+        return jsonify({'error': f'Erro ao exportar sessão: {str(e)}'}), 500
 
 @analise_bp.route('/download/<filename>')
 def download_arquivo(filename):
     """
-    Endpoint para download do arquivo de análise
+    Endpoint para download do arquivo de análise; `?perfil=` pede a
+    planilha da mesma análise em outro perfil de relatório
     """
     try:
+        filename = os.path.basename(filename)
+        
+        perfil = request.args.get('perfil')
+        if perfil is not None:
+            if perfil not in PERFIS_RELATORIO:
+                return jsonify({'error': f'Perfil de relatório desconhecido: {perfil}'}), 400
+            filename = arquivo_planilha(identificar_planilha(filename)[0], perfil)
+        
         filepath = os.path.join(UPLOAD_FOLDER, filename)
         
-        if not os.path.exists(filepath):
+        # Perfis ainda não gerados (e análises sem planilha) saem do estado salvo no primeiro download
+        if not os.path.exists(filepath) and not gerar_planilha_sob_demanda(filename):
             return jsonify({'error': 'Arquivo não encontrado'}), 404
         
         return send_file(
@@ -761,78 +1961,38 @@ def download_arquivo(filename):
         return jsonify({'error': f'Erro ao fazer download: {str(e)}'}), 500
 import pandas as pd
 import numpy as np
-from openpyxl.styles import PatternFill, Font, Alignment
 
-def criar_aba_distribuicao_valor(wb, df):
+def criar_aba_distribuicao_valor(wb, agregados):
     """
     Cria aba com análise de distribuição por faixas de valor
     """
     
-    ws = wb.create_sheet("💰 Distribuição por Valor")
-    
-    # Título principal
-    ws.cell(row=1, column=1, value="ANÁLISE DE DISTRIBUIÇÃO POR FAIXAS DE VALOR").font = Font(bold=True, size=16, color="FFFFFF")
-    ws.cell(row=1, column=1).fill = PatternFill(start_color="E67E22", end_color="E67E22", fill_type="solid")
-    ws.merge_cells('A1:H1')
-    
-    # Definir faixas de valor
-    faixas_valor = [
-        {"nome": "Até R$ 100", "min": 0, "max": 100},
-        {"nome": "R$ 101 - R$ 500", "min": 101, "max": 500},
-        {"nome": "R$ 501 - R$ 1.000", "min": 501, "max": 1000},
-        {"nome": "R$ 1.001 - R$ 2.500", "min": 1001, "max": 2500},
-        {"nome": "R$ 2.501 - R$ 5.000", "min": 2501, "max": 5000},
-        {"nome": "R$ 5.001 - R$ 10.000", "min": 5001, "max": 10000},
-        {"nome": "Acima de R$ 10.000", "min": 10001, "max": float('inf')}
-    ]
-    
-    # Cabeçalhos
-    headers = [
-        'Faixa de Valor', 'Quantidade Itens', '% do Total', 'Valor Total (R$)', 
-        '% do Valor Total', 'Cobertura Média', 'Recomendação', 'Observação'
-    ]
-    
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=3, column=col, value=header)
-        cell.font = Font(bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color="E67E22", end_color="E67E22", fill_type="solid")
-        cell.alignment = Alignment(horizontal="center", vertical="center")
+    # Aba com título principal e cabeçalhos do modelo
+    ws = MODELO_DISTRIBUICAO_VALOR.abrir(wb)
     
     # Calcular totais gerais
-    total_itens = len(df)
-    valor_total_geral = df['Saldo Pedido'].sum()
+    total_itens = agregados.total_itens
+    valor_total_geral = agregados.geral['valor']
     
-    # Analisar cada faixa
+    # Analisar cada faixa (faixas sem itens não aparecem na tabela)
     faixas_analise = []
+    tabela_faixas = aplicar_regras('faixas_valor', agregados.tabela_faixas_valor())
     
-    for faixa in faixas_valor:
-        if faixa["max"] == float('inf'):
-            dados_faixa = df[df['Saldo Pedido'] >= faixa["min"]]
-        else:
-            dados_faixa = df[(df['Saldo Pedido'] >= faixa["min"]) & (df['Saldo Pedido'] <= faixa["max"])]
-        
-        quantidade = len(dados_faixa)
-        if quantidade == 0:
-            continue
+    for indice_faixa, dados_faixa in tabela_faixas.iterrows():
+        faixa = FAIXAS_VALOR[indice_faixa]
+        quantidade = int(dados_faixa['itens'])
             
-        valor_faixa = dados_faixa['Saldo Pedido'].sum()
-        cobertura_media = dados_faixa['Cobertura Atual'].mean()
+        valor_faixa = dados_faixa['valor']
+        cobertura_media = dados_faixa['cobertura_media']
         
         perc_quantidade = (quantidade / total_itens) * 100
         perc_valor = (valor_faixa / valor_total_geral) * 100
         
-        # Determinar recomendação baseada na cobertura média
-        if cobertura_media <= 44:
-            recomendacao = "✅ APROVAR"
-            observacao = "Faixa com boa rotatividade"
-        elif cobertura_media <= 70:
-            recomendacao = "⚠️ REVISAR"
-            observacao = "Atenção à cobertura média"
-        else:
-            recomendacao = "❌ REJEITAR"
-            observacao = "Cobertura alta - risco de estoque parado"
+        recomendacao = dados_faixa['recomendacao']
+        observacao = OBSERVACOES_FAIXA[recomendacao]
         
         faixas_analise.append({
+            'indice': indice_faixa,
             'nome': faixa["nome"],
             'quantidade': quantidade,
             'perc_quantidade': perc_quantidade,
@@ -844,7 +2004,7 @@ def criar_aba_distribuicao_valor(wb, df):
         })
     
     # Preencher dados
-    for row, faixa_data in enumerate(faixas_analise, 4):
+    for row, faixa_data in enumerate(faixas_analise, MODELO_DISTRIBUICAO_VALOR.primeira_linha):
         dados = [
             faixa_data['nome'],
             f"{faixa_data['quantidade']:,}".replace(",", "."),
@@ -852,104 +2012,72 @@ def criar_aba_distribuicao_valor(wb, df):
             f"R$ {faixa_data['valor_total']:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."),
             f"{faixa_data['perc_valor']:.1f}%".replace(".", ","),
             f"{faixa_data['cobertura_media']:.1f}".replace(".", ","),
-            faixa_data['recomendacao'],
+            ROTULOS_RECOMENDACAO[faixa_data['recomendacao']],
             faixa_data['observacao']
         ]
         
+        # Colorir baseado na recomendação
+        estilo = ESTILOS_RECOMENDACAO_CENTRO[faixa_data['recomendacao']]
         for col, valor in enumerate(dados, 1):
-            cell = ws.cell(row=row, column=col, value=valor)
-            
-            # Colorir baseado na recomendação
-            if faixa_data['recomendacao'] == "❌ REJEITAR":
-                cell.fill = PatternFill(start_color="FFD6D6", end_color="FFD6D6", fill_type="solid")
-            elif faixa_data['recomendacao'] == "⚠️ REVISAR":
-                cell.fill = PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid")
-            else:
-                cell.fill = PatternFill(start_color="E6F3E6", end_color="E6F3E6", fill_type="solid")
-            
-            cell.alignment = Alignment(horizontal="center", vertical="center")
+            ws.escrever(row, col, valor, estilo)
     
     # Adicionar linha de totais
-    row_total = len(faixas_analise) + 6
-    ws.cell(row=row_total, column=1, value="TOTAL GERAL").font = Font(bold=True)
-    ws.cell(row=row_total, column=1).fill = PatternFill(start_color="D5DBDB", end_color="D5DBDB", fill_type="solid")
-    
-    ws.cell(row=row_total, column=2, value=f"{total_itens:,}".replace(",", ".")).font = Font(bold=True)
-    ws.cell(row=row_total, column=2).fill = PatternFill(start_color="D5DBDB", end_color="D5DBDB", fill_type="solid")
-    
-    ws.cell(row=row_total, column=3, value="100,0%").font = Font(bold=True)
-    ws.cell(row=row_total, column=3).fill = PatternFill(start_color="D5DBDB", end_color="D5DBDB", fill_type="solid")
-    
-    ws.cell(row=row_total, column=4, value=f"R$ {valor_total_geral:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")).font = Font(bold=True)
-    ws.cell(row=row_total, column=4).fill = PatternFill(start_color="D5DBDB", end_color="D5DBDB", fill_type="solid")
-    
-    ws.cell(row=row_total, column=5, value="100,0%").font = Font(bold=True)
-    ws.cell(row=row_total, column=5).fill = PatternFill(start_color="D5DBDB", end_color="D5DBDB", fill_type="solid")
+    row_total = MODELO_DISTRIBUICAO_VALOR.primeira_linha + len(faixas_analise) + 2
+    totais = [
+        "TOTAL GERAL",
+        f"{total_itens:,}".replace(",", "."),
+        "100,0%",
+        f"R$ {valor_total_geral:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."),
+        "100,0%"
+    ]
+    for col, valor in enumerate(totais, 1):
+        ws.escrever(row_total, col, valor, ESTILO_TOTAL)
     
     # Adicionar análise detalhada por fornecedor em cada faixa
     row_atual = row_total + 3
     
+    # Fornecedores na ordem de primeira ocorrência dentro da faixa e, dentro de cada um, suas filiais
+    faixas_pares = aplicar_regras('faixas_valor_pares', agregados.tabela_faixas_valor_pares())
+    faixas_pares = faixas_pares.sort_values(['ordem_fornecedor', 'ordem'])
+    
     for faixa_data in faixas_analise:
-        faixa = next(f for f in faixas_valor if f["nome"] == faixa_data['nome'])
-        
-        if faixa["max"] == float('inf'):
-            dados_faixa = df[df['Saldo Pedido'] >= faixa["min"]]
-        else:
-            dados_faixa = df[(df['Saldo Pedido'] >= faixa["min"]) & (df['Saldo Pedido'] <= faixa["max"])]
+        dados_faixa = faixas_pares[faixas_pares['faixa'] == faixa_data['indice']]
         
         if len(dados_faixa) == 0:
             continue
         
         # Título da faixa
-        ws.cell(row=row_atual, column=1, value=f"DETALHAMENTO - {faixa_data['nome']}").font = Font(bold=True, size=12)
-        ws.cell(row=row_atual, column=1).fill = PatternFill(start_color="F8C471", end_color="F8C471", fill_type="solid")
+        ws.escrever(row_atual, 1, f"DETALHAMENTO - {faixa_data['nome']}", ESTILO_SECAO_FAIXA)
         ws.merge_cells(f'A{row_atual}:H{row_atual}')
         
         row_atual += 2
         
         # Cabeçalhos do detalhamento
-        headers_det = ['Fornecedor', 'Filial', 'Itens', 'Valor Total', 'Cobertura Média', 'Maior Valor', 'Menor Valor', 'Recomendação']
-        for col, header in enumerate(headers_det, 1):
-            cell = ws.cell(row=row_atual, column=col, value=header)
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color="F2F2F2", end_color="F2F2F2", fill_type="solid")
+        for col, header in enumerate(CABECALHOS_DETALHAMENTO_FAIXA, 1):
+            ws.escrever(row_atual, col, header, ESTILO_SUBCABECALHO)
         
         row_atual += 1
         
         # Analisar fornecedores na faixa
         fornecedores_faixa = []
-        for fornecedor in dados_faixa['Fornecedor'].unique():
-            dados_forn_faixa = dados_faixa[dados_faixa['Fornecedor'] == fornecedor]
+        for _, dados_forn_filial in dados_faixa.iterrows():
+            valor_total_forn = dados_forn_filial['valor']
+            cobertura_media_forn = dados_forn_filial['cobertura_media']
+            maior_valor = dados_forn_filial['valor_max']
+            menor_valor = dados_forn_filial['valor_min']
+            
+            rec_forn = dados_forn_filial['recomendacao']
             
-            for filial in dados_forn_faixa['Filial'].unique():
-                dados_forn_filial = dados_forn_faixa[dados_forn_faixa['Filial'] == filial]
-                
-                if len(dados_forn_filial) == 0:
-                    continue
-                
-                valor_total_forn = dados_forn_filial['Saldo Pedido'].sum()
-                cobertura_media_forn = dados_forn_filial['Cobertura Atual'].mean()
-                maior_valor = dados_forn_filial['Saldo Pedido'].max()
-                menor_valor = dados_forn_filial['Saldo Pedido'].min()
-                
-                # Recomendação específica
-                if cobertura_media_forn <= 44:
-                    rec_forn = "✅ APROVAR"
-                elif cobertura_media_forn <= 70:
-                    rec_forn = "⚠️ REVISAR"
-                else:
-                    rec_forn = "❌ REJEITAR"
-                
-                fornecedores_faixa.append({
-                    'fornecedor': fornecedor,
-                    'filial': filial,
-                    'itens': len(dados_forn_filial),
-                    'valor_total': valor_total_forn,
-                    'cobertura_media': cobertura_media_forn,
-                    'maior_valor': maior_valor,
-                    'menor_valor': menor_valor,
-                    'recomendacao': rec_forn
-                })
+            fornecedores_faixa.append({
+                'fornecedor': dados_forn_filial['Fornecedor'],
+                'filial': dados_forn_filial['Filial'],
+                'itens': int(dados_forn_filial['itens']),
+                'valor_total': valor_total_forn,
+                'cobertura_media': cobertura_media_forn,
+                'maior_valor': maior_valor,
+                'menor_valor': menor_valor,
+                'recomendacao': rec_forn
+            })
         
         # Ordenar por valor total (maiores primeiro)
         fornecedores_faixa.sort(key=lambda x: x['valor_total'], reverse=True)
@@ -963,27 +2091,17 @@ def criar_aba_distribuicao_valor(wb, df):
                 f"{forn_data['cobertura_media']:.1f}".replace(".", ","),
                 f"R$ {forn_data['maior_valor']:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."),
                 f"R$ {forn_data['menor_valor']:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."),
-                forn_data['recomendacao']
+                ROTULOS_RECOMENDACAO[forn_data['recomendacao']]
             ]
             
+            # Colorir baseado na recomendação
+            estilo = ESTILOS_RECOMENDACAO_DETALHAMENTO[forn_data['recomendacao']]
             for col, valor in enumerate(dados_forn, 1):
-                cell = ws.cell(row=row_atual, column=col, value=valor)
-                
-                # Colorir baseado na recomendação
-                if forn_data['recomendacao'] == "❌ REJEITAR":
-                    cell.fill = PatternFill(start_color="FFE6E6", end_color="FFE6E6", fill_type="solid")
-                elif forn_data['recomendacao'] == "⚠️ REVISAR":
-                    cell.fill = PatternFill(start_color="FFF9E6", end_color="FFF9E6", fill_type="solid")
+                ws.escrever(row_atual, col, valor, estilo)
             
             row_atual += 1
         
         row_atual += 2
-    
-    # Ajustar larguras
-    larguras = [25, 15, 12, 18, 15, 15, 15, 20]
-    for col, largura in enumerate(larguras, 1):
-        from openpyxl.utils import get_column_letter
-        ws.column_dimensions[get_column_letter(col)].width = largura
 
 # Teste da função
 if __name__ == "__main__":
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import uuid
+import fcntl
+import tempfile
+
+from src.services.qualidade import PARTICOES_ASSINATURAS
+
+
+def _memoria_fisica():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return 4 * 1024 ** 3
+
+
+# Orçamento de memória compartilhado por todos os workers do host
+# (padrão: metade da memória física)
+ORCAMENTO_MEMORIA = int(os.environ.get('ANALISE_ORCAMENTO_MEMORIA_MB', _memoria_fisica() // 2 // 1024 ** 2)) * 1024 ** 2
+
+# Estado das reservas (arquivo JSON protegido por flock)
+ARQUIVO_ESTADO = os.environ.get('ANALISE_ARQUIVO_ADMISSAO', os.path.join(tempfile.gettempdir(), 'analise_admissao.json'))
+
+# Quanto tempo uma análise espera na fila antes de ser recusada, e o
+# Retry-After sugerido ao cliente quando isso acontece (segundos)
+ESPERA_MAXIMA = float(os.environ.get('ANALISE_ESPERA_ADMISSAO', 30))
+INTERVALO_ESPERA = 0.5
+TENTAR_NOVAMENTE_EM = int(os.environ.get('ANALISE_RETRY_AFTER', 30))
+
+# Reservas mais antigas que isso são consideradas abandonadas
+DURACAO_MAXIMA_RESERVA = int(os.environ.get('ANALISE_DURACAO_MAXIMA_RESERVA', 3600))
+
+# Parâmetros da estimativa: DataFrame bruto e suas cópias (filtro e limpeza),
+# células do workbook estilizado do openpyxl e XML descompactado do .xlsx
+BYTES_POR_CELULA_DATAFRAME = 120
+COPIAS_DATAFRAME = 3
+BYTES_POR_CELULA_WORKBOOK = 600
+COLUNAS_WORKBOOK = 12
+FATOR_DESCOMPACTACAO = 8
+
+# Assinaturas da verificação de qualidade (hash da chave, hash do conteúdo
+# e posição, mais a tabela de hash da busca de duplicidades); no modo em
+# lotes ficam em disco e só uma partição é lida de cada vez
+BYTES_POR_LINHA_QUALIDADE = 72
+
+
+class CapacidadeEsgotada(Exception):
+    """
+    A análise não coube no orçamento de memória dentro do tempo de espera
+    """
+
+    def __init__(self, mensagem, tentar_novamente_em=TENTAR_NOVAMENTE_EM):
+        super().__init__(mensagem)
+        self.tentar_novamente_em = tentar_novamente_em
+
+
+def estimar_memoria(tamanho_arquivo, linhas=None, colunas=None, linhas_em_memoria=None):
+    """
+    Estima o pico de memória (bytes) de uma análise. Sem a quantidade de
+    linhas (arquivos sem dimensão declarada ou .xls) usa só o tamanho do arquivo.
+    `linhas_em_memoria` limita o DataFrame ao tamanho do lote no modo em
+    lotes, em que as assinaturas de qualidade são avaliadas por partição.
+    """
+    estimativa_arquivo = tamanho_arquivo * FATOR_DESCOMPACTACAO
+    if not linhas:
+        return estimativa_arquivo
+
+    colunas = colunas or COLUNAS_WORKBOOK
+    linhas_dataframe = min(linhas, linhas_em_memoria) if linhas_em_memoria else linhas
+    dataframe = linhas_dataframe * colunas * BYTES_POR_CELULA_DATAFRAME * COPIAS_DATAFRAME
+    workbook = linhas * COLUNAS_WORKBOOK * BYTES_POR_CELULA_WORKBOOK
+    qualidade = linhas * BYTES_POR_LINHA_QUALIDADE
+    if linhas_em_memoria:
+        qualidade //= PARTICOES_ASSINATURAS
+    return max(dataframe + workbook + qualidade, estimativa_arquivo)
+
+
+def processo_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class _EstadoBloqueado:
+    """
+    Abre o arquivo de estado com flock exclusivo; descarta reservas de
+    processos que morreram ou que passaram da duração máxima
+    """
+
+    def __enter__(self):
+        self.arquivo = open(ARQUIVO_ESTADO, 'a+')
+        fcntl.flock(self.arquivo, fcntl.LOCK_EX)
+        self.arquivo.seek(0)
+        try:
+            self.reservas = json.loads(self.arquivo.read() or '{}')
+        except ValueError:
+            self.reservas = {}
+
+        agora = time.time()
+        self.reservas = {
+            chave: reserva for chave, reserva in self.reservas.items()
+            if processo_vivo(reserva['pid']) and agora - reserva['inicio'] < DURACAO_MAXIMA_RESERVA
+        }
+        return self
+
+    def __exit__(self, *exc):
+        self.arquivo.seek(0)
+        self.arquivo.truncate()
+        json.dump(self.reservas, self.arquivo)
+        self.arquivo.flush()
+        fcntl.flock(self.arquivo, fcntl.LOCK_UN)
+        self.arquivo.close()
+
+    @property
+    def em_uso(self):
+        return sum(reserva['bytes'] for reserva in self.reservas.values())
+
+
+class ReservaMemoria:
+    """
+    Reserva de memória no orçamento do host, liberada ao sair do bloco with
+    """
+
+    def __init__(self, chave, quantidade):
+        self.chave = chave
+        self.bytes = quantidade
+
+    def liberar(self):
+        if self.chave is None:
+            return
+        with _EstadoBloqueado() as estado:
+            estado.reservas.pop(self.chave, None)
+        self.chave = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.liberar()
+
+
+def _tentar_reservar(quantidade):
+    with _EstadoBloqueado() as estado:
+        # Uma análise maior que o orçamento inteiro ainda roda, mas sozinha
+        if estado.reservas and estado.em_uso + quantidade > ORCAMENTO_MEMORIA:
+            return None
+        chave = uuid.uuid4().hex
+        estado.reservas[chave] = {'bytes': int(quantidade), 'pid': os.getpid(), 'inicio': time.time()}
+        return ReservaMemoria(chave, quantidade)
+
+
+def reservar_memoria(quantidade, espera_maxima=ESPERA_MAXIMA):
+    """
+    Reserva `quantidade` bytes do orçamento, aguardando na fila até
+    `espera_maxima` segundos; levanta CapacidadeEsgotada se não couber
+    """
+    limite = time.monotonic() + espera_maxima
+    while True:
+        reserva = _tentar_reservar(quantidade)
+        if reserva is not None:
+            return reserva
+        if time.monotonic() >= limite:
+            raise CapacidadeEsgotada(
+                "Servidor ocupado com outras análises. Tente novamente em alguns instantes."
+            )
+        time.sleep(INTERVALO_ESPERA)
@@ -0,0 +1,614 @@
+import copy
+import numpy as np
+import pandas as pd
+
+from src.services.quantis import QUANTIS_COBERTURA, digests_por_grupo, mesclar_digests
+from src.services.distintos import (
+    CONTAGEM_EXATA, CONTAGEM_APROXIMADA, COLUNAS_DISTINTAS, HyperLogLog, hash_valores, contador_total,
+    contadores_por_grupo, mesclar_contadores
+)
+
+# Faixas de valor (Saldo Pedido) usadas na aba de distribuição por valor
+FAIXAS_VALOR = [
+    {"nome": "Até R$ 100", "min": 0, "max": 100},
+    {"nome": "R$ 101 - R$ 500", "min": 101, "max": 500},
+    {"nome": "R$ 501 - R$ 1.000", "min": 501, "max": 1000},
+    {"nome": "R$ 1.001 - R$ 2.500", "min": 1001, "max": 2500},
+    {"nome": "R$ 2.501 - R$ 5.000", "min": 2501, "max": 5000},
+    {"nome": "R$ 5.001 - R$ 10.000", "min": 5001, "max": 10000},
+    {"nome": "Acima de R$ 10.000", "min": 10001, "max": float('inf')}
+]
+
+# Como cada coluna parcial é combinada entre lotes
+AGREGACOES = {
+    'ordem': 'min',
+    'itens': 'sum',
+    'soma_cobertura': 'sum',
+    'valor': 'sum',
+    'ate_44': 'sum',
+    'entre_45_70': 'sum',
+    'acima_71': 'sum',
+    'valor_min': 'min',
+    'valor_max': 'max',
+}
+
+
+def classificar_faixas_valor(saldo):
+    """
+    Retorna o índice da faixa de valor de cada linha (-1 quando fora das faixas)
+    """
+    condicoes = []
+    for faixa in FAIXAS_VALOR:
+        if faixa["max"] == float('inf'):
+            condicoes.append(saldo >= faixa["min"])
+        else:
+            condicoes.append((saldo >= faixa["min"]) & (saldo <= faixa["max"]))
+    return np.select(condicoes, list(range(len(FAIXAS_VALOR))), default=-1)
+
+
+def _tabela_grupos(linhas, total_grupos, indice, ordem, cobertura, saldo, faixas_cobertura=None,
+                   valores_extremos=None):
+    """
+    Monta a tabela parcial de um agrupamento a partir do código do grupo
+    de cada linha (0..total_grupos-1), com somas por np.bincount
+    """
+    ordem_min = np.full(total_grupos, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(ordem_min, linhas, ordem)
+
+    dados = {
+        'ordem': ordem_min,
+        'itens': np.bincount(linhas, minlength=total_grupos),
+        'soma_cobertura': np.bincount(linhas, weights=cobertura, minlength=total_grupos),
+        'valor': np.bincount(linhas, weights=saldo, minlength=total_grupos),
+    }
+    if faixas_cobertura is not None:
+        for nome, mascara in faixas_cobertura.items():
+            dados[nome] = np.bincount(linhas[mascara], minlength=total_grupos)
+    if valores_extremos is not None:
+        dados['valor_min'] = np.full(total_grupos, np.inf)
+        dados['valor_max'] = np.full(total_grupos, -np.inf)
+        np.minimum.at(dados['valor_min'], linhas, valores_extremos)
+        np.maximum.at(dados['valor_max'], linhas, valores_extremos)
+
+    return pd.DataFrame(dados, index=indice)
+
+
+def _combinar_tabelas(a, b):
+    """
+    Combina duas tabelas parciais com o mesmo índice de grupo
+    """
+    if a is None:
+        return b
+    if b is None:
+        return a
+    niveis = list(range(a.index.nlevels))
+    combinada = pd.concat([a, b])
+    return combinada.groupby(level=niveis, sort=False).agg({c: AGREGACOES[c] for c in combinada.columns})
+
+
+def _substituir_linhas(tabela, nova, tocadas):
+    """
+    Mantém as linhas não tocadas da tabela e acrescenta as da nova tabela
+    """
+    mantidas = tabela[~tocadas(tabela.index)]
+    if nova is None:
+        return mantidas
+    return pd.concat([mantidas, nova[tocadas(nova.index)]])
+
+
+def _substituir_chaves(antigos, novos, tocada):
+    """
+    Mesma substituição para dicts grupo -> contador/esboço
+    """
+    resultado = {chave: valor for chave, valor in antigos.items() if not tocada(chave)}
+    resultado.update({chave: valor for chave, valor in novos.items() if tocada(chave)})
+    return resultado
+
+
+def _renomear_indice(indice, rotulos):
+    """
+    Substitui os códigos de cada nível do índice pelos rótulos correspondentes
+    """
+    niveis = []
+    for posicao, nome in enumerate(indice.names):
+        valores = indice.get_level_values(posicao)
+        if nome in rotulos:
+            valores = pd.Index(np.asarray(rotulos[nome])[np.asarray(valores, dtype=np.int64)], name=nome)
+        niveis.append(valores)
+    if len(niveis) == 1:
+        return niveis[0]
+    return pd.MultiIndex.from_arrays(niveis, names=indice.names)
+
+
+def _derivar(tabela):
+    """
+    Acrescenta cobertura média e percentuais por faixa a uma tabela agregada
+    """
+    tabela = tabela.copy()
+    tabela['cobertura_media'] = tabela['soma_cobertura'] / tabela['itens']
+    if 'ate_44' in tabela.columns:
+        tabela['perc_ate_44'] = (tabela['ate_44'] / tabela['itens']) * 100
+        tabela['perc_45_70'] = (tabela['entre_45_70'] / tabela['itens']) * 100
+        tabela['perc_acima_71'] = (tabela['acima_71'] / tabela['itens']) * 100
+    return tabela
+
+
+def _acrescentar_quantis(tabela, digests, chaves):
+    """
+    Acrescenta as colunas p50/p90/p99 de cobertura a partir dos esboços de cada grupo
+    """
+    selecionados = [digests.get(chave) for chave in chaves]
+    for nome, q in QUANTIS_COBERTURA.items():
+        tabela[nome] = [d.quantil(q) if d is not None else np.nan for d in selecionados]
+
+
+def _acrescentar_distintos(tabela, contadores):
+    """
+    Acrescenta total_cargas, total_pedidos e total_codigos a partir dos contadores de cada grupo
+    """
+    for coluna, nome in COLUNAS_DISTINTAS.items():
+        por_grupo = contadores[coluna]
+        tabela[nome] = [por_grupo[g].estimar() if g in por_grupo else 0 for g in tabela.index]
+
+
+class ColunaCodificada:
+    """
+    Coluna representada por códigos inteiros (-1 = vazio) e o rótulo de cada código.
+    Sem rótulos (processos filhos), os próprios códigos fazem papel de rótulo
+    e o agregado é renomeado depois; `hashes` traz o hash de cada rótulo,
+    quando já calculado.
+    """
+
+    def __init__(self, codigos, rotulos=None, hashes=None):
+        self.codigos = np.asarray(codigos, dtype=np.int64)
+        self.rotulos = None if rotulos is None else np.asarray(rotulos)
+        self.hashes = hashes
+
+    @classmethod
+    def de_serie(cls, serie):
+        codigos, rotulos = pd.factorize(serie)
+        return cls(codigos, rotulos)
+
+    @property
+    def cardinalidade(self):
+        if self.rotulos is not None:
+            return len(self.rotulos)
+        return int(self.codigos.max()) + 1 if len(self.codigos) else 0
+
+    def rotular(self, codigos):
+        return codigos if self.rotulos is None else self.rotulos[codigos]
+
+    def hashes_rotulos(self):
+        if self.hashes is None:
+            self.hashes = hash_valores(self.rotulos)
+        return self.hashes
+
+
+class ColunasAgregacao:
+    """
+    Colunas de uma agenda limpa no formato consumido pela agregação:
+    posição da linha, cobertura e saldo como float64 e colunas de grupo
+    e de contagem distinta codificadas (ColunaCodificada)
+    """
+
+    def __init__(self, ordem, cobertura, saldo, fornecedor, filial, distintos):
+        self.ordem = np.asarray(ordem, dtype=np.int64)
+        self.cobertura = np.asarray(cobertura, dtype=np.float64)
+        self.saldo = np.asarray(saldo, dtype=np.float64)
+        self.fornecedor = fornecedor
+        self.filial = filial
+        self.distintos = distintos
+
+    def __len__(self):
+        return len(self.ordem)
+
+
+def codificar_dataframe(df):
+    """
+    Converte um DataFrame pandas limpo em ColunasAgregacao
+    """
+    return ColunasAgregacao(
+        ordem=np.asarray(df.index, dtype=np.int64),
+        cobertura=df['Cobertura Atual'].to_numpy(dtype=np.float64),
+        saldo=df['Saldo Pedido'].to_numpy(dtype=np.float64),
+        fornecedor=ColunaCodificada.de_serie(df['Fornecedor']),
+        filial=ColunaCodificada.de_serie(df['Filial']),
+        distintos={coluna: ColunaCodificada.de_serie(df[coluna]) for coluna in COLUNAS_DISTINTAS},
+    )
+
+
+def primeiras_linhas(df):
+    """
+    Primeira linha (posição no arquivo, o índice) de cada grupo das tabelas
+    de agregados de uma agenda limpa, sem calcular o resto: dict atributo
+    -> Series indexada como a tabela, mesclável com mesclar_primeiras()
+    """
+    ordem = pd.Series(np.asarray(df.index, dtype=np.int64), name='ordem')
+    fornecedor = pd.Series(df['Fornecedor'].to_numpy(), name='Fornecedor')
+    filial = pd.Series(df['Filial'].to_numpy(), name='Filial')
+    faixa = pd.Series(classificar_faixas_valor(df['Saldo Pedido'].to_numpy(dtype=np.float64)), name='faixa')
+    na_faixa = faixa >= 0
+
+    return {
+        'fornecedores': ordem.groupby(fornecedor, sort=False).min(),
+        'filiais': ordem.groupby(filial, sort=False).min(),
+        'pares': ordem.groupby([fornecedor, filial], sort=False).min(),
+        'faixas_valor': ordem[na_faixa].groupby(faixa[na_faixa], sort=False).min(),
+        'faixas_valor_pares': ordem[na_faixa].groupby(
+            [faixa[na_faixa], fornecedor[na_faixa], filial[na_faixa]], sort=False).min(),
+    }
+
+
+def mesclar_primeiras(a, b):
+    """
+    Combina as primeiras linhas de dois lotes (resultado de primeiras_linhas)
+    """
+    if a is None:
+        return b
+    return {atributo: pd.concat([a[atributo], b[atributo]]).groupby(
+        level=list(range(a[atributo].index.nlevels)), sort=False).min() for atributo in a}
+
+
+class AgregadosParciais:
+    """
+    Agregados mescláveis de um lote da agenda: contagens, somas, faixas,
+    mínimos/máximos, contagens distintas de Carga, Pedido e Cód. (exatas
+    ou HyperLogLog) e esboços de quantis (t-digest) da cobertura por
+    fornecedor, filial e fornecedor x filial.
+
+    Cada lote gera o seu parcial com de_colunas()/de_dataframe(); os parciais são
+    combinados com mesclar() e as tabelas finais saem dos métodos tabela_*.
+    A coluna 'ordem' guarda a primeira linha de cada grupo, para que a
+    ordem de exibição seja a mesma do processamento em memória.
+    """
+
+    def __init__(self):
+        self.geral = {'itens': 0, 'soma_cobertura': 0.0, 'valor': 0.0,
+                      'ate_44': 0, 'entre_45_70': 0, 'acima_71': 0}
+        self.fornecedores = None
+        self.filiais = None
+        self.pares = None
+        self.faixas_valor = None
+        self.faixas_valor_pares = None
+        self.distintos = {}
+        self.distintos_fornecedores = {coluna: {} for coluna in COLUNAS_DISTINTAS}
+        self.distintos_filiais = {coluna: {} for coluna in COLUNAS_DISTINTAS}
+        self.quantis_fornecedores = {}
+        self.quantis_filiais = {}
+        self.quantis_pares = {}
+
+    @classmethod
+    def de_dataframe(cls, df, contagem=CONTAGEM_EXATA):
+        """
+        Calcula os agregados parciais de um DataFrame pandas já limpo.
+        O índice do DataFrame deve ser a posição da linha no arquivo.
+        """
+        return cls.de_colunas(codificar_dataframe(df), contagem)
+
+    @classmethod
+    def de_colunas(cls, colunas, contagem=CONTAGEM_EXATA):
+        """
+        Calcula os agregados parciais a partir de colunas codificadas
+        (ColunasAgregacao), independente do backend que as produziu.
+        Somas usam np.bincount na ordem das linhas, então backends que
+        entregam as mesmas colunas produzem exatamente os mesmos números.
+        `contagem` escolhe contagem distinta exata ou aproximada (HyperLogLog).
+        """
+        parcial = cls()
+        if len(colunas) == 0:
+            return parcial
+
+        ordem = colunas.ordem
+        cobertura = colunas.cobertura
+        saldo = colunas.saldo
+        saldo_somavel = np.where(np.isnan(saldo), 0.0, saldo)
+        faixas_cobertura = {
+            'ate_44': cobertura <= 44,
+            'entre_45_70': (cobertura >= 45) & (cobertura <= 70),
+            'acima_71': cobertura >= 71,
+        }
+
+        parcial.geral = {
+            'itens': len(colunas),
+            'soma_cobertura': float(cobertura.sum()),
+            'valor': float(saldo_somavel.sum()),
+        }
+        for nome, mascara in faixas_cobertura.items():
+            parcial.geral[nome] = int(mascara.sum())
+
+        fornecedor = colunas.fornecedor
+        filial = colunas.filial
+        total_filiais = filial.cardinalidade
+
+        # Fornecedor, filial e fornecedor x filial
+        grupos_forn, linhas_forn = pd.factorize(fornecedor.codigos)[::-1]
+        rotulos_forn = fornecedor.rotular(grupos_forn)
+        parcial.fornecedores = _tabela_grupos(
+            linhas_forn, len(grupos_forn), pd.Index(rotulos_forn, name='Fornecedor'),
+            ordem, cobertura, saldo_somavel, faixas_cobertura)
+
+        grupos_fil, linhas_fil = pd.factorize(filial.codigos)[::-1]
+        rotulos_fil = filial.rotular(grupos_fil)
+        parcial.filiais = _tabela_grupos(
+            linhas_fil, len(grupos_fil), pd.Index(rotulos_fil, name='Filial'),
+            ordem, cobertura, saldo_somavel, faixas_cobertura)
+
+        grupos_pares, linhas_pares = pd.factorize(fornecedor.codigos * total_filiais + filial.codigos)[::-1]
+        rotulos_pares = pd.MultiIndex.from_arrays([
+            fornecedor.rotular(grupos_pares // total_filiais),
+            filial.rotular(grupos_pares % total_filiais),
+        ], names=['Fornecedor', 'Filial'])
+        parcial.pares = _tabela_grupos(
+            linhas_pares, len(grupos_pares), rotulos_pares,
+            ordem, cobertura, saldo_somavel, faixas_cobertura)
+
+        # Faixas de valor (linhas fora de todas as faixas não entram)
+        faixa = classificar_faixas_valor(saldo)
+        na_faixa = faixa >= 0
+        grupos_faixa, linhas_faixa = pd.factorize(faixa[na_faixa])[::-1]
+        parcial.faixas_valor = _tabela_grupos(
+            linhas_faixa, len(grupos_faixa), pd.Index(grupos_faixa, name='faixa'),
+            ordem[na_faixa], cobertura[na_faixa], saldo_somavel[na_faixa])
+
+        total_fornecedores = fornecedor.cardinalidade
+        codigo_trio = (faixa[na_faixa] * total_fornecedores + fornecedor.codigos[na_faixa]) * total_filiais \
+            + filial.codigos[na_faixa]
+        grupos_trio, linhas_trio = pd.factorize(codigo_trio)[::-1]
+        rotulos_trio = pd.MultiIndex.from_arrays([
+            grupos_trio // (total_fornecedores * total_filiais),
+            fornecedor.rotular((grupos_trio // total_filiais) % total_fornecedores),
+            filial.rotular(grupos_trio % total_filiais),
+        ], names=['faixa', 'Fornecedor', 'Filial'])
+        parcial.faixas_valor_pares = _tabela_grupos(
+            linhas_trio, len(grupos_trio), rotulos_trio,
+            ordem[na_faixa], cobertura[na_faixa], saldo_somavel[na_faixa], valores_extremos=saldo[na_faixa])
+
+        # Contagens distintas de Carga, Pedido e Cód. (global, por fornecedor e por filial)
+        for coluna, codificada in colunas.distintos.items():
+            parcial.distintos[coluna] = contador_total(codificada, contagem)
+            parcial.distintos_fornecedores[coluna] = contadores_por_grupo(linhas_forn, rotulos_forn, codificada, contagem)
+            parcial.distintos_filiais[coluna] = contadores_por_grupo(linhas_fil, rotulos_fil, codificada, contagem)
+
+        # Esboços de quantis da cobertura
+        parcial.quantis_fornecedores = digests_por_grupo(linhas_forn, rotulos_forn, cobertura)
+        parcial.quantis_filiais = digests_por_grupo(linhas_fil, rotulos_fil, cobertura)
+        parcial.quantis_pares = digests_por_grupo(linhas_pares, list(rotulos_pares), cobertura)
+
+        return parcial
+
+    def mesclar(self, outro):
+        """
+        Incorpora outro parcial a este (in-place) e retorna self
+        """
+        for chave, valor in outro.geral.items():
+            self.geral[chave] += valor
+
+        self.fornecedores = _combinar_tabelas(self.fornecedores, outro.fornecedores)
+        self.filiais = _combinar_tabelas(self.filiais, outro.filiais)
+        self.pares = _combinar_tabelas(self.pares, outro.pares)
+        self.faixas_valor = _combinar_tabelas(self.faixas_valor, outro.faixas_valor)
+        self.faixas_valor_pares = _combinar_tabelas(self.faixas_valor_pares, outro.faixas_valor_pares)
+
+        mesclar_contadores(self.distintos, outro.distintos)
+        for coluna in COLUNAS_DISTINTAS:
+            mesclar_contadores(self.distintos_fornecedores[coluna], outro.distintos_fornecedores[coluna])
+            mesclar_contadores(self.distintos_filiais[coluna], outro.distintos_filiais[coluna])
+
+        mesclar_digests(self.quantis_fornecedores, outro.quantis_fornecedores)
+        mesclar_digests(self.quantis_filiais, outro.quantis_filiais)
+        mesclar_digests(self.quantis_pares, outro.quantis_pares)
+
+        return self
+
+    def deslocar_ordem(self, deslocamento):
+        """
+        Soma `deslocamento` à primeira linha de cada grupo (in-place), para
+        mesclar parciais de arquivos diferentes como se fossem uma agenda só;
+        retorna self
+        """
+        for atributo in ['fornecedores', 'filiais', 'pares', 'faixas_valor', 'faixas_valor_pares']:
+            tabela = getattr(self, atributo)
+            if tabela is not None:
+                tabela['ordem'] += deslocamento
+        return self
+
+    def reordenar(self, primeiras):
+        """
+        Troca a coluna 'ordem' de cada tabela pela primeira linha de cada
+        grupo em `primeiras` (de primeiras_linhas), para a ordem de exibição
+        seguir a agenda atual mesmo nos grupos vindos de outro agregado;
+        retorna self
+        """
+        for atributo, primeira in primeiras.items():
+            tabela = getattr(self, atributo)
+            if tabela is not None:
+                tabela['ordem'] = primeira.reindex(tabela.index).fillna(tabela['ordem']).to_numpy(dtype=np.int64)
+        return self
+
+    def renomear(self, rotulos):
+        """
+        Troca códigos inteiros (pd.factorize) pelos rótulos originais.
+        `rotulos` mapeia nome da coluna ('Fornecedor', 'Filial', 'Carga',
+        'Pedido', 'Cód.') para o array de valores únicos; retorna self.
+        """
+        for atributo in ['fornecedores', 'filiais', 'pares', 'faixas_valor', 'faixas_valor_pares']:
+            tabela = getattr(self, atributo)
+            if tabela is not None:
+                tabela.index = _renomear_indice(tabela.index, rotulos)
+
+        for coluna in COLUNAS_DISTINTAS:
+            if coluna not in rotulos:
+                continue
+            contadores = [self.distintos[coluna]] if coluna in self.distintos else []
+            contadores += list(self.distintos_fornecedores[coluna].values())
+            contadores += list(self.distintos_filiais[coluna].values())
+            for contador in contadores:
+                contador.renomear(rotulos[coluna])
+        if 'Fornecedor' in rotulos:
+            fornecedores = rotulos['Fornecedor']
+            for coluna in COLUNAS_DISTINTAS:
+                self.distintos_fornecedores[coluna] = {fornecedores[int(f)]: contador
+                                                       for f, contador in self.distintos_fornecedores[coluna].items()}
+            self.quantis_fornecedores = {fornecedores[int(f)]: digest
+                                         for f, digest in self.quantis_fornecedores.items()}
+        if 'Filial' in rotulos:
+            filiais = rotulos['Filial']
+            for coluna in COLUNAS_DISTINTAS:
+                self.distintos_filiais[coluna] = {filiais[int(f)]: contador
+                                                  for f, contador in self.distintos_filiais[coluna].items()}
+            self.quantis_filiais = {filiais[int(f)]: digest
+                                    for f, digest in self.quantis_filiais.items()}
+        if 'Fornecedor' in rotulos and 'Filial' in rotulos:
+            self.quantis_pares = {(fornecedores[int(f)], filiais[int(l)]): digest
+                                  for (f, l), digest in self.quantis_pares.items()}
+        return self
+
+    def substituir_grupos(self, parcial, fornecedores, filiais):
+        """
+        Novo agregado em que os `fornecedores` e `filiais` dados (e os pares
+        e trios que os envolvem) vêm de `parcial`, calculado sobre todas as
+        linhas atuais desses grupos, e os demais grupos são mantidos deste.
+        Faixas de valor, totais gerais e contagens distintas globais são
+        recompostos a partir dos grupos; os contadores e esboços mantidos são
+        compartilhados com este agregado.
+        """
+        fornecedores, filiais = set(fornecedores), set(filiais)
+        lista_fornecedores, lista_filiais = list(fornecedores), list(filiais)
+
+        def fornecedor_tocado(indice):
+            return indice.get_level_values('Fornecedor').isin(lista_fornecedores)
+
+        def filial_tocada(indice):
+            return indice.get_level_values('Filial').isin(lista_filiais)
+
+        def par_tocado(indice):
+            return fornecedor_tocado(indice) | filial_tocada(indice)
+
+        novo = AgregadosParciais()
+        novo.fornecedores = _substituir_linhas(self.fornecedores, parcial.fornecedores, fornecedor_tocado)
+        novo.filiais = _substituir_linhas(self.filiais, parcial.filiais, filial_tocada)
+        novo.pares = _substituir_linhas(self.pares, parcial.pares, par_tocado)
+        novo.faixas_valor_pares = _substituir_linhas(self.faixas_valor_pares, parcial.faixas_valor_pares, par_tocado)
+
+        # Faixas de valor e totais gerais são somas dos grupos
+        novo.faixas_valor = novo.faixas_valor_pares.groupby(level='faixa', sort=False).agg(
+            {coluna: AGREGACOES[coluna] for coluna in ['ordem', 'itens', 'soma_cobertura', 'valor']})
+        somas = novo.fornecedores[list(self.geral)].sum()
+        novo.geral = {chave: (float if chave in ('soma_cobertura', 'valor') else int)(valor)
+                      for chave, valor in somas.items()}
+
+        for coluna in COLUNAS_DISTINTAS:
+            novo.distintos_fornecedores[coluna] = _substituir_chaves(
+                self.distintos_fornecedores[coluna], parcial.distintos_fornecedores[coluna],
+                lambda chave: chave in fornecedores)
+            novo.distintos_filiais[coluna] = _substituir_chaves(
+                self.distintos_filiais[coluna], parcial.distintos_filiais[coluna],
+                lambda chave: chave in filiais)
+            # O global é a união dos contadores por fornecedor
+            for contador in novo.distintos_fornecedores[coluna].values():
+                if coluna in novo.distintos:
+                    novo.distintos[coluna].mesclar(contador)
+                else:
+                    novo.distintos[coluna] = copy.deepcopy(contador)
+
+        novo.quantis_fornecedores = _substituir_chaves(
+            self.quantis_fornecedores, parcial.quantis_fornecedores, lambda chave: chave in fornecedores)
+        novo.quantis_filiais = _substituir_chaves(
+            self.quantis_filiais, parcial.quantis_filiais, lambda chave: chave in filiais)
+        novo.quantis_pares = _substituir_chaves(
+            self.quantis_pares, parcial.quantis_pares,
+            lambda chave: chave[0] in fornecedores or chave[1] in filiais)
+
+        return novo
+
+    # Tabelas finais
+
+    @property
+    def contagem(self):
+        """
+        Modo de contagem distinta dos contadores deste agregado
+        """
+        contador = next(iter(self.distintos.values()), None)
+        return CONTAGEM_APROXIMADA if isinstance(contador, HyperLogLog) else CONTAGEM_EXATA
+
+    def _distintos_total(self, coluna):
+        contador = self.distintos.get(coluna)
+        return 0 if contador is None else contador.estimar()
+
+    @property
+    def total_itens(self):
+        return self.geral['itens']
+
+    def metricas_gerais(self):
+        """
+        Métricas globais da análise
+        """
+        total_itens = self.geral['itens']
+        return {
+            'total_fornecedores': 0 if self.fornecedores is None else len(self.fornecedores),
+            'total_cargas': self._distintos_total('Carga'),
+            'total_pedidos': self._distintos_total('Pedido'),
+            'total_codigos': self._distintos_total('Cód.'),
+            'total_itens': total_itens,
+            'total_filiais': 0 if self.filiais is None else len(self.filiais),
+            'valor_total': self.geral['valor'],
+            'cobertura_media': self.geral['soma_cobertura'] / total_itens,
+            'ate_44': self.geral['ate_44'],
+            'entre_45_70': self.geral['entre_45_70'],
+            'acima_71': self.geral['acima_71'],
+            'perc_ate_44': (self.geral['ate_44'] / total_itens) * 100,
+            'perc_45_70': (self.geral['entre_45_70'] / total_itens) * 100,
+            'perc_acima_71': (self.geral['acima_71'] / total_itens) * 100,
+        }
+
+    def tabela_fornecedores(self):
+        """
+        Uma linha por fornecedor, na ordem de primeira ocorrência
+        """
+        tabela = _derivar(self.fornecedores.sort_values('ordem'))
+        _acrescentar_distintos(tabela, self.distintos_fornecedores)
+        tabela['filiais'] = self.pares.groupby(level='Fornecedor').size().reindex(tabela.index)
+        _acrescentar_quantis(tabela, self.quantis_fornecedores, tabela.index)
+        return tabela
+
+    def tabela_filiais(self):
+        """
+        Uma linha por filial, na ordem de primeira ocorrência
+        """
+        tabela = _derivar(self.filiais.sort_values('ordem'))
+        _acrescentar_distintos(tabela, self.distintos_filiais)
+        _acrescentar_quantis(tabela, self.quantis_filiais, tabela.index)
+        return tabela
+
+    def tabela_pares(self):
+        """
+        Uma linha por combinação fornecedor x filial, na ordem de primeira ocorrência
+        """
+        tabela = _derivar(self.pares.sort_values('ordem')).reset_index()
+        tabela['ordem_fornecedor'] = tabela.groupby('Fornecedor')['ordem'].transform('min')
+        _acrescentar_quantis(tabela, self.quantis_pares, zip(tabela['Fornecedor'], tabela['Filial']))
+        return tabela
+
+    def tabela_faixas_valor(self):
+        """
+        Uma linha por faixa de valor com itens (índice = posição em FAIXAS_VALOR)
+        """
+        return _derivar(self.faixas_valor.sort_index())
+
+    def tabela_faixas_valor_pares(self):
+        """
+        Uma linha por faixa de valor x fornecedor x filial
+        """
+        tabela = _derivar(self.faixas_valor_pares.sort_values('ordem')).reset_index()
+        tabela['ordem_fornecedor'] = tabela.groupby(['faixa', 'Fornecedor'])['ordem'].transform('min')
+        return tabela
+
+
+def combinar_agregados(parciais):
+    """
+    Combina uma sequência de agregados parciais em um único agregado
+    """
+    total = AgregadosParciais()
+    for parcial in parciais:
+        total.mesclar(parcial)
+    return total
@@ -0,0 +1,197 @@
+import os
+import numpy as np
+
+from src.services.agregados import ColunaCodificada, ColunasAgregacao, codificar_dataframe
+from src.services.detalhes import COLUNAS_DETALHE
+from src.services.distintos import COLUNAS_DISTINTAS
+from src.services.leitura import (
+    ABA_AGENDA, STATUS_APROVACAO, COLUNAS_AGENDA, COLUNAS_NUMERICAS, COLUNAS_CODIGO, PADRAO_INTEIRO, EXTENSAO_CSV,
+    EXTENSAO_PARQUET, SEPARADOR_CSV, CODIFICACAO_CSV, TIPOS_CSV, extensao_arquivo, ler_agenda, filtrar_aprovacao,
+    limpar_agenda, linhas_descartadas, normalizar_codigos
+)
+
+# Backend de DataFrame usado na leitura e limpeza da agenda
+BACKEND_PANDAS = 'pandas'
+BACKEND_POLARS = 'polars'
+BACKEND_PADRAO = os.environ.get('ANALISE_BACKEND', BACKEND_PANDAS)
+
+# Colunas obrigatórias na limpeza
+COLUNAS_OBRIGATORIAS = ['Cobertura Atual', 'Fornecedor', 'Filial', 'Mercadoria']
+
+# Posição da linha no arquivo (o pandas guarda no índice)
+COLUNA_LINHA = '__linha'
+
+
+class BackendPandas:
+    """
+    Leitura e limpeza da agenda com pandas (padrão)
+    """
+
+    nome = BACKEND_PANDAS
+
+    def ler(self, filepath):
+        return ler_agenda(filepath)
+
+    def filtrar_aprovacao(self, df):
+        return filtrar_aprovacao(df)
+
+    def limpar(self, df):
+        return limpar_agenda(df)
+
+    def descartadas(self, df):
+        """
+        Registros "Em Aprovação" removidos na limpeza, com as colunas de detalhe
+        """
+        return linhas_descartadas(df)[COLUNAS_DETALHE]
+
+    def codificar(self, df):
+        return codificar_dataframe(df)
+
+    def detalhes(self, df):
+        """
+        DataFrame pandas com as colunas da aba de detalhes
+        """
+        return df
+
+
+class BackendPolars:
+    """
+    Leitura e limpeza da agenda com Polars (dependência opcional).
+
+    Filtro, conversão numérica e codificação das chaves rodam no motor
+    multithread do Polars; a agregação recebe as mesmas ColunasAgregacao
+    do backend pandas, então o resumo gerado é idêntico.
+    """
+
+    nome = BACKEND_POLARS
+
+    def __init__(self):
+        try:
+            import polars
+        except ImportError:
+            raise ValueError("Backend 'polars' indisponível: instale os pacotes polars e pyarrow")
+        self.pl = polars
+
+    def ler(self, filepath):
+        pl = self.pl
+        extensao = extensao_arquivo(filepath)
+        if extensao == EXTENSAO_CSV:
+            return self._ler_csv(filepath).with_row_index(COLUNA_LINHA)
+        if extensao == EXTENSAO_PARQUET:
+            # Poda de colunas e filtro de Status aplicados na varredura do arquivo
+            return (
+                pl.scan_parquet(filepath, row_index_name=COLUNA_LINHA)
+                .select([COLUNA_LINHA] + COLUNAS_AGENDA)
+                .filter(pl.col('Status') == STATUS_APROVACAO)
+                .collect()
+            )
+        try:
+            df = pl.read_excel(filepath, sheet_name=ABA_AGENDA, engine='calamine')
+        except ImportError:
+            # Sem fastexcel (calamine) a leitura usa o openpyxl
+            df = pl.read_excel(filepath, sheet_name=ABA_AGENDA, engine='openpyxl')
+        return df.with_row_index(COLUNA_LINHA)
+
+    def _ler_csv(self, filepath):
+        """
+        CSV do ERP com os tipos de TIPOS_CSV; os números chegam como texto
+        e são convertidos aqui (o Polars não tem separador de milhar)
+        """
+        pl = self.pl
+        codificacao = 'utf8' if CODIFICACAO_CSV.lower() in ('utf-8', 'utf8', 'utf-8-sig') else CODIFICACAO_CSV
+        df = pl.read_csv(
+            filepath, separator=SEPARADOR_CSV, decimal_comma=True, columns=COLUNAS_AGENDA, encoding=codificacao,
+            schema_overrides={coluna: pl.String for coluna in TIPOS_CSV}
+        )
+        return df.with_columns([
+            pl.col(coluna).str.strip_chars().str.replace_all('.', '', literal=True).str.replace(',', '.', literal=True)
+            .cast(pl.Float64, strict=False)
+            for coluna in COLUNAS_NUMERICAS
+        ])
+
+    def filtrar_aprovacao(self, df):
+        pl = self.pl
+        df_aprovacao = df.filter(pl.col('Status') == STATUS_APROVACAO)
+        return df_aprovacao.with_columns([
+            pl.col(coluna).cast(pl.Float64, strict=False).fill_nan(None)
+            for coluna in COLUNAS_NUMERICAS
+        ] + [
+            self._codigo_canonico(coluna) for coluna in COLUNAS_CODIGO if df.schema[coluna] == pl.String
+        ])
+
+    def _codigo_canonico(self, coluna):
+        """
+        Texto só com dígitos na forma do inteiro ('001249' -> '1249'), para a
+        contagem distinta coincidir com a do pandas; normalizar_codigos
+        converte os detalhes depois
+        """
+        pl = self.pl
+        texto = pl.col(coluna)
+        inteiro = texto.str.strip_chars().cast(pl.Int64, strict=False).cast(pl.String)
+        return (
+            pl.when(texto.str.contains(f'^{PADRAO_INTEIRO}$')).then(pl.coalesce(inteiro, texto)).otherwise(texto)
+            .alias(coluna)
+        )
+
+    def limpar(self, df):
+        return df.filter(self._valida(df))
+
+    def descartadas(self, df):
+        """
+        Registros "Em Aprovação" removidos na limpeza, com as colunas de detalhe
+        """
+        return self.detalhes(df.filter(~self._valida(df)))
+
+    def _valida(self, df):
+        pl = self.pl
+        return pl.all_horizontal([self._presente(df, coluna) for coluna in COLUNAS_OBRIGATORIAS])
+
+    def _presente(self, df, coluna):
+        pl = self.pl
+        expressao = pl.col(coluna).is_not_null()
+        if df.schema[coluna].is_float():
+            expressao = expressao & pl.col(coluna).is_not_nan()
+        return expressao
+
+    def _codificar_coluna(self, serie):
+        """
+        Códigos densos (-1 = vazio) com os valores únicos em ordem crescente
+        """
+        if serie.dtype.is_float():
+            serie = serie.fill_nan(None)
+        rotulos = serie.drop_nulls().unique().sort()
+        codigos = (serie.rank('dense') - 1).fill_null(-1)
+        return ColunaCodificada(codigos.to_numpy(), rotulos.to_numpy())
+
+    def codificar(self, df):
+        return ColunasAgregacao(
+            ordem=df[COLUNA_LINHA].to_numpy().astype(np.int64),
+            cobertura=df['Cobertura Atual'].to_numpy(),
+            saldo=df['Saldo Pedido'].fill_null(np.nan).to_numpy(),
+            fornecedor=self._codificar_coluna(df['Fornecedor']),
+            filial=self._codificar_coluna(df['Filial']),
+            distintos={coluna: self._codificar_coluna(df[coluna]) for coluna in COLUNAS_DISTINTAS},
+        )
+
+    def detalhes(self, df):
+        """
+        DataFrame pandas com as colunas da aba de detalhes; o índice é a
+        posição da linha no arquivo, como no backend pandas
+        """
+        detalhes = df.select(COLUNAS_DETALHE).to_pandas()
+        if COLUNA_LINHA in df.columns:
+            detalhes.index = df[COLUNA_LINHA].to_numpy()
+        return normalizar_codigos(detalhes)
+
+
+BACKENDS = {BACKEND_PANDAS: BackendPandas, BACKEND_POLARS: BackendPolars}
+
+
+def obter_backend(nome=None):
+    """
+    Instancia o backend pelo nome (padrão: variável ANALISE_BACKEND ou pandas)
+    """
+    nome = nome or BACKEND_PADRAO
+    if nome not in BACKENDS:
+        raise ValueError(f"Backend desconhecido: {nome}")
+    return BACKENDS[nome]()
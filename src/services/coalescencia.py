@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import fcntl
+import hashlib
+import tempfile
+
+# Pasta com os locks e resultados compartilhados entre os workers do host
+PASTA_COALESCENCIA = os.environ.get(
+    'ANALISE_PASTA_COALESCENCIA', os.path.join(tempfile.gettempdir(), 'analise_coalescencia')
+)
+
+# Por quanto tempo (segundos) um resultado pronto atende uploads idênticos
+VALIDADE_RESULTADO = int(os.environ.get('ANALISE_VALIDADE_RESULTADO', 300))
+
+TAMANHO_BLOCO_HASH = 1024 * 1024
+
+
+def hash_conteudo(filepath):
+    """
+    SHA-256 do conteúdo do arquivo, lido em blocos
+    """
+    sha = hashlib.sha256()
+    with open(filepath, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(TAMANHO_BLOCO_HASH), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def chave_analise(filepath, *parametros):
+    """
+    Chave de coalescência: conteúdo do arquivo (ou de cada arquivo de um
+    lote, na ordem) mais os parâmetros que mudam o resultado
+    """
+    caminhos = filepath if isinstance(filepath, list) else [filepath]
+    sha = hashlib.sha256(''.join(hash_conteudo(caminho) for caminho in caminhos).encode())
+    sha.update(json.dumps([str(p) for p in parametros]).encode())
+    return sha.hexdigest()
+
+
+def _ler_resultado(caminho):
+    try:
+        if time.time() - os.path.getmtime(caminho) > VALIDADE_RESULTADO:
+            return None
+        with open(caminho, encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+
+def _gravar_resultado(caminho, resultado):
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(resultado, arquivo)
+    os.replace(temporario, caminho)
+
+
+def _remover_trava(caminho):
+    """
+    Remove um lock antigo só se ninguém o segura (flock não bloqueante);
+    quem já o tinha aberto percebe a troca de inode em _abrir_trava
+    """
+    with open(caminho, 'a') as trava:
+        try:
+            fcntl.flock(trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return
+        try:
+            os.remove(caminho)
+        finally:
+            fcntl.flock(trava, fcntl.LOCK_UN)
+
+
+def _remover_expirados():
+    agora = time.time()
+    for nome in os.listdir(PASTA_COALESCENCIA):
+        if not nome.endswith(('.json', '.lock')):
+            continue
+        caminho = os.path.join(PASTA_COALESCENCIA, nome)
+        try:
+            if agora - os.path.getmtime(caminho) <= VALIDADE_RESULTADO:
+                continue
+            if nome.endswith('.lock'):
+                _remover_trava(caminho)
+            else:
+                os.remove(caminho)
+        except OSError:
+            pass
+
+
+def _abrir_trava(caminho):
+    """
+    Abre e trava o lock da chave. Se o arquivo foi removido pela limpeza
+    enquanto esperávamos, a trava ficou num inode órfão: abre de novo.
+    """
+    while True:
+        trava = open(caminho, 'a')
+        fcntl.flock(trava, fcntl.LOCK_EX)
+        try:
+            if os.stat(caminho).st_ino == os.fstat(trava.fileno()).st_ino:
+                os.utime(caminho)
+                return trava
+        except FileNotFoundError:
+            pass
+        fcntl.flock(trava, fcntl.LOCK_UN)
+        trava.close()
+
+
+def _em_andamento(caminho):
+    """
+    Se outro worker segura o lock da chave (cálculo em andamento)
+    """
+    try:
+        trava = open(caminho, 'r')
+    except FileNotFoundError:
+        return False
+    with trava:
+        try:
+            fcntl.flock(trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        fcntl.flock(trava, fcntl.LOCK_UN)
+        return False
+
+
+def executar_uma_vez(chave, funcao, admitir=None):
+    """
+    Executa `funcao` uma única vez por chave entre todos os workers do host.
+    Quem chega enquanto o cálculo está em andamento espera no flock da
+    chave e recebe o mesmo resultado (dict serializável em JSON). Resultados
+    com 'error' não são guardados: o próximo upload tenta de novo.
+
+    Com `admitir`, a reserva de recursos (objeto com liberar() ou None;
+    exceção se não houver capacidade) é feita antes de travar a chave, para que a
+    espera na fila de admissão não segure os uploads idênticos; `funcao`
+    recebe a reserva, que é liberada ao final. Quem encontra o cálculo em
+    andamento só espera o resultado, sem reservar.
+    """
+    os.makedirs(PASTA_COALESCENCIA, exist_ok=True)
+    caminho_resultado = os.path.join(PASTA_COALESCENCIA, f"{chave}.json")
+    caminho_trava = os.path.join(PASTA_COALESCENCIA, f"{chave}.lock")
+
+    while True:
+        resultado = _ler_resultado(caminho_resultado)
+        if resultado is not None:
+            return resultado
+
+        reserva, admitido = None, False
+        if admitir is not None and not _em_andamento(caminho_trava):
+            reserva, admitido = admitir(), True
+        try:
+            with _abrir_trava(caminho_trava) as trava:
+                try:
+                    resultado = _ler_resultado(caminho_resultado)
+                    if resultado is not None:
+                        return resultado
+                    if admitir is not None and not admitido:
+                        # O cálculo que esperávamos falhou: volta para a
+                        # fila de admissão sem segurar a trava
+                        continue
+
+                    resultado = funcao() if admitir is None else funcao(reserva)
+                    if 'error' not in resultado:
+                        _gravar_resultado(caminho_resultado, resultado)
+                    _remover_expirados()
+                    return resultado
+                finally:
+                    fcntl.flock(trava, fcntl.LOCK_UN)
+        finally:
+            if reserva is not None:
+                reserva.liberar()
@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+
+from src.services.distintos import hash_linhas
+from src.services.leitura import (
+    EXTENSAO_CSV, EXTENSAO_PARQUET, SEPARADOR_CSV, CODIFICACAO_CSV, extensao_arquivo, numero_csv
+)
+
+# Colunas da listagem de NF/pedidos: chave da conciliação, quantidade e nota
+COLUNAS_CHAVE_CONCILIACAO = ['Pedido', 'Cód.']
+COLUNA_QUANTIDADE_LISTAGEM = 'Quantidade'
+COLUNA_QUANTIDADE_AGENDA = 'Quantidade<br />Entrega'
+COLUNA_NOTA = 'Nota Fiscal'
+
+# Situação de cada chave (Pedido, Cód.) na conciliação
+CONCILIADA = 'conciliada'
+SEM_LISTAGEM = 'sem_listagem'
+SEM_AGENDA = 'sem_agenda'
+QUANTIDADE_DIVERGENTE = 'quantidade_divergente'
+NOTA_DIVERGENTE = 'nota_divergente'
+ROTULOS_CONCILIACAO = {
+    SEM_LISTAGEM: '❌ Sem NF/Pedido na listagem',
+    SEM_AGENDA: '❌ Fora da agenda',
+    QUANTIDADE_DIVERGENTE: '⚠️ Quantidade divergente',
+    NOTA_DIVERGENTE: '⚠️ NF divergente',
+}
+
+# Diferença de quantidade tolerada (arredondamento das exportações)
+TOLERANCIA_QUANTIDADE = 1e-6
+
+
+class ListagemInvalida(ValueError):
+    """
+    Listagem de conciliação sem as colunas obrigatórias
+    """
+
+
+def ler_listagem(filepath):
+    """
+    Lê a primeira aba (ou o CSV/Parquet) da listagem de NF/pedidos apenas com as colunas usadas
+    """
+    usadas = COLUNAS_CHAVE_CONCILIACAO + [COLUNA_QUANTIDADE_LISTAGEM, COLUNA_NOTA]
+    extensao = extensao_arquivo(filepath)
+    if extensao == EXTENSAO_CSV:
+        # Quantidade como texto (vírgula decimal e ponto de milhar), convertida abaixo
+        df = pd.read_csv(filepath, sep=SEPARADOR_CSV, decimal=',', encoding=CODIFICACAO_CSV,
+                         usecols=lambda coluna: str(coluna).strip() in usadas,
+                         dtype={COLUNA_QUANTIDADE_LISTAGEM: str})
+    elif extensao == EXTENSAO_PARQUET:
+        import pyarrow.parquet as pq
+        df = pd.read_parquet(filepath, columns=[
+            coluna for coluna in pq.read_schema(filepath).names if coluna.strip() in usadas
+        ])
+    else:
+        df = pd.read_excel(filepath, sheet_name=0, usecols=lambda coluna: str(coluna).strip() in usadas)
+    df.columns = [str(coluna).strip() for coluna in df.columns]
+
+    faltando = [coluna for coluna in COLUNAS_CHAVE_CONCILIACAO + [COLUNA_QUANTIDADE_LISTAGEM]
+                if coluna not in df.columns]
+    if faltando:
+        raise ListagemInvalida(f"Colunas obrigatórias ausentes na listagem: {', '.join(faltando)}")
+
+    quantidade = df[COLUNA_QUANTIDADE_LISTAGEM]
+    if extensao == EXTENSAO_CSV and quantidade.dtype == object:
+        quantidade = numero_csv(quantidade)
+    df[COLUNA_QUANTIDADE_LISTAGEM] = pd.to_numeric(quantidade, errors='coerce')
+    return df
+
+
+def _por_chave(df, chave, quantidade, colunas):
+    """
+    Uma linha por chave (hash de Pedido e Cód.): quantidade somada e o
+    primeiro valor das demais colunas
+    """
+    agregacoes = {'quantidade': (quantidade, 'sum'), 'linhas': (quantidade, 'size')}
+    agregacoes.update({coluna: (coluna, 'first') for coluna in colunas})
+    return df.assign(chave=chave).groupby('chave', sort=False).agg(**agregacoes)
+
+
+class Conciliacao:
+    """
+    Resultado da conciliação: contagens por situação e as chaves com
+    divergência (tudo que não foi conciliado)
+    """
+
+    def __init__(self, contagens, divergencias):
+        self.contagens = contagens
+        self.divergencias = divergencias
+
+    def resumo(self):
+        return dict(self.contagens)
+
+
+def conciliar(agenda, listagem):
+    """
+    Concilia a agenda limpa (COLUNAS_DETALHE) com a listagem por hash join
+    em (Pedido, Cód.): as duas tabelas são reduzidas a uma linha por hash
+    da chave e juntadas pelo índice. Quando a listagem traz Nota Fiscal,
+    as notas da agenda também precisam aparecer na listagem para a chave.
+    """
+    colunas_listagem = [coluna for coluna in [COLUNA_NOTA] if coluna in listagem.columns]
+    chave_agenda = hash_linhas(agenda, COLUNAS_CHAVE_CONCILIACAO)
+    chave_listagem = hash_linhas(listagem, COLUNAS_CHAVE_CONCILIACAO)
+
+    por_agenda = _por_chave(agenda, chave_agenda, COLUNA_QUANTIDADE_AGENDA,
+                            COLUNAS_CHAVE_CONCILIACAO + ['Fornecedor', 'Filial', 'Mercadoria', COLUNA_NOTA])
+    por_listagem = _por_chave(listagem, chave_listagem, COLUNA_QUANTIDADE_LISTAGEM,
+                              COLUNAS_CHAVE_CONCILIACAO + colunas_listagem)
+
+    juncao = por_agenda.merge(
+        por_listagem, left_index=True, right_index=True, how='outer',
+        suffixes=('_agenda', '_listagem'), indicator=True
+    )
+    nas_duas = (juncao['_merge'] == 'both').to_numpy()
+    diferenca = (juncao['quantidade_listagem'] - juncao['quantidade_agenda']).to_numpy()
+
+    # Nota divergente: alguma (chave, nota) da agenda ausente entre as da listagem com nota
+    nota_divergente = np.zeros(len(juncao), dtype=bool)
+    if colunas_listagem:
+        com_nota_agenda = agenda[COLUNA_NOTA].notna().to_numpy()
+        com_nota_listagem = listagem[COLUNA_NOTA].notna().to_numpy()
+        pares_agenda = hash_linhas(agenda[com_nota_agenda], COLUNAS_CHAVE_CONCILIACAO + [COLUNA_NOTA])
+        pares_listagem = hash_linhas(listagem[com_nota_listagem], COLUNAS_CHAVE_CONCILIACAO + [COLUNA_NOTA])
+        sem_par = ~np.isin(pares_agenda, pares_listagem)
+        chaves_divergentes = np.intersect1d(chave_agenda[com_nota_agenda][sem_par], chave_listagem[com_nota_listagem])
+        nota_divergente = juncao.index.isin(chaves_divergentes)
+
+    situacao = np.select(
+        [
+            (juncao['_merge'] == 'left_only').to_numpy(),
+            (juncao['_merge'] == 'right_only').to_numpy(),
+            nas_duas & ~(np.abs(diferenca) <= TOLERANCIA_QUANTIDADE),
+            nas_duas & nota_divergente,
+        ],
+        [SEM_LISTAGEM, SEM_AGENDA, QUANTIDADE_DIVERGENTE, NOTA_DIVERGENTE],
+        default=CONCILIADA
+    )
+
+    divergencias = pd.DataFrame({
+        'situacao': situacao,
+        'pedido': juncao['Pedido_agenda'].combine_first(juncao['Pedido_listagem']).to_numpy(),
+        'codigo': juncao['Cód._agenda'].combine_first(juncao['Cód._listagem']).to_numpy(),
+        'fornecedor': juncao['Fornecedor'].to_numpy(),
+        'filial': juncao['Filial'].to_numpy(),
+        'mercadoria': juncao['Mercadoria'].to_numpy(),
+        'nota_agenda': juncao[f'{COLUNA_NOTA}_agenda' if colunas_listagem else COLUNA_NOTA].to_numpy(),
+        'nota_listagem': juncao[f'{COLUNA_NOTA}_listagem'].to_numpy() if colunas_listagem else np.nan,
+        'quantidade_agenda': juncao['quantidade_agenda'].to_numpy(),
+        'quantidade_listagem': juncao['quantidade_listagem'].to_numpy(),
+        'diferenca': diferenca,
+    })
+    divergencias = divergencias[divergencias['situacao'] != CONCILIADA].reset_index(drop=True)
+
+    por_situacao = pd.Series(situacao).value_counts()
+    contagens = {'linhas_agenda': len(agenda), 'linhas_listagem': len(listagem), 'chaves': len(juncao)}
+    contagens.update({nome: int(por_situacao.get(nome, 0)) for nome in
+                      [CONCILIADA, SEM_LISTAGEM, SEM_AGENDA, QUANTIDADE_DIVERGENTE, NOTA_DIVERGENTE]})
+    return Conciliacao(contagens, divergencias)
@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+
+from src.services.detalhes import COLUNAS_DETALHE
+from src.services.distintos import hash_linhas
+
+# Colunas que identificam uma linha da agenda entre uploads e colunas
+# comparadas para decidir se a linha mudou
+COLUNAS_CHAVE = ['Carga', 'Pedido', 'Cód.']
+COLUNAS_CONTEUDO = [coluna for coluna in COLUNAS_DETALHE if coluna not in COLUNAS_CHAVE]
+
+# Situação de cada linha na aba de alterações
+INCLUIDA = 'incluida'
+REMOVIDA = 'removida'
+ALTERADA = 'alterada'
+ROTULOS_SITUACAO = {INCLUIDA: '➕ Incluída', ALTERADA: '✏️ Alterada', REMOVIDA: '➖ Removida'}
+
+def assinar_linhas(df):
+    """
+    Assinatura de cada linha de uma agenda limpa: hash da chave (Carga,
+    Pedido, Cód.), hash do conteúdo e posição no arquivo (índice); as
+    mesmas da verificação de qualidade, que as análises salvam com o estado
+    """
+    return pd.DataFrame({
+        'chave': hash_linhas(df, COLUNAS_CHAVE),
+        'conteudo': hash_linhas(df, COLUNAS_CONTEUDO),
+        'posicao': np.asarray(df.index, dtype=np.int64),
+    })
+
+
+class DeltaAgenda:
+    """
+    Linhas incluídas, removidas e alteradas entre a agenda de uma análise
+    anterior (`base`) e a atual; as alteradas guardam as duas versões
+    """
+
+    def __init__(self, base, incluidas, removidas, alteradas_antes, alteradas_depois):
+        self.base = base
+        self.incluidas = incluidas
+        self.removidas = removidas
+        self.alteradas_antes = alteradas_antes
+        self.alteradas_depois = alteradas_depois
+
+    def __len__(self):
+        return len(self.incluidas) + len(self.removidas) + len(self.alteradas_depois)
+
+    def grupos_tocados(self):
+        """
+        Fornecedores e filiais com alguma linha incluída, removida ou alterada
+        (nas alteradas, tanto o grupo anterior quanto o atual)
+        """
+        linhas = pd.concat([self.incluidas, self.removidas, self.alteradas_antes, self.alteradas_depois])
+        return set(linhas['Fornecedor'].dropna()), set(linhas['Filial'].dropna())
+
+    def resumo(self):
+        fornecedores, filiais = self.grupos_tocados()
+        return {
+            'base': self.base,
+            'incluidas': len(self.incluidas),
+            'removidas': len(self.removidas),
+            'alteradas': len(self.alteradas_depois),
+            'fornecedores_afetados': len(fornecedores),
+            'filiais_afetadas': len(filiais),
+        }
+
+    def campos_alterados(self):
+        """
+        Nomes das colunas que mudaram em cada linha alterada, separados por vírgula
+        """
+        antes = self.alteradas_antes[COLUNAS_CONTEUDO].reset_index(drop=True)
+        depois = self.alteradas_depois[COLUNAS_CONTEUDO].reset_index(drop=True)
+        diferentes = (antes != depois) & ~(antes.isna() & depois.isna())
+        return diferentes.apply(lambda linha: ', '.join(linha.index[linha]), axis=1).tolist()
+
+    def tabela(self):
+        """
+        Uma linha por alteração (incluídas, removidas e alteradas), com saldo
+        e cobertura antes e depois, para a aba "O que mudou"
+        """
+        def montar(situacao, identificacao, antes=None, depois=None, campos=''):
+            tabela = identificacao[COLUNAS_CHAVE + ['Fornecedor', 'Filial', 'Mercadoria']].reset_index(drop=True)
+            tabela.insert(0, 'situacao', situacao)
+            for coluna, sufixo in (('Saldo Pedido', 'saldo'), ('Cobertura Atual', 'cobertura')):
+                tabela[f'{sufixo}_anterior'] = np.nan if antes is None else antes[coluna].to_numpy()
+                tabela[f'{sufixo}_atual'] = np.nan if depois is None else depois[coluna].to_numpy()
+            tabela['campos'] = campos
+            return tabela
+
+        return pd.concat([
+            montar(ALTERADA, self.alteradas_depois, self.alteradas_antes, self.alteradas_depois,
+                   self.campos_alterados() if len(self.alteradas_depois) else ''),
+            montar(INCLUIDA, self.incluidas, depois=self.incluidas),
+            montar(REMOVIDA, self.removidas, antes=self.removidas),
+        ], ignore_index=True)
+
+
+def comparar_assinaturas(anterior, atual):
+    """
+    Compara as assinaturas (chave, conteúdo e posição, na ordem do arquivo)
+    de duas agendas por hash join: chave presente só na anterior = removida,
+    só na atual = incluída, nas duas com conteúdo diferente = alterada.
+    Linhas com a mesma chave são pareadas pela ordem. Retorna as posições
+    de cada situação, na ordem do arquivo.
+    """
+    def com_ocorrencia(assinaturas):
+        assinaturas = pd.DataFrame(assinaturas)[['chave', 'conteudo', 'posicao']]
+        assinaturas['ocorrencia'] = assinaturas.groupby('chave', sort=False).cumcount()
+        return assinaturas
+
+    anterior, atual = com_ocorrencia(anterior), com_ocorrencia(atual)
+    pareamento = ['chave', 'ocorrencia']
+
+    # Conteúdos comparados só entre as pareadas (no outer join o hash
+    # uint64 viraria float por causa dos ausentes)
+    pareadas = anterior.merge(atual, on=pareamento, suffixes=('_anterior', '_atual'))
+    alteradas = pareadas[pareadas['conteudo_anterior'] != pareadas['conteudo_atual']]
+    alteradas = alteradas.sort_values('posicao_atual', kind='stable')
+
+    juncao = anterior[pareamento + ['posicao']].merge(
+        atual[pareamento + ['posicao']], on=pareamento, how='outer', suffixes=('_anterior', '_atual'), indicator=True
+    )
+    situacao = juncao['_merge']
+
+    def ordenadas(posicoes):
+        return np.sort(posicoes.to_numpy(dtype=np.int64))
+
+    return {
+        INCLUIDA: ordenadas(juncao.loc[situacao == 'right_only', 'posicao_atual']),
+        REMOVIDA: ordenadas(juncao.loc[situacao == 'left_only', 'posicao_anterior']),
+        'alteradas_anterior': alteradas['posicao_anterior'].to_numpy(dtype=np.int64),
+        'alteradas_atual': alteradas['posicao_atual'].to_numpy(dtype=np.int64),
+    }
@@ -0,0 +1,207 @@
+import os
+import heapq
+import pickle
+import shutil
+import tempfile
+from operator import itemgetter
+import numpy as np
+import pandas as pd
+
+# Colunas exibidas na aba "Detalhes por Mercadoria", nesta ordem
+COLUNAS_DETALHE = [
+    'Carga', 'Pedido', 'Fornecedor', 'Filial', 'Cód.', 'Mercadoria',
+    'Quantidade<br />Entrega', 'Saldo Pedido', 'Cobertura Atual', 'Nota Fiscal'
+]
+POSICAO_COBERTURA = COLUNAS_DETALHE.index('Cobertura Atual')
+
+# Linhas por bloco gravado em disco (limita a memória da intercalação)
+LINHAS_POR_BLOCO = 1000
+
+# Sufixo do arquivo com a posição no arquivo de origem de cada linha de um lote
+SUFIXO_POSICOES = '.posicoes'
+
+
+class DetalhesMemoria:
+    """
+    Linhas de detalhe mantidas em um DataFrame (processamento em memória)
+    """
+
+    def __init__(self, df):
+        self.df = df
+
+    def __len__(self):
+        return len(self.df)
+
+    def iterar_ordenado(self):
+        """
+        Itera as linhas (tuplas em COLUNAS_DETALHE) da maior para a menor cobertura
+        """
+        df_ordenado = self.df.sort_values('Cobertura Atual', ascending=False)
+        return df_ordenado[COLUNAS_DETALHE].itertuples(index=False, name=None)
+
+    def iterar_lotes(self):
+        """
+        As linhas como um único lote (DataFrame com COLUNAS_DETALHE, índice = posição no arquivo)
+        """
+        return iter([self.df[COLUNAS_DETALHE]])
+
+    def persistir(self, pasta):
+        """
+        Versão compacta (só as colunas de detalhe) para gravar junto do estado da análise
+        """
+        return DetalhesMemoria(self.df[COLUNAS_DETALHE].copy())
+
+    def descartar(self):
+        self.df = None
+
+
+class DetalhesOrdenados:
+    """
+    Linhas de detalhe já ordenadas por cobertura (tuplas em COLUNAS_DETALHE),
+    como as de um único fornecedor separadas de outra fonte de detalhes
+    """
+
+    def __init__(self, linhas):
+        self.linhas = linhas
+
+    def __len__(self):
+        return len(self.linhas)
+
+    def iterar_ordenado(self):
+        return iter(self.linhas)
+
+    def descartar(self):
+        self.linhas = []
+
+
+def separar_por_fornecedor(detalhes, fornecedores):
+    """
+    Linhas de detalhe de cada um dos `fornecedores` (dict fornecedor ->
+    tuplas em COLUNAS_DETALHE), mantendo a ordem por cobertura. Só as
+    linhas desses fornecedores ficam em memória; os detalhes em disco são
+    lidos em fluxo.
+    """
+    if isinstance(detalhes, DetalhesMemoria):
+        detalhes = DetalhesMemoria(detalhes.df[detalhes.df['Fornecedor'].isin(fornecedores)])
+    posicao_fornecedor = COLUNAS_DETALHE.index('Fornecedor')
+    por_fornecedor = {fornecedor: [] for fornecedor in fornecedores}
+    for linha in detalhes.iterar_ordenado():
+        linhas = por_fornecedor.get(linha[posicao_fornecedor])
+        if linhas is not None:
+            linhas.append(linha)
+    return por_fornecedor
+
+
+class DetalhesEmDisco:
+    """
+    Linhas de detalhe gravadas em disco como lotes já ordenados.
+
+    Cada lote vira um arquivo temporário ordenado por cobertura; a leitura
+    intercala os arquivos (k-way merge), mantendo em memória apenas um bloco
+    de cada lote. Ao lado de cada arquivo fica a posição de origem das
+    suas linhas, na mesma ordem.
+    """
+
+    def __init__(self, pasta=None):
+        self.pasta = pasta
+        self.arquivos = []
+        self.total_linhas = 0
+
+    def __len__(self):
+        return self.total_linhas
+
+    def adicionar_lote(self, df):
+        """
+        Ordena o lote por cobertura e grava em um arquivo temporário
+        """
+        if len(df) == 0:
+            return
+
+        df_ordenado = df.sort_values('Cobertura Atual', ascending=False)
+        linhas = list(df_ordenado[COLUNAS_DETALHE].itertuples(index=False, name=None))
+
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.detalhes', dir=self.pasta)
+        with temp_file:
+            for inicio in range(0, len(linhas), LINHAS_POR_BLOCO):
+                pickle.dump(linhas[inicio:inicio + LINHAS_POR_BLOCO], temp_file, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(temp_file.name + SUFIXO_POSICOES, 'wb') as arquivo:
+            np.save(arquivo, np.asarray(df_ordenado.index, dtype=np.int64))
+
+        self.arquivos.append(temp_file.name)
+        self.total_linhas += len(linhas)
+
+    def iterar_ordenado(self):
+        """
+        Itera as linhas de todos os lotes da maior para a menor cobertura
+        """
+        leitores = [_ler_blocos(caminho) for caminho in self.arquivos]
+        return heapq.merge(*leitores, key=itemgetter(POSICAO_COBERTURA), reverse=True)
+
+    def iterar_lotes(self):
+        """
+        Um DataFrame por lote gravado (COLUNAS_DETALHE, índice = posição no
+        arquivo), lido um de cada vez
+        """
+        for caminho in self.arquivos:
+            with open(caminho + SUFIXO_POSICOES, 'rb') as arquivo:
+                posicoes = np.load(arquivo)
+            yield pd.DataFrame(list(_ler_blocos(caminho)), columns=COLUNAS_DETALHE, index=posicoes)
+
+    def persistir(self, pasta):
+        """
+        Move os arquivos dos lotes para a pasta do estado da análise;
+        a partir daí eles pertencem ao estado e não a este objeto
+        """
+        persistido = DetalhesEmDisco(pasta)
+        for caminho in self.arquivos:
+            destino = os.path.join(pasta, os.path.basename(caminho))
+            shutil.move(caminho, destino)
+            shutil.move(caminho + SUFIXO_POSICOES, destino + SUFIXO_POSICOES)
+            persistido.arquivos.append(destino)
+        persistido.total_linhas = self.total_linhas
+        self.arquivos = []
+        return persistido
+
+    def descartar(self):
+        """
+        Remove os arquivos temporários dos lotes
+        """
+        for caminho in self.arquivos:
+            for arquivo in (caminho, caminho + SUFIXO_POSICOES):
+                if os.path.exists(arquivo):
+                    os.remove(arquivo)
+        self.arquivos = []
+
+
+def selecionar_posicoes(detalhes, posicoes):
+    """
+    Linhas de detalhe nas `posicoes` do arquivo (DataFrame com
+    COLUNAS_DETALHE, na ordem de `posicoes`); os detalhes em disco são
+    lidos lote a lote e só as linhas pedidas ficam em memória
+    """
+    posicoes = np.asarray(posicoes, dtype=np.int64)
+    partes = [lote[np.isin(np.asarray(lote.index, dtype=np.int64), posicoes)] for lote in detalhes.iterar_lotes()]
+    selecionadas = pd.concat(partes) if partes else pd.DataFrame(columns=COLUNAS_DETALHE)
+    return selecionadas.reindex(posicoes)
+
+
+def dataframe_detalhes(detalhes):
+    """
+    Linhas de detalhe (de qualquer fonte) como DataFrame com COLUNAS_DETALHE
+    """
+    if isinstance(detalhes, DetalhesMemoria):
+        return detalhes.df[COLUNAS_DETALHE]
+    return pd.DataFrame(list(detalhes.iterar_ordenado()), columns=COLUNAS_DETALHE)
+
+
+def _ler_blocos(caminho):
+    """
+    Lê sequencialmente os blocos de linhas gravados por adicionar_lote
+    """
+    with open(caminho, 'rb') as arquivo:
+        while True:
+            try:
+                bloco = pickle.load(arquivo)
+            except EOFError:
+                return
+            yield from bloco
@@ -0,0 +1,223 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+# Modos de contagem distinta
+CONTAGEM_EXATA = 'exata'
+CONTAGEM_APROXIMADA = 'aproximada'
+
+# Colunas com contagem distinta (global, por fornecedor e por filial)
+COLUNAS_DISTINTAS = {'Carga': 'total_cargas', 'Pedido': 'total_pedidos', 'Cód.': 'total_codigos'}
+
+# Bits de índice do HyperLogLog: 2^12 registradores (4 KB, erro ~1,6%)
+PRECISAO_HLL = 12
+# Até quantos hashes distintos o HyperLogLog guarda os próprios hashes
+# (contagem exata, no máximo a memória dos registradores) em vez deles
+LIMITE_ESPARSO = (1 << PRECISAO_HLL) // 8
+
+_MASCARA_32 = np.uint64(0xFFFFFFFF)
+
+
+def hash_valores(valores):
+    """
+    Hash de 64 bits estável entre processos. Números são normalizados para
+    float64, para que 1 e 1.0 (lotes com dtypes diferentes) coincidam.
+    """
+    valores = pd.Series(valores)
+    if is_numeric_dtype(valores):
+        return pd.util.hash_array(valores.to_numpy(dtype=np.float64))
+
+    # Texto: normaliza só os valores únicos e distribui os hashes pelos códigos
+    codigos, unicos = pd.factorize(valores)
+    hashes = np.zeros(len(valores), dtype=np.uint64)
+    if len(unicos):
+        hashes = _hash_misto(pd.Series(unicos, dtype=object))[np.maximum(codigos, 0)]
+    ausentes = codigos < 0
+    if ausentes.any():
+        hashes[ausentes] = pd.util.hash_array(valores[ausentes].astype(str).to_numpy(dtype=object))
+    return hashes
+
+
+def _hash_misto(valores):
+    """
+    Hash de uma Series de objetos: números como em float64, o resto como texto
+    """
+    numeros = pd.to_numeric(valores, errors='coerce')
+    e_numero = numeros.notna().to_numpy()
+    hashes = np.empty(len(valores), dtype=np.uint64)
+    hashes[e_numero] = pd.util.hash_array(numeros.to_numpy(dtype=np.float64)[e_numero])
+    hashes[~e_numero] = pd.util.hash_array(valores[~e_numero].astype(str).to_numpy(dtype=object))
+    return hashes
+
+
+_MULTIPLICADOR_HASH = np.uint64(0x100000001B3)
+
+
+def hash_linhas(df, colunas):
+    """
+    Hash de 64 bits de cada linha de um DataFrame sobre as colunas dadas,
+    com os valores normalizados como em hash_valores
+    """
+    resultado = np.zeros(len(df), dtype=np.uint64)
+    for coluna in colunas:
+        resultado = resultado * _MULTIPLICADOR_HASH ^ hash_valores(df[coluna].to_numpy())
+    return resultado
+
+
+def _comprimento_bits(valores):
+    """
+    bit_length vetorizado para uint64 (cada metade de 32 bits é exata em float64)
+    """
+    alto = (valores >> np.uint64(32)).astype(np.float64)
+    baixo = (valores & _MASCARA_32).astype(np.float64)
+    return np.where(alto > 0, 32 + np.frexp(alto)[1], np.frexp(baixo)[1])
+
+
+def _indices_e_postos(hashes, precisao):
+    """
+    Registrador (primeiros bits) e posto (zeros à esquerda + 1) de cada hash
+    """
+    indices = (hashes >> np.uint64(64 - precisao)).astype(np.int64)
+    restante = hashes << np.uint64(precisao)
+    postos = np.minimum(64 - _comprimento_bits(restante) + 1, 64 - precisao + 1)
+    return indices, postos.astype(np.uint8)
+
+
+class ContagemExata:
+    """
+    Contagem distinta exata (conjunto de valores)
+    """
+
+    def __init__(self, valores=()):
+        self.valores = set(valores)
+
+    def mesclar(self, outro):
+        self.valores |= outro.valores
+        return self
+
+    def estimar(self):
+        return len(self.valores)
+
+    def renomear(self, rotulos):
+        self.valores = {rotulos[int(v)] for v in self.valores}
+
+
+class HyperLogLog:
+    """
+    Contagem distinta aproximada com memória fixa (2^precisao registradores).
+    Registradores de lotes e processos diferentes são combinados pelo máximo.
+
+    Esparso enquanto pequeno: até LIMITE_ESPARSO valores guarda os hashes
+    distintos (ordenados) e conta exato; passa para os registradores só
+    quando a união cresce além disso.
+    """
+
+    # Estados gravados antes da representação esparsa têm só registradores
+    hashes = None
+
+    def __init__(self, precisao=PRECISAO_HLL, registradores=None, hashes=None):
+        self.precisao = precisao
+        if registradores is None and hashes is None:
+            hashes = np.empty(0, dtype=np.uint64)
+        self.registradores = registradores
+        self.hashes = hashes
+
+    @classmethod
+    def de_hashes(cls, hashes, precisao=PRECISAO_HLL):
+        """
+        Contador dos hashes (uint64) dados, esparso se couberem no limite
+        """
+        hll = cls(precisao, hashes=np.unique(hashes))
+        hll._limitar()
+        return hll
+
+    def _limitar(self):
+        if self.hashes is not None and len(self.hashes) > LIMITE_ESPARSO:
+            self._adensar()
+
+    def _adensar(self):
+        """
+        Passa os hashes guardados para os registradores
+        """
+        self.registradores = np.zeros(1 << self.precisao, dtype=np.uint8)
+        if len(self.hashes):
+            indices, postos = _indices_e_postos(self.hashes, self.precisao)
+            np.maximum.at(self.registradores, indices, postos)
+        self.hashes = None
+
+    def mesclar(self, outro):
+        if self.hashes is not None and outro.hashes is not None:
+            self.hashes = np.union1d(self.hashes, outro.hashes)
+            self._limitar()
+            return self
+        if self.hashes is not None:
+            self._adensar()
+        if outro.hashes is not None:
+            outro = HyperLogLog(self.precisao, hashes=outro.hashes)
+            outro._adensar()
+        np.maximum(self.registradores, outro.registradores, out=self.registradores)
+        return self
+
+    def estimar(self):
+        if self.hashes is not None:
+            return len(self.hashes)
+        m = len(self.registradores)
+        alfa = 0.7213 / (1 + 1.079 / m)
+        estimativa = alfa * m * m / np.sum(np.ldexp(1.0, -self.registradores.astype(np.int64)))
+        vazios = int(np.count_nonzero(self.registradores == 0))
+        if estimativa <= 2.5 * m and vazios > 0:
+            # Correção para cardinalidades pequenas (contagem linear)
+            estimativa = m * np.log(m / vazios)
+        return int(round(estimativa))
+
+    def renomear(self, rotulos):
+        # Os hashes já vêm dos valores originais; nada a trocar
+        pass
+
+
+def contador_total(coluna, modo):
+    """
+    Contador distinto de uma coluna codificada (ColunaCodificada) inteira
+    """
+    codigos = np.unique(coluna.codigos[coluna.codigos >= 0])
+    if modo == CONTAGEM_EXATA:
+        return ContagemExata(coluna.rotular(codigos))
+
+    return HyperLogLog.de_hashes(coluna.hashes_rotulos()[codigos])
+
+
+def contadores_por_grupo(linhas, grupos, coluna, modo):
+    """
+    Um contador distinto por grupo; retorna dict grupo -> contador.
+    `linhas` traz o índice (em `grupos`) do grupo de cada linha. Os pares
+    grupo x valor são deduplicados antes; no modo aproximado cada grupo
+    começa esparso (os próprios hashes) e só os que passam de LIMITE_ESPARSO
+    valores ganham registradores.
+    """
+    presentes = coluna.codigos >= 0
+    total_valores = max(coluna.cardinalidade, 1)
+    pares = np.unique(linhas[presentes] * total_valores + coluna.codigos[presentes])
+    indices_grupo, codigos = pares // total_valores, pares % total_valores
+
+    limites = np.flatnonzero(np.diff(indices_grupo)) + 1
+    inicios = np.concatenate([[0], limites]).astype(np.int64)
+    fins = np.concatenate([limites, [len(pares)]]).astype(np.int64)
+    if modo == CONTAGEM_EXATA:
+        return {grupos[indices_grupo[inicio]]: ContagemExata(coluna.rotular(codigos[inicio:fim]))
+                for inicio, fim in zip(inicios, fins) if fim > inicio}
+
+    hashes = coluna.hashes_rotulos()[codigos]
+    return {grupos[indices_grupo[inicio]]: HyperLogLog.de_hashes(hashes[inicio:fim])
+            for inicio, fim in zip(inicios, fins) if fim > inicio}
+
+
+def mesclar_contadores(destino, origem):
+    """
+    Mescla um dict chave -> contador em outro (in-place)
+    """
+    for chave, contador in origem.items():
+        if chave in destino:
+            destino[chave].mesclar(contador)
+        else:
+            destino[chave] = contador
+    return destino
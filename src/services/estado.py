@@ -0,0 +1,140 @@
+import os
+import time
+import pickle
+import shutil
+import tempfile
+import numpy as np
+
+# Pasta com o estado compacto (agregados + linhas de detalhe) de cada análise,
+# usado para gerar planilhas sob demanda
+PASTA_ESTADOS = os.environ.get(
+    'ANALISE_PASTA_ESTADOS', os.path.join(tempfile.gettempdir(), 'analise_estados')
+)
+
+ARQUIVO_ESTADO = 'estado.pkl'
+ARQUIVO_EXTRAS = 'extras.pkl'
+# Assinaturas das linhas (hash da chave e do conteúdo), para a análise incremental
+ARQUIVO_ASSINATURAS = 'assinaturas.npy'
+
+# Por quanto tempo (segundos) o estado fica guardado depois do último uso,
+# e quantos estados no máximo (acima disso saem os usados há mais tempo)
+VALIDADE_ESTADO = int(os.environ.get('ANALISE_VALIDADE_ESTADO', 7 * 24 * 3600))
+MAXIMO_ESTADOS = int(os.environ.get('ANALISE_MAXIMO_ESTADOS', 200))
+
+
+def _pasta(nome):
+    return os.path.join(PASTA_ESTADOS, os.path.basename(nome))
+
+
+def existe_estado(nome):
+    return os.path.exists(os.path.join(_pasta(nome), ARQUIVO_ESTADO))
+
+
+def _gravar(pasta, nome_arquivo, conteudo):
+    temporario = os.path.join(pasta, f"{nome_arquivo}.tmp")
+    with open(temporario, 'wb') as arquivo:
+        pickle.dump(conteudo, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporario, os.path.join(pasta, nome_arquivo))
+
+
+def salvar_estado(nome, agregados, detalhes, extras=None, assinaturas=None):
+    """
+    Grava os agregados e as linhas de detalhe da análise; os detalhes em
+    disco são movidos para a pasta do estado. Os `extras` (alterações,
+    conciliação) e as `assinaturas` das linhas ficam em arquivos separados,
+    lidos só para as abas opcionais e para a análise incremental.
+    """
+    pasta = _pasta(nome)
+    os.makedirs(pasta, exist_ok=True)
+    if extras:
+        _gravar(pasta, ARQUIVO_EXTRAS, extras)
+    if assinaturas is not None:
+        temporario = os.path.join(pasta, f"{ARQUIVO_ASSINATURAS}.tmp")
+        with open(temporario, 'wb') as arquivo:
+            np.save(arquivo, assinaturas)
+        os.replace(temporario, os.path.join(pasta, ARQUIVO_ASSINATURAS))
+    _gravar(pasta, ARQUIVO_ESTADO, {'agregados': agregados, 'detalhes': detalhes.persistir(pasta)})
+    remover_expirados()
+
+
+def arquivo_estado(nome):
+    """
+    Caminho do arquivo com o estado de uma análise (para processos filhos,
+    que não veem a pasta configurada no processo principal)
+    """
+    return os.path.join(_pasta(nome), ARQUIVO_ESTADO)
+
+
+def ler_estado(caminho):
+    """
+    Retorna (agregados, detalhes) do arquivo de estado em `caminho`
+    """
+    with open(caminho, 'rb') as arquivo:
+        estado = pickle.load(arquivo)
+    return estado['agregados'], estado['detalhes']
+
+
+def carregar_estado(nome):
+    """
+    Retorna (agregados, detalhes) de uma análise salva e marca o uso
+    """
+    caminho = arquivo_estado(nome)
+    estado = ler_estado(caminho)
+    os.utime(caminho)
+    return estado
+
+
+def carregar_extras(nome):
+    """
+    Retorna os extras de uma análise salva (dict vazio se não houver)
+    """
+    caminho = os.path.join(_pasta(nome), ARQUIVO_EXTRAS)
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, 'rb') as arquivo:
+        return pickle.load(arquivo)
+
+
+def carregar_assinaturas(nome):
+    """
+    Retorna as assinaturas das linhas de uma análise salva (None se o
+    estado foi gravado sem elas)
+    """
+    caminho = os.path.join(_pasta(nome), ARQUIVO_ASSINATURAS)
+    if not os.path.exists(caminho):
+        return None
+    return np.load(caminho)
+
+
+def remover_estado(nome):
+    shutil.rmtree(_pasta(nome), ignore_errors=True)
+
+
+def _ultimo_uso(pasta):
+    """
+    Data do último uso de um estado (gravação ou leitura); a da pasta se o
+    estado não chegou a ser gravado
+    """
+    caminho = os.path.join(pasta, ARQUIVO_ESTADO)
+    return os.path.getmtime(caminho if os.path.exists(caminho) else pasta)
+
+
+def remover_expirados(validade=VALIDADE_ESTADO, maximo=MAXIMO_ESTADOS):
+    """
+    Apaga os estados sem uso há mais de `validade` segundos e, se ainda
+    sobrarem mais de `maximo`, os usados há mais tempo
+    """
+    if not os.path.isdir(PASTA_ESTADOS):
+        return
+    agora = time.time()
+    estados = []
+    for nome in os.listdir(PASTA_ESTADOS):
+        try:
+            estados.append((_ultimo_uso(os.path.join(PASTA_ESTADOS, nome)), nome))
+        except OSError:
+            pass
+
+    estados.sort(reverse=True)
+    for posicao, (ultimo_uso, nome) in enumerate(estados):
+        if posicao >= maximo or agora - ultimo_uso > validade:
+            remover_estado(nome)
@@ -0,0 +1,174 @@
+from datetime import datetime, timedelta
+import pandas as pd
+from flask import current_app
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from src.models.user import db
+from src.models.analise import Analise, MetricaFornecedor, MetricaFilial, MetricaFaixaValor
+from src.services.agregados import FAIXAS_VALOR
+from src.services.regras import aplicar_regras
+
+# Colunas das tabelas de agregados gravadas em cada modelo
+COLUNAS_COBERTURA = ['itens', 'soma_cobertura', 'valor', 'cobertura_media', 'recomendacao']
+COLUNAS_FAIXAS_COBERTURA = COLUNAS_COBERTURA + ['ate_44', 'entre_45_70', 'acima_71', 'p50', 'p90', 'p99']
+COLUNAS_FORNECEDOR = COLUNAS_FAIXAS_COBERTURA + ['total_cargas', 'total_pedidos', 'total_codigos', 'filiais']
+
+# Grupos consultáveis nas tendências e período padrão das séries (dias)
+GRUPOS_HISTORICO = {'fornecedor': MetricaFornecedor, 'filial': MetricaFilial}
+DIAS_TENDENCIA = 90
+
+# Indicadores das séries e da comparação entre análises
+INDICADORES = ['itens', 'cobertura_media', 'perc_acima_71', 'valor']
+
+
+def _linhas(tabela, coluna_grupo, colunas, analise_id, data):
+    """
+    Linhas para inserção em massa: uma por grupo da tabela de agregados
+    """
+    linhas = tabela.reset_index().rename(columns={tabela.index.name: coluna_grupo})
+    linhas = linhas[[coluna_grupo] + colunas].assign(analise_id=analise_id, data=data)
+    return linhas.to_dict('records')
+
+
+def registrar_analise(nome, agregados, modo=None, data=None):
+    """
+    Grava a análise e suas métricas por fornecedor, filial e faixa de valor
+    em uma única transação. Falhas do banco são registradas no log e não
+    interrompem a análise; retorna a Analise gravada ou None. Violação de
+    integridade (nome repetido) é erro de quem chamou e é levantada.
+    """
+    data = data or datetime.now()
+    metricas = agregados.metricas_gerais()
+    try:
+        analise = Analise(
+            nome=nome, data=data, modo=modo,
+            total_itens=metricas['total_itens'],
+            total_fornecedores=metricas['total_fornecedores'],
+            total_filiais=metricas['total_filiais'],
+            valor_total=metricas['valor_total'],
+            cobertura_media=metricas['cobertura_media']
+        )
+        db.session.add(analise)
+        db.session.flush()
+
+        fornecedores = aplicar_regras('fornecedores', agregados.tabela_fornecedores())
+        filiais = aplicar_regras('filiais', agregados.tabela_filiais())
+        faixas = aplicar_regras('faixas_valor', agregados.tabela_faixas_valor())
+        faixas['nome_faixa'] = [FAIXAS_VALOR[indice]['nome'] for indice in faixas.index]
+
+        db.session.execute(
+            insert(MetricaFornecedor),
+            _linhas(fornecedores, 'fornecedor', COLUNAS_FORNECEDOR, analise.id, data)
+        )
+        db.session.execute(
+            insert(MetricaFilial),
+            _linhas(filiais, 'filial', COLUNAS_FAIXAS_COBERTURA, analise.id, data)
+        )
+        db.session.execute(
+            insert(MetricaFaixaValor),
+            _linhas(faixas, 'faixa', COLUNAS_COBERTURA + ['nome_faixa'], analise.id, data)
+        )
+        db.session.commit()
+        return analise
+    except IntegrityError:
+        db.session.rollback()
+        raise
+    except SQLAlchemyError:
+        db.session.rollback()
+        current_app.logger.exception("Falha ao gravar o histórico da análise %s", nome)
+        return None
+
+
+def analises_recentes(limite=20):
+    """
+    Últimas análises gravadas, da mais recente para a mais antiga
+    """
+    return Analise.query.order_by(Analise.data.desc()).limit(limite).all()
+
+
+def _metricas(grupo, *filtros):
+    """
+    Métricas gravadas de um grupo (fornecedor ou filial) com a análise de
+    origem, filtradas no banco pelos índices por grupo e data
+    """
+    modelo = GRUPOS_HISTORICO[grupo]
+    consulta = (
+        select(
+            getattr(modelo, grupo).label('grupo'), modelo.data, Analise.nome.label('analise'),
+            modelo.itens, modelo.soma_cobertura, modelo.valor, modelo.acima_71
+        )
+        .join(Analise, Analise.id == modelo.analise_id)
+        .where(*filtros)
+    )
+    tabela = pd.read_sql(consulta, db.session.connection())
+    tabela['cobertura_media'] = tabela['soma_cobertura'] / tabela['itens']
+    tabela['perc_acima_71'] = tabela['acima_71'] / tabela['itens'] * 100
+    return tabela
+
+
+def _registros(tabela):
+    # NaN (grupo ausente em uma das análises) vira null no JSON
+    return tabela.astype(object).where(tabela.notna(), None).to_dict('records')
+
+
+def serie_tendencia(grupo, nome=None, dias=DIAS_TENDENCIA):
+    """
+    Série por análise da cobertura média, % acima de 71 dias e saldo (valor)
+    de cada fornecedor ou filial nos últimos `dias`; `nome` restringe a um grupo
+    """
+    modelo = GRUPOS_HISTORICO[grupo]
+    filtros = [modelo.data >= datetime.now() - timedelta(days=dias)]
+    if nome:
+        filtros.append(getattr(modelo, grupo) == nome)
+
+    tabela = _metricas(grupo, *filtros).sort_values(['grupo', 'data'])
+    tabela['data'] = tabela['data'].dt.strftime('%Y-%m-%dT%H:%M:%S')
+    colunas = ['data', 'analise'] + INDICADORES
+    return {
+        'grupo': grupo,
+        'dias': dias,
+        'series': {
+            nome_grupo: _registros(pontos[colunas]) for nome_grupo, pontos in tabela.groupby('grupo', sort=False)
+        }
+    }
+
+
+def comparar_analises(grupo, nome_a, nome_b):
+    """
+    Diferença dos indicadores de cada fornecedor ou filial entre duas
+    análises gravadas (b menos a), por merge das tabelas de métricas.
+    Retorna (comparação, None) ou (None, mensagem) se alguma análise não existir.
+    """
+    analises = {
+        analise.nome: analise for analise in Analise.query.filter(Analise.nome.in_([nome_a, nome_b]))
+    }
+    for nome in (nome_a, nome_b):
+        if nome not in analises:
+            return None, f"Análise não encontrada: {nome}"
+    analise_a, analise_b = analises[nome_a], analises[nome_b]
+
+    modelo = GRUPOS_HISTORICO[grupo]
+    colunas = ['grupo'] + INDICADORES
+    tabela_a = _metricas(grupo, modelo.analise_id == analise_a.id)[colunas]
+    tabela_b = _metricas(grupo, modelo.analise_id == analise_b.id)[colunas]
+
+    comparacao = tabela_a.merge(tabela_b, on='grupo', how='outer', suffixes=('_a', '_b'), indicator='situacao')
+    comparacao['situacao'] = comparacao['situacao'].map({'left_only': 'removido', 'right_only': 'novo', 'both': 'mantido'})
+    for coluna in ('itens', 'valor'):
+        comparacao[f'delta_{coluna}'] = comparacao[f'{coluna}_b'].fillna(0) - comparacao[f'{coluna}_a'].fillna(0)
+    for coluna in ('cobertura_media', 'perc_acima_71'):
+        comparacao[f'delta_{coluna}'] = comparacao[f'{coluna}_b'] - comparacao[f'{coluna}_a']
+    comparacao = comparacao.sort_values('delta_valor', key=abs, ascending=False).rename(columns={'grupo': grupo})
+
+    geral = {
+        'delta_itens': analise_b.total_itens - analise_a.total_itens,
+        'delta_valor': analise_b.valor_total - analise_a.valor_total,
+        'delta_cobertura_media': analise_b.cobertura_media - analise_a.cobertura_media,
+    }
+    return {
+        'grupo': grupo,
+        'analise_a': analise_a.to_dict(),
+        'analise_b': analise_b.to_dict(),
+        'geral': geral,
+        'grupos': _registros(comparacao)
+    }, None
@@ -0,0 +1,309 @@
+import os
+import zipfile
+import importlib.util
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+ABA_AGENDA = 'Agenda Recebimento'
+STATUS_APROVACAO = 'Em Aprovação'
+
+# Colunas que a análise usa; a verificação prévia recusa arquivos sem alguma delas
+COLUNAS_AGENDA = [
+    'Status', 'Carga', 'Pedido', 'Fornecedor', 'Filial', 'Cód.', 'Mercadoria',
+    'Quantidade<br />Entrega', 'Saldo Pedido', 'Cobertura Atual', 'Nota Fiscal'
+]
+
+# Quantidade de linhas lidas por lote no modo em lotes
+TAMANHO_LOTE_PADRAO = int(os.environ.get('ANALISE_TAMANHO_LOTE', 50000))
+
+# Agenda exportada pelo ERP em CSV (';', vírgula decimal e ponto de milhar) ou Parquet
+EXTENSAO_CSV = '.csv'
+EXTENSAO_PARQUET = '.parquet'
+SEPARADOR_CSV = ';'
+CODIFICACAO_CSV = os.environ.get('ANALISE_CODIFICACAO_CSV', 'utf-8-sig')
+
+# Colunas numéricas da agenda (convertidas com errors='coerce': célula inválida vira vazio)
+COLUNAS_NUMERICAS = ['Cobertura Atual', 'Saldo Pedido', 'Quantidade<br />Entrega']
+
+# Códigos da agenda: texto só com dígitos vira inteiro (normalizar_codigos)
+COLUNAS_CODIGO = ['Carga', 'Pedido', 'Cód.', 'Nota Fiscal']
+PADRAO_INTEIRO = r'\s*-?\d+\s*'
+
+# Tipos explícitos no CSV: texto e as colunas numéricas também como texto,
+# convertidas depois (uma célula como 'N/D' não derruba a leitura). As
+# chaves Carga, Pedido, Cód. e Nota Fiscal são inferidas, como no Excel.
+TIPOS_CSV = {coluna: str for coluna in ['Status', 'Fornecedor', 'Filial', 'Mercadoria'] + COLUNAS_NUMERICAS}
+
+# Parquet depende do pyarrow (opcional, como o polars)
+PARQUET_DISPONIVEL = importlib.util.find_spec('pyarrow') is not None
+
+# Formatos lidos em fluxo (.xlsx em modo somente leitura, CSV em blocos,
+# Parquet em lotes de registros): têm verificação prévia e modo em lotes
+EXTENSOES_EM_FLUXO = ('.xlsx', EXTENSAO_CSV, EXTENSAO_PARQUET)
+
+
+class AgendaInvalida(ValueError):
+    """
+    Arquivo recusado na verificação prévia (aba ou colunas ausentes)
+    """
+
+
+def extensao_arquivo(filepath):
+    return os.path.splitext(filepath.lower())[1]
+
+
+def _verificar_colunas(colunas, origem):
+    ausentes = [coluna for coluna in COLUNAS_AGENDA if coluna not in colunas]
+    if ausentes:
+        raise AgendaInvalida(f"Colunas obrigatórias ausentes {origem}: {', '.join(ausentes)}")
+
+
+def _pyarrow_parquet():
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise AgendaInvalida("Leitura de Parquet indisponível: instale o pacote pyarrow")
+    return pq
+
+
+def verificar_agenda(filepath):
+    """
+    Verificação prévia de um .xlsx sem ler os dados: abre em modo somente
+    leitura e consulta apenas a lista de abas, o cabeçalho e a dimensão
+    declarada da aba da agenda. No CSV lê só o cabeçalho; no Parquet, o
+    esquema e a quantidade de linhas dos metadados.
+    Retorna {'linhas': n ou None, 'colunas': n}.
+    """
+    extensao = extensao_arquivo(filepath)
+    if extensao == EXTENSAO_CSV:
+        return _verificar_csv(filepath)
+    if extensao == EXTENSAO_PARQUET:
+        return _verificar_parquet(filepath)
+
+    try:
+        wb = load_workbook(filepath, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError, OSError):
+        raise AgendaInvalida("Arquivo não é uma planilha .xlsx válida")
+
+    try:
+        if ABA_AGENDA not in wb.sheetnames:
+            raise AgendaInvalida(
+                f"Aba '{ABA_AGENDA}' não encontrada. Abas do arquivo: {', '.join(wb.sheetnames)}"
+            )
+
+        ws = wb[ABA_AGENDA]
+        cabecalho = next(ws.iter_rows(max_row=1, values_only=True), ())
+        _verificar_colunas(cabecalho, f"na aba '{ABA_AGENDA}'")
+
+        # Dimensão declarada no XML da aba (ausente em alguns geradores de planilha)
+        linhas = ws.max_row - 1 if ws.max_row else None
+        return {'linhas': linhas, 'colunas': len(cabecalho)}
+    finally:
+        wb.close()
+
+
+def _verificar_csv(filepath):
+    try:
+        cabecalho = ler_csv(filepath, usecols=None, nrows=0).columns
+    except UnicodeDecodeError:
+        raise AgendaInvalida(f"Arquivo CSV não está na codificação {CODIFICACAO_CSV}")
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, OSError):
+        raise AgendaInvalida("Arquivo não é um CSV válido")
+    _verificar_colunas(cabecalho, "no CSV")
+    return {'linhas': None, 'colunas': len(cabecalho)}
+
+
+def _verificar_parquet(filepath):
+    pq = _pyarrow_parquet()
+    try:
+        arquivo = pq.ParquetFile(filepath)
+    except (OSError, ValueError):
+        raise AgendaInvalida("Arquivo não é um Parquet válido")
+    with arquivo:
+        _verificar_colunas(arquivo.schema_arrow.names, "no Parquet")
+        return {'linhas': arquivo.metadata.num_rows, 'colunas': len(arquivo.schema_arrow.names)}
+
+
+def ler_agenda(filepath):
+    """
+    Lê a agenda inteira em um único DataFrame (aba da planilha, CSV ou Parquet)
+    """
+    extensao = extensao_arquivo(filepath)
+    if extensao == EXTENSAO_CSV:
+        return _converter_numeros(ler_csv(filepath))
+    if extensao == EXTENSAO_PARQUET:
+        return ler_parquet(filepath)
+    return pd.read_excel(filepath, sheet_name=ABA_AGENDA)
+
+
+def ler_csv(filepath, usecols=COLUNAS_AGENDA, **opcoes):
+    """
+    Lê o CSV do ERP com o parser em C, só as colunas usadas e tipos
+    explícitos (colunas numéricas ainda como texto); com `chunksize`
+    retorna um leitor em blocos
+    """
+    return pd.read_csv(
+        filepath, sep=SEPARADOR_CSV, decimal=',', encoding=CODIFICACAO_CSV,
+        usecols=usecols, dtype=TIPOS_CSV, **opcoes
+    )
+
+
+def numero_csv(serie):
+    """
+    Converte texto com vírgula decimal e ponto de milhar ('1.234,56') em
+    float; o que não for número fica vazio, como no pd.to_numeric
+    """
+    texto = serie.str.strip().str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    return pd.to_numeric(texto, errors='coerce')
+
+
+def _converter_numeros(df):
+    for coluna in COLUNAS_NUMERICAS:
+        df[coluna] = numero_csv(df[coluna])
+    return df
+
+
+def ler_parquet(filepath):
+    """
+    Lê do Parquet só as colunas usadas e só as linhas "Em Aprovação"
+    (filtro aplicado na leitura, pulando os grupos de linhas sem esse
+    status). O índice é a posição da linha no arquivo, tirada da coluna
+    Status lida antes, sozinha.
+    """
+    pq = _pyarrow_parquet()
+    import pyarrow.compute as pc
+
+    status = pq.read_table(filepath, columns=['Status']).column('Status')
+    posicoes = np.flatnonzero(pc.fill_null(pc.equal(status, STATUS_APROVACAO), False).to_numpy())
+
+    df = pd.read_parquet(filepath, columns=COLUNAS_AGENDA, filters=[('Status', '==', STATUS_APROVACAO)])
+    df.index = posicoes
+    return df
+
+
+def ler_agenda_em_lotes(filepath, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """
+    Lê a agenda em lotes de tamanho fixo (openpyxl em modo somente leitura,
+    CSV em blocos do parser ou Parquet em lotes de registros).
+    Cada lote mantém como índice a posição da linha no arquivo.
+    """
+    extensao = extensao_arquivo(filepath)
+    if extensao == EXTENSAO_CSV:
+        with ler_csv(filepath, chunksize=tamanho_lote) as leitor:
+            for bloco in leitor:
+                yield _converter_numeros(bloco)
+        return
+    if extensao == EXTENSAO_PARQUET:
+        yield from _ler_parquet_em_lotes(filepath, tamanho_lote)
+        return
+
+    wb = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        ws = wb[ABA_AGENDA]
+        linhas = ws.iter_rows(values_only=True)
+        cabecalho = _normalizar_cabecalho(next(linhas, ()))
+        largura = len(cabecalho)
+
+        inicio = 0
+        lote = []
+        for linha in linhas:
+            if len(linha) != largura:
+                linha = tuple(linha[:largura]) + (None,) * (largura - len(linha))
+            lote.append(linha)
+            if len(lote) >= tamanho_lote:
+                yield _montar_lote(lote, cabecalho, inicio)
+                inicio += len(lote)
+                lote = []
+
+        if lote:
+            yield _montar_lote(lote, cabecalho, inicio)
+    finally:
+        wb.close()
+
+
+def _ler_parquet_em_lotes(filepath, tamanho_lote):
+    pq = _pyarrow_parquet()
+    with pq.ParquetFile(filepath) as arquivo:
+        inicio = 0
+        for registros in arquivo.iter_batches(batch_size=tamanho_lote, columns=COLUNAS_AGENDA):
+            lote = registros.to_pandas()
+            lote.index = pd.RangeIndex(inicio, inicio + len(lote))
+            inicio += len(lote)
+            yield lote
+
+
+def _normalizar_cabecalho(cabecalho):
+    """
+    Nomeia colunas sem título como o pandas faz ("Unnamed: n")
+    """
+    return [valor if valor is not None else f"Unnamed: {i}" for i, valor in enumerate(cabecalho)]
+
+
+def _montar_lote(linhas, cabecalho, inicio):
+    df = pd.DataFrame(linhas, columns=cabecalho)
+    df.index = pd.RangeIndex(inicio, inicio + len(df))
+    return df
+
+
+def filtrar_aprovacao(df):
+    """
+    Mantém apenas registros "Em Aprovação" e converte as colunas numéricas
+    """
+    df_aprovacao = df[df['Status'] == STATUS_APROVACAO].copy()
+
+    df_aprovacao['Cobertura Atual'] = pd.to_numeric(df_aprovacao['Cobertura Atual'], errors='coerce')
+    df_aprovacao['Saldo Pedido'] = pd.to_numeric(df_aprovacao['Saldo Pedido'], errors='coerce')
+    df_aprovacao['Quantidade<br />Entrega'] = pd.to_numeric(df_aprovacao['Quantidade<br />Entrega'], errors='coerce')
+
+    return normalizar_codigos(df_aprovacao)
+
+
+def normalizar_codigos(df):
+    """
+    Carga, Pedido, Cód. e Nota Fiscal com os mesmos valores em todos os
+    backends e lotes: texto só com dígitos vira inteiro (como no read_excel
+    do pandas) e a coluna fica numérica quando não sobra texto
+    """
+    for coluna in COLUNAS_CODIGO:
+        serie = df[coluna]
+        if serie.dtype != object:
+            continue
+        # Normaliza só os valores únicos e distribui pelos códigos
+        codigos, unicos = pd.factorize(serie)
+        unicos = np.asarray(unicos, dtype=object).copy()
+        e_texto = np.fromiter((isinstance(valor, str) for valor in unicos), dtype=bool, count=len(unicos))
+        posicoes = np.flatnonzero(e_texto)
+        if len(posicoes):
+            inteiros = pd.Series(unicos[posicoes]).str.fullmatch(PADRAO_INTEIRO).to_numpy()
+            posicoes = posicoes[inteiros]
+            unicos[posicoes] = [int(valor) for valor in unicos[posicoes]]
+            e_texto[posicoes] = False
+        valores = np.append(unicos, None)[codigos]
+        serie = pd.Series(valores, index=serie.index)
+        df[coluna] = serie if e_texto.any() else pd.to_numeric(serie)
+    return df
+
+
+def _linhas_validas(df_aprovacao):
+    return (
+        df_aprovacao['Cobertura Atual'].notna() &
+        df_aprovacao['Fornecedor'].notna() &
+        df_aprovacao['Filial'].notna() &
+        df_aprovacao['Mercadoria'].notna()
+    )
+
+
+def limpar_agenda(df_aprovacao):
+    """
+    Remove registros sem cobertura, fornecedor, filial ou mercadoria
+    """
+    return df_aprovacao[_linhas_validas(df_aprovacao)].copy()
+
+
+def linhas_descartadas(df_aprovacao):
+    """
+    Registros removidos por limpar_agenda (para o relatório de qualidade)
+    """
+    return df_aprovacao[~_linhas_validas(df_aprovacao)]
@@ -0,0 +1,262 @@
+from openpyxl.styles import PatternFill, Font, Alignment
+from openpyxl.utils import get_column_letter
+from src.services.planilha import Estilo
+from src.services.regras import APROVAR, REVISAR, REJEITAR
+from src.services.delta import INCLUIDA, REMOVIDA, ALTERADA
+from src.services.conciliacao import SEM_LISTAGEM, SEM_AGENDA, QUANTIDADE_DIVERGENTE, NOTA_DIVERGENTE
+from src.services.qualidade import DUPLICADA, CHAVE_REPETIDA, OUTLIER_COBERTURA, OUTLIER_SALDO, DESCARTADA
+
+# Estilos do relatório, montados uma vez na importação e compartilhados
+# por todas as planilhas geradas pelo processo
+
+
+def _preenchimento(cor):
+    return PatternFill(start_color=cor, end_color=cor, fill_type="solid")
+
+
+ESQUERDA = Alignment(horizontal="left", vertical="center")
+CENTRO = Alignment(horizontal="center", vertical="center")
+FONTE_BANNER = Font(bold=True, size=16, color="FFFFFF")
+FONTE_CABECALHO = Font(bold=True, color="FFFFFF")
+FONTE_SECAO = Font(bold=True, size=12)
+FONTE_NEGRITO = Font(bold=True)
+
+ESTILO_TEXTO = Estilo(alignment=ESQUERDA)
+ESTILO_TITULO_RESUMO = Estilo(FONTE_BANNER, _preenchimento("366092"), ESQUERDA)
+ESTILO_SECAO_RESUMO = Estilo(FONTE_SECAO, _preenchimento("D9E1F2"), ESQUERDA)
+ESTILO_SECAO_FILIAL = Estilo(FONTE_SECAO, _preenchimento("D9E1F2"))
+ESTILO_SECAO_FAIXA = Estilo(FONTE_SECAO, _preenchimento("F8C471"))
+ESTILO_SUBCABECALHO = Estilo(FONTE_NEGRITO, _preenchimento("F2F2F2"))
+ESTILO_TOTAL = Estilo(FONTE_NEGRITO, _preenchimento("D5DBDB"))
+
+# Cores das linhas de dados pela recomendação: forte nas tabelas principais,
+# clara nos detalhamentos (que não destacam os aprovados)
+CORES_RECOMENDACAO = {APROVAR: "E6F3E6", REVISAR: "FFF2CC", REJEITAR: "FFD6D6"}
+CORES_RECOMENDACAO_DETALHAMENTO = {REVISAR: "FFF9E6", REJEITAR: "FFE6E6"}
+
+
+def _por_recomendacao(cores, font=None, alignment=None):
+    estilos = {decisao: None for decisao in CORES_RECOMENDACAO}
+    estilos.update({decisao: Estilo(font, _preenchimento(cor), alignment) for decisao, cor in cores.items()})
+    return estilos
+
+
+ESTILOS_RECOMENDACAO = _por_recomendacao(CORES_RECOMENDACAO)
+ESTILOS_RECOMENDACAO_CENTRO = _por_recomendacao(CORES_RECOMENDACAO, alignment=CENTRO)
+ESTILOS_RECOMENDACAO_ESQUERDA = _por_recomendacao(CORES_RECOMENDACAO, alignment=ESQUERDA)
+ESTILOS_RECOMENDACAO_DESTAQUE = _por_recomendacao(CORES_RECOMENDACAO, FONTE_NEGRITO, ESQUERDA)
+ESTILOS_RECOMENDACAO_DETALHAMENTO = _por_recomendacao(CORES_RECOMENDACAO_DETALHAMENTO)
+
+# Linhas da aba de alterações pela situação da linha
+ESTILOS_SITUACAO = {
+    situacao: Estilo(fill=_preenchimento(cor), alignment=ESQUERDA)
+    for situacao, cor in {INCLUIDA: "E6F3E6", ALTERADA: "FFF2CC", REMOVIDA: "FFD6D6"}.items()
+}
+ESTILOS_CONCILIACAO = {
+    situacao: Estilo(fill=_preenchimento(cor), alignment=ESQUERDA)
+    for situacao, cor in {SEM_LISTAGEM: "FFD6D6", SEM_AGENDA: "FFD6D6",
+                          QUANTIDADE_DIVERGENTE: "FFF2CC", NOTA_DIVERGENTE: "FFF2CC"}.items()
+}
+ESTILOS_QUALIDADE = {
+    tipo: Estilo(fill=_preenchimento(cor), alignment=ESQUERDA)
+    for tipo, cor in {DUPLICADA: "FFD6D6", CHAVE_REPETIDA: "FFF2CC", OUTLIER_COBERTURA: "DDEBF7",
+                      OUTLIER_SALDO: "DDEBF7", DESCARTADA: "EDEDED"}.items()
+}
+
+
+class ModeloAba:
+    """
+    Layout fixo de uma aba: nome, larguras, faixa de título mesclada e
+    linha de cabeçalhos. A geração só acrescenta as linhas de dados a
+    partir de `primeira_linha`.
+    """
+
+    def __init__(self, titulo, larguras, cabecalhos=(), cor_cabecalho=None, banner=None, cor_banner=None):
+        self.titulo = titulo
+        self.larguras = larguras
+        self.cabecalhos = cabecalhos
+        self.estilo_cabecalho = Estilo(FONTE_CABECALHO, _preenchimento(cor_cabecalho), CENTRO) if cabecalhos else None
+        self.banner = banner
+        self.estilo_banner = Estilo(FONTE_BANNER, _preenchimento(cor_banner)) if banner else None
+        self.linha_cabecalho = 3 if banner else 1
+        self.linhas_cabecalho = self.linha_cabecalho if cabecalhos else 0
+        self.primeira_linha = self.linha_cabecalho + 1 if cabecalhos else 1
+
+    def abrir(self, wb):
+        """
+        Cria a aba no escritor já com o título e os cabeçalhos
+        """
+        ws = wb.criar_aba(self.titulo, self.larguras, self.linhas_cabecalho)
+        if self.banner:
+            ws.escrever(1, 1, self.banner, self.estilo_banner)
+            ws.merge_cells(f"A1:{get_column_letter(len(self.larguras))}1")
+        for col, cabecalho in enumerate(self.cabecalhos, 1):
+            ws.escrever(self.linha_cabecalho, col, cabecalho, self.estilo_cabecalho)
+        return ws
+
+
+MODELO_RESUMO_EXECUTIVO = ModeloAba("📊 Resumo Executivo", larguras=[40, 30])
+
+MODELO_ANALISE_FORNECEDOR = ModeloAba(
+    "🏭 Análise por Fornecedor",
+    larguras=[40, 12, 12, 12, 12, 12, 15, 13, 13, 13, 18, 12, 15, 12, 15],
+    cabecalhos=[
+        'Fornecedor', 'Total Itens', 'Total Cargas', 'Total Pedidos', 'Total Códigos', 'Filiais Atendidas',
+        'Cobertura Média', 'Cobertura P50', 'Cobertura P90', 'Cobertura P99',
+        'Valor Total (R$)', '% Até 44 dias',
+        '% Entre 45-70 dias', '% Acima 71 dias', 'Recomendação'
+    ],
+    cor_cabecalho="70AD47"
+)
+
+MODELO_DETALHES_MERCADORIA = ModeloAba(
+    "🛍️ Detalhes por Mercadoria",
+    larguras=[10, 12, 25, 20, 12, 40, 15, 15, 12, 15, 15, 30],
+    cabecalhos=[
+        'Carga', 'Pedido', 'Fornecedor', 'Filial', 'Código', 'Mercadoria',
+        'Quantidade Entrega', 'Saldo Pedido', 'Cobertura Atual',
+        'Nota Fiscal', 'Faixa Cobertura', 'Observação'
+    ],
+    cor_cabecalho="4472C4"
+)
+
+MODELO_FAIXAS_FILIAL = ModeloAba(
+    "📍 Faixas por Filial",
+    larguras=[25, 10, 15, 10, 13, 13, 13, 10, 15, 10, 10, 10, 10],
+    cabecalhos=[
+        'Filial', 'Total Itens', 'Valor Total (R$)', 'Cobertura Média',
+        'Cobertura P50', 'Cobertura P90', 'Cobertura P99',
+        'Até 44 dias', '% Até 44', 'Entre 45-70 dias', '% 45-70',
+        'Acima 71 dias', '% Acima 71'
+    ],
+    cor_cabecalho="70AD47",
+    banner="ANÁLISE DE FAIXAS DE COBERTURA POR FILIAL",
+    cor_banner="366092"
+)
+CABECALHOS_DETALHAMENTO_FILIAL = [
+    'Fornecedor', 'Itens', 'Até 44d', '% 44d', '45-70d', '% 45-70d', 'Acima 71d', '% 71d', 'Cobertura Média'
+]
+
+MODELO_FAIXAS_FORNECEDOR_FILIAL = ModeloAba(
+    "🏭 Faixas Fornecedor x Filial",
+    larguras=[25, 20, 10, 15, 12, 13, 13, 13, 10, 10, 12, 10, 10, 15],
+    cabecalhos=[
+        'Fornecedor', 'Filial', 'Total Itens', 'Valor Total (R$)', 'Cobertura Média',
+        'Cobertura P50', 'Cobertura P90', 'Cobertura P99',
+        'Até 44 dias', '% Até 44', 'Entre 45-70 dias', '% 45-70',
+        'Acima 71 dias', '% Acima 71'
+    ],
+    cor_cabecalho="C5504B",
+    banner="ANÁLISE DE FAIXAS POR FORNECEDOR E FILIAL - TODOS",
+    cor_banner="C5504B"
+)
+
+MODELO_DISTRIBUICAO_VALOR = ModeloAba(
+    "💰 Distribuição por Valor",
+    larguras=[25, 15, 12, 18, 15, 15, 15, 20],
+    cabecalhos=[
+        'Faixa de Valor', 'Quantidade Itens', '% do Total', 'Valor Total (R$)',
+        '% do Valor Total', 'Cobertura Média', 'Recomendação', 'Observação'
+    ],
+    cor_cabecalho="E67E22",
+    banner="ANÁLISE DE DISTRIBUIÇÃO POR FAIXAS DE VALOR",
+    cor_banner="E67E22"
+)
+CABECALHOS_DETALHAMENTO_FAIXA = [
+    'Fornecedor', 'Filial', 'Itens', 'Valor Total', 'Cobertura Média', 'Maior Valor', 'Menor Valor', 'Recomendação'
+]
+
+MODELO_RESUMO_FORNECEDOR = ModeloAba("📊 Resumo do Fornecedor", larguras=[30, 40])
+
+MODELO_FILIAIS_FORNECEDOR = ModeloAba(
+    "📍 Faixas por Filial",
+    larguras=[25, 10, 15, 12, 12, 10, 10, 12, 10, 10, 10],
+    cabecalhos=[
+        'Filial', 'Total Itens', 'Valor Total (R$)', 'Cobertura Média', 'Cobertura P90',
+        'Até 44 dias', '% Até 44', 'Entre 45-70 dias', '% 45-70', 'Acima 71 dias', '% Acima 71'
+    ],
+    cor_cabecalho="366092"
+)
+
+MODELO_ALTERACOES = ModeloAba(
+    "🔄 O que Mudou",
+    larguras=[14, 10, 12, 12, 25, 20, 40, 15, 15, 12, 12, 35],
+    cabecalhos=[
+        'Situação', 'Carga', 'Pedido', 'Código', 'Fornecedor', 'Filial', 'Mercadoria',
+        'Saldo Anterior', 'Saldo Atual', 'Cobertura Anterior', 'Cobertura Atual', 'Campos Alterados'
+    ],
+    cor_cabecalho="7F6084",
+    banner="ALTERAÇÕES EM RELAÇÃO À ANÁLISE ANTERIOR",
+    cor_banner="7F6084"
+)
+
+MODELO_RESUMO_SESSAO = ModeloAba(
+    "📊 Resumo da Sessão",
+    larguras=[25, 15, 20],
+    cabecalhos=['Decisão', 'Itens', 'Valor (R$)'],
+    cor_cabecalho="366092",
+    banner="SESSÃO DE APROVAÇÃO",
+    cor_banner="366092"
+)
+CABECALHOS_DECISOES = [
+    'Itens Aprovados', 'Valor Aprovado (R$)', 'Itens em Revisão', 'Valor em Revisão (R$)',
+    'Itens Rejeitados', 'Valor Rejeitado (R$)'
+]
+LARGURAS_DECISOES = [15, 18, 15, 18, 15, 18]
+MODELO_SESSAO_FORNECEDOR = ModeloAba(
+    "🏭 Decisões por Fornecedor",
+    larguras=[40] + LARGURAS_DECISOES, cabecalhos=['Fornecedor'] + CABECALHOS_DECISOES, cor_cabecalho="70AD47"
+)
+MODELO_SESSAO_FILIAL = ModeloAba(
+    "📍 Decisões por Filial",
+    larguras=[25] + LARGURAS_DECISOES, cabecalhos=['Filial'] + CABECALHOS_DECISOES, cor_cabecalho="70AD47"
+)
+MODELO_SESSAO_FAIXA = ModeloAba(
+    "💰 Decisões por Faixa de Valor",
+    larguras=[25] + LARGURAS_DECISOES, cabecalhos=['Faixa de Valor'] + CABECALHOS_DECISOES, cor_cabecalho="E67E22"
+)
+MODELO_ITENS_SESSAO = ModeloAba(
+    "🛍️ Itens da Sessão",
+    larguras=[10, 12, 12, 25, 20, 40, 15, 15, 15],
+    cabecalhos=[
+        'Carga', 'Pedido', 'Código', 'Fornecedor', 'Filial', 'Mercadoria', 'Saldo Pedido', 'Cobertura Atual',
+        'Decisão'
+    ],
+    cor_cabecalho="4472C4"
+)
+
+MODELO_CONCILIACAO = ModeloAba(
+    "🧾 Conciliação NF x Pedido",
+    larguras=[28, 12, 12, 25, 20, 40, 15, 15, 14, 14, 12],
+    cabecalhos=[
+        'Situação', 'Pedido', 'Código', 'Fornecedor', 'Filial', 'Mercadoria', 'NF Agenda', 'NF Listagem',
+        'Qtd. Agenda', 'Qtd. Listagem', 'Diferença'
+    ],
+    cor_cabecalho="C5504B",
+    banner="CONCILIAÇÃO DA AGENDA COM A LISTAGEM DE NF/PEDIDOS",
+    cor_banner="C5504B"
+)
+
+MODELO_QUALIDADE = ModeloAba(
+    "🧪 Qualidade dos Dados",
+    larguras=[26, 8, 10, 12, 12, 25, 20, 40, 15, 15, 10, 40],
+    cabecalhos=[
+        'Ocorrência', 'Linha', 'Carga', 'Pedido', 'Código', 'Fornecedor', 'Filial', 'Mercadoria',
+        'Valor', 'Média Fornecedor', 'Z-score', 'Detalhe'
+    ],
+    cor_cabecalho="595959",
+    banner="QUALIDADE DOS DADOS DA AGENDA",
+    cor_banner="595959"
+)
+
+MODELO_ARQUIVOS = ModeloAba(
+    "📂 Arquivos Consolidados",
+    larguras=[40, 15, 12, 12, 14, 12, 20, 15],
+    cabecalhos=[
+        'Arquivo', 'Em Aprovação', 'Itens', 'Descartadas', 'Fornecedores', 'Filiais', 'Valor Total',
+        'Cobertura Média'
+    ],
+    cor_cabecalho="2F5597",
+    banner="ANÁLISE CONSOLIDADA DE VÁRIOS ARQUIVOS",
+    cor_banner="2F5597"
+)
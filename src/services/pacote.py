@@ -0,0 +1,251 @@
+import os
+import time
+import zlib
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Nível de compressão dos pacotes gerados (xlsx e zip de planilhas), de 0 a 9;
+# 0 grava sem compressão (mais rápido, arquivos maiores - downloads internos)
+NIVEL_COMPRESSAO = int(os.environ.get('ANALISE_NIVEL_COMPRESSAO', 6))
+
+# Threads de compressão (o zlib libera o GIL enquanto comprime)
+THREADS_COMPRESSAO = int(os.environ.get('ANALISE_THREADS_COMPRESSAO', os.cpu_count() or 1))
+
+# Cada membro é comprimido em blocos independentes; cada bloco usa os últimos
+# 32 KB do anterior como dicionário, e a concatenação forma um único deflate
+TAMANHO_BLOCO = 1024 * 1024
+JANELA_DEFLATE = 32 * 1024
+
+METODO_ARMAZENADO = 0
+METODO_DEFLATE = 8
+# Bit 11: nomes em UTF-8; bit 3: CRC e tamanhos no descritor após os dados
+# (só nos membros comprimidos - os armazenados levam tudo no cabeçalho local,
+# que é o que leitores de fluxo exigem quando não há como achar o fim dos dados)
+FLAGS = 0x0800
+FLAG_DESCRITOR = 0x0008
+VERSAO = 20
+VERSAO_ZIP64 = 45
+LIMITE_ZIP = 0xFFFFFFFF
+
+
+def _deflate(bloco, dicionario, nivel, final):
+    if dicionario:
+        compressor = zlib.compressobj(nivel, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=dicionario)
+    else:
+        compressor = zlib.compressobj(nivel, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(bloco) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+def _data_hora_dos(instante):
+    data = (instante.tm_year - 1980) << 9 | instante.tm_mon << 5 | instante.tm_mday
+    hora = instante.tm_hour << 11 | instante.tm_min << 5 | instante.tm_sec // 2
+    return data, hora
+
+
+class _Membro:
+
+    def __init__(self, nome, metodo):
+        self.nome = nome.encode('utf-8')
+        self.metodo = metodo
+        self.flags = FLAGS | FLAG_DESCRITOR if metodo == METODO_DEFLATE else FLAGS
+        self.crc = 0
+        self.tamanho = 0
+        self.comprimido = 0
+        self.posicao = 0
+
+
+class ZipParalelo:
+    """
+    Escritor de zip com a interface usada pelo openpyxl (writestr, write, namelist, close):
+    os blocos de todos os membros são comprimidos em paralelo e gravados na
+    ordem. Membros comprimidos usam descritores de dados e os armazenados
+    são lidos duas vezes (CRC antes, dados depois), então aceita destinos sem seek.
+    """
+
+    def __init__(self, destino, nivel=None, threads=None):
+        if isinstance(destino, (str, os.PathLike)):
+            self.saida = open(destino, 'wb')
+            self.fechar_saida = True
+        else:
+            self.saida = destino
+            self.fechar_saida = False
+        self.nivel = NIVEL_COMPRESSAO if nivel is None else nivel
+        self.metodo = METODO_DEFLATE if self.nivel > 0 else METODO_ARMAZENADO
+        self.threads = threads or THREADS_COMPRESSAO
+        self.pool = ThreadPoolExecutor(self.threads) if self.metodo == METODO_DEFLATE else None
+        self.data, self.hora = _data_hora_dos(time.localtime())
+        self.membros = []
+        self.nomes = []
+        self.pendentes = deque()
+        self.posicao = 0
+        self.fechado = False
+
+    def _gravar(self, dados):
+        self.saida.write(dados)
+        self.posicao += len(dados)
+
+    def _acrescentar(self, nome, abrir_blocos):
+        """
+        Enfileira um membro; `abrir_blocos()` devolve um iterador novo sobre os
+        blocos do conteúdo a cada chamada
+        """
+        membro = _Membro(nome, self.metodo)
+        self.nomes.append(nome)
+        if not membro.flags & FLAG_DESCRITOR:
+            # Sem descritor o cabeçalho local já leva CRC e tamanhos: uma passada só para calculá-los
+            for bloco in abrir_blocos():
+                membro.crc = zlib.crc32(bloco, membro.crc)
+                membro.tamanho += len(bloco)
+            membro.comprimido = membro.tamanho
+            if membro.tamanho >= LIMITE_ZIP:
+                raise ValueError(f"Membro {nome} maior que 4 GB não é suportado")
+        self.pendentes.append(('inicio', membro))
+
+        blocos = abrir_blocos()
+        anterior = b''
+        bloco = next(blocos, b'')
+        while True:
+            proximo = next(blocos, None)
+            final = proximo is None
+            if membro.flags & FLAG_DESCRITOR:
+                membro.crc = zlib.crc32(bloco, membro.crc)
+                membro.tamanho += len(bloco)
+            if self.pool is not None:
+                dados = self.pool.submit(_deflate, bloco, anterior[-JANELA_DEFLATE:], self.nivel, final)
+            else:
+                dados = bloco
+            self.pendentes.append(('dados', membro, dados))
+            # Limita os blocos em memória aguardando gravação
+            self._descarregar(self.threads * 4)
+            if final:
+                break
+            anterior, bloco = bloco, proximo
+
+        if membro.tamanho >= LIMITE_ZIP:
+            raise ValueError(f"Membro {nome} maior que 4 GB não é suportado")
+        self.pendentes.append(('fim', membro))
+
+    def _descarregar(self, limite=0):
+        while len(self.pendentes) > limite:
+            item = self.pendentes.popleft()
+            membro = item[1]
+            if item[0] == 'inicio':
+                membro.posicao = self.posicao
+                # Com descritor, CRC e tamanhos vão zerados aqui e seguem depois dos dados
+                crc, comprimido, tamanho = (0, 0, 0) if membro.flags & FLAG_DESCRITOR else (
+                    membro.crc, membro.comprimido, membro.tamanho)
+                self._gravar(struct.pack(
+                    '<IHHHHHIIIHH', 0x04034b50, VERSAO, membro.flags, membro.metodo, self.hora, self.data,
+                    crc, comprimido, tamanho, len(membro.nome), 0
+                ) + membro.nome)
+            elif item[0] == 'dados':
+                dados = item[2] if isinstance(item[2], bytes) else item[2].result()
+                if membro.flags & FLAG_DESCRITOR:
+                    membro.comprimido += len(dados)
+                self._gravar(dados)
+            else:
+                if membro.flags & FLAG_DESCRITOR:
+                    self._gravar(struct.pack('<IIII', 0x08074b50, membro.crc, membro.comprimido, membro.tamanho))
+                self.membros.append(membro)
+
+    def writestr(self, nome, dados):
+        if isinstance(dados, str):
+            dados = dados.encode('utf-8')
+        dados = memoryview(dados)
+        self._acrescentar(nome, lambda: (bytes(dados[i:i + TAMANHO_BLOCO])
+                                         for i in range(0, len(dados), TAMANHO_BLOCO)))
+
+    def write(self, caminho, nome=None):
+        with open(caminho, 'rb') as arquivo:
+            def abrir_blocos():
+                arquivo.seek(0)
+                return iter(lambda: arquivo.read(TAMANHO_BLOCO), b'')
+            self._acrescentar(nome or os.path.basename(caminho), abrir_blocos)
+
+    def namelist(self):
+        return list(self.nomes)
+
+    def _gravar_diretorio(self):
+        inicio = self.posicao
+        for membro in self.membros:
+            extra = b''
+            posicao = membro.posicao
+            versao = VERSAO
+            if posicao >= LIMITE_ZIP:
+                extra = struct.pack('<HHQ', 0x0001, 8, posicao)
+                posicao = LIMITE_ZIP
+                versao = VERSAO_ZIP64
+            self._gravar(struct.pack(
+                '<IHHHHHHIIIHHHHHII', 0x02014b50, versao, versao, membro.flags, membro.metodo, self.hora, self.data,
+                membro.crc, membro.comprimido, membro.tamanho, len(membro.nome), len(extra), 0, 0, 0,
+                0o600 << 16, posicao
+            ) + membro.nome + extra)
+        tamanho = self.posicao - inicio
+        total = len(self.membros)
+
+        if total > 0xFFFF or inicio >= LIMITE_ZIP or tamanho >= LIMITE_ZIP:
+            posicao_zip64 = self.posicao
+            self._gravar(struct.pack(
+                '<IQHHIIQQQQ', 0x06064b50, 44, VERSAO_ZIP64, VERSAO_ZIP64, 0, 0, total, total, tamanho, inicio
+            ))
+            self._gravar(struct.pack('<IIQI', 0x07064b50, 0, posicao_zip64, 1))
+            total, tamanho, inicio = 0xFFFF, LIMITE_ZIP, LIMITE_ZIP
+        self._gravar(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, total, total, tamanho, inicio, 0))
+
+    def close(self):
+        if self.fechado:
+            return
+        self.fechado = True
+        try:
+            self._descarregar()
+            self._gravar_diretorio()
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown(cancel_futures=True)
+            if self.fechar_saida:
+                self.saida.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _SaidaEmFluxo:
+    """
+    Destino sem seek para o zip: guarda os bytes escritos até serem entregues
+    """
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def retirar(self):
+        dados = b''.join(self.partes)
+        self.partes = []
+        return dados
+
+
+def compactar_em_fluxo(arquivos, nivel=None):
+    """
+    Gera um zip a partir de (nome, bytes) e entrega os pedaços conforme cada
+    arquivo é adicionado, sem montar o zip inteiro em memória
+    """
+    saida = _SaidaEmFluxo()
+    with ZipParalelo(saida, nivel) as pacote:
+        for nome, conteudo in arquivos:
+            pacote.writestr(nome, conteudo)
+            pedaco = saida.retirar()
+            if pedaco:
+                yield pedaco
+    pedaco = saida.retirar()
+    if pedaco:
+        yield pedaco
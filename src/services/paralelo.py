@@ -0,0 +1,180 @@
+import os
+import multiprocessing
+from collections import deque
+from itertools import islice
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from src.services.agregados import AgregadosParciais, ColunaCodificada, ColunasAgregacao, combinar_agregados
+from src.services.distintos import CONTAGEM_EXATA, COLUNAS_DISTINTAS
+
+# Número de processos do pool (padrão: um por núcleo)
+PROCESSOS_PADRAO = int(os.environ.get('ANALISE_PROCESSOS', os.cpu_count() or 1))
+
+# Abaixo disso não compensa abrir o pool de processos
+MINIMO_LINHAS_PARALELO = int(os.environ.get('ANALISE_MINIMO_LINHAS_PARALELO', 20000))
+
+# Como os processos do pool são iniciados. Os workers do gunicorn (gthread)
+# e a thread de /iniciar têm outras threads vivas, e um fork copiaria locks
+# presos por elas; o forkserver parte de um processo sem threads (spawn onde
+# não existe forkserver)
+METODO_INICIO = os.environ.get(
+    'ANALISE_INICIO_PROCESSOS',
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
+
+# Importados uma vez no forkserver, para cada processo filho não reimportar pandas
+MODULOS_PRE_CARREGADOS = ['src.routes.analise']
+
+
+class ColunasCompartilhadas:
+    """
+    Colunas numéricas copiadas para blocos de memória compartilhada.
+    Os processos filhos recebem apenas os nomes dos blocos, nunca o DataFrame.
+    """
+
+    def __init__(self, colunas):
+        self.blocos = {}
+        self.descricao = {}
+        for nome, valores in colunas.items():
+            valores = np.ascontiguousarray(valores)
+            bloco = shared_memory.SharedMemory(create=True, size=max(valores.nbytes, 1))
+            np.ndarray(valores.shape, dtype=valores.dtype, buffer=bloco.buf)[:] = valores
+            self.blocos[nome] = bloco
+            self.descricao[nome] = (bloco.name, valores.dtype.str, len(valores))
+
+    def liberar(self):
+        for bloco in self.blocos.values():
+            bloco.close()
+            bloco.unlink()
+        self.blocos = {}
+
+
+def pool_processos(processos):
+    """
+    ProcessPoolExecutor com processos iniciados por METODO_INICIO
+    """
+    contexto = multiprocessing.get_context(METODO_INICIO)
+    if METODO_INICIO == 'forkserver':
+        contexto.set_forkserver_preload(MODULOS_PRE_CARREGADOS)
+    return ProcessPoolExecutor(max_workers=processos, mp_context=contexto)
+
+
+def mapear_em_ordem(pool, funcao, tarefas, pendentes):
+    """
+    Como pool.map, mas com no máximo `pendentes` tarefas enviadas por vez:
+    os resultados saem na ordem das tarefas assim que ficam prontos, e os
+    que o consumidor ainda não leu não se acumulam em memória
+    """
+    tarefas = iter(tarefas)
+    futuros = deque(pool.submit(funcao, tarefa) for tarefa in islice(tarefas, pendentes))
+    try:
+        while futuros:
+            resultado = futuros.popleft().result()
+            futuros.extend(pool.submit(funcao, tarefa) for tarefa in islice(tarefas, 1))
+            yield resultado
+    finally:
+        for futuro in futuros:
+            futuro.cancel()
+
+
+def _ler_compartilhado(descricao, nome, blocos):
+    nome_bloco, dtype, tamanho = descricao[nome]
+    bloco = shared_memory.SharedMemory(name=nome_bloco)
+    blocos.append(bloco)
+    return np.ndarray((tamanho,), dtype=np.dtype(dtype), buffer=bloco.buf)
+
+
+def _agregar_fatia(descricao, inicio, fim, contagem):
+    """
+    Executado no processo filho: agrega as linhas [inicio, fim) das colunas compartilhadas
+    """
+    blocos = []
+    try:
+        def ler(nome):
+            return _ler_compartilhado(descricao, nome, blocos)[inicio:fim].copy()
+
+        # Sem rótulos: os códigos fazem papel de rótulo até o renomear() no processo principal.
+        # No modo aproximado cada coluna distinta leva junto o hash dos seus valores únicos.
+        distintos = {}
+        for nome in COLUNAS_DISTINTAS:
+            hashes = None
+            if contagem != CONTAGEM_EXATA:
+                hashes = _ler_compartilhado(descricao, f'hash {nome}', blocos).copy()
+            distintos[nome] = ColunaCodificada(ler(nome), hashes=hashes)
+
+        colunas = ColunasAgregacao(
+            ordem=ler('ordem'),
+            cobertura=ler('Cobertura Atual'),
+            saldo=ler('Saldo Pedido'),
+            fornecedor=ColunaCodificada(ler('Fornecedor')),
+            filial=ColunaCodificada(ler('Filial')),
+            distintos=distintos,
+        )
+        return AgregadosParciais.de_colunas(colunas, contagem)
+    finally:
+        for bloco in blocos:
+            bloco.close()
+
+
+def _fatias_por_filial(codigos_filial_ordenados, quantidade):
+    """
+    Divide linhas já ordenadas por filial em até `quantidade` fatias contíguas
+    de tamanho parecido, sem separar uma mesma filial entre fatias
+    """
+    limites = np.flatnonzero(np.diff(codigos_filial_ordenados)) + 1
+    fins = np.concatenate([limites, [len(codigos_filial_ordenados)]])
+
+    alvo = len(codigos_filial_ordenados) / quantidade
+    fatias = []
+    inicio_fatia = 0
+    for fim in fins:
+        if fim - inicio_fatia >= alvo:
+            fatias.append((inicio_fatia, int(fim)))
+            inicio_fatia = int(fim)
+    if inicio_fatia < len(codigos_filial_ordenados):
+        fatias.append((inicio_fatia, len(codigos_filial_ordenados)))
+    return fatias
+
+
+def agregar_por_filial(colunas, processos=PROCESSOS_PADRAO, contagem=CONTAGEM_EXATA):
+    """
+    Calcula os agregados da agenda limpa (ColunasAgregacao, de qualquer backend)
+    separando-a por Filial em um pool de processos. Cada processo agrega as
+    filiais da sua fatia e os parciais são combinados no processo principal;
+    totais por fornecedor que cruzam filiais continuam exatos porque
+    contagens, somas e conjuntos se combinam.
+    """
+    if processos <= 1 or len(colunas) < MINIMO_LINHAS_PARALELO:
+        return AgregadosParciais.de_colunas(colunas, contagem)
+
+    # Só códigos inteiros e floats vão para a memória compartilhada
+    posicoes = np.argsort(colunas.filial.codigos, kind='stable')
+    buffers = {
+        'ordem': colunas.ordem[posicoes],
+        'Fornecedor': colunas.fornecedor.codigos[posicoes],
+        'Filial': colunas.filial.codigos[posicoes],
+        'Cobertura Atual': colunas.cobertura[posicoes],
+        'Saldo Pedido': colunas.saldo[posicoes],
+    }
+    rotulos = {'Fornecedor': colunas.fornecedor.rotulos, 'Filial': colunas.filial.rotulos}
+    for nome, codificada in colunas.distintos.items():
+        buffers[nome] = codificada.codigos[posicoes]
+        rotulos[nome] = codificada.rotulos
+        if contagem != CONTAGEM_EXATA:
+            # Só os valores únicos são hasheados; os processos indexam pelo código
+            buffers[f'hash {nome}'] = codificada.hashes_rotulos()
+    compartilhadas = ColunasCompartilhadas(buffers)
+
+    try:
+        fatias = _fatias_por_filial(buffers['Filial'], processos)
+        with pool_processos(min(processos, len(fatias))) as pool:
+            futuros = [pool.submit(_agregar_fatia, compartilhadas.descricao, inicio, fim, contagem)
+                       for inicio, fim in fatias]
+            parciais = [futuro.result() for futuro in futuros]
+    finally:
+        compartilhadas.liberar()
+
+    agregados = combinar_agregados(parciais)
+    return agregados.renomear(rotulos)
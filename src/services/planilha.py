@@ -0,0 +1,355 @@
+import os
+from datetime import datetime, timezone
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter, range_boundaries
+from openpyxl.writer.excel import ExcelWriter
+from src.services.pacote import ZipParalelo
+
+# Escritores de xlsx: openpyxl (write_only) ou XlsxWriter (constant_memory),
+# escolhido pela variável ANALISE_ESCRITOR
+ESCRITOR_OPENPYXL = 'openpyxl'
+ESCRITOR_XLSXWRITER = 'xlsxwriter'
+ESCRITOR_PADRAO = os.environ.get('ANALISE_ESCRITOR', ESCRITOR_OPENPYXL)
+
+# Limite de linhas de uma aba do Excel e quantas linhas cada aba do relatório
+# recebe antes de a tabela continuar em uma nova aba numerada
+LIMITE_LINHAS_EXCEL = 1048576
+LINHAS_POR_ABA = min(int(os.environ.get('ANALISE_LINHAS_POR_ABA', 1000000)), LIMITE_LINHAS_EXCEL)
+
+# Nomes de aba têm no máximo 31 caracteres (contados em UTF-16 pelo Excel)
+LIMITE_TITULO_ABA = 31
+
+
+def _tamanho_titulo(titulo):
+    return len(titulo.encode('utf-16-le')) // 2
+
+
+def titulo_continuacao(titulo, numero):
+    """
+    Nome da aba de continuação: o título original, encurtado se preciso, mais o número
+    """
+    sufixo = f" {numero}"
+    while titulo and _tamanho_titulo(titulo + sufixo) > LIMITE_TITULO_ABA:
+        titulo = titulo[:-1]
+    return titulo.rstrip() + sufixo
+
+
+class Estilo:
+    """
+    Fonte, preenchimento e alinhamento (objetos do openpyxl) criados uma vez
+    e compartilhados por todas as células que os usam
+    """
+
+    __slots__ = ('font', 'fill', 'alignment')
+
+    def __init__(self, font=None, fill=None, alignment=None):
+        self.font = font
+        self.fill = fill
+        self.alignment = alignment
+
+
+class AbaEmFluxo:
+    """
+    Aba gravada em fluxo com a interface usada pelos construtores
+    (cell, merge_cells, title). As linhas são escritas em ordem e entregues
+    ao escritor assim que a próxima começa; ao passar de `linhas_por_aba` a
+    tabela continua em "Título 2", "Título 3"..., repetindo as linhas de
+    cabeçalho. As subclasses implementam _abrir_aba, _nova_celula e _gravar.
+    """
+
+    def __init__(self, escritor, titulo, larguras=(), linhas_cabecalho=0, linhas_por_aba=None):
+        self.escritor = escritor
+        self.title = titulo
+        self.larguras = larguras
+        self.linhas_cabecalho = linhas_cabecalho
+        self.linhas_por_aba = max(linhas_por_aba or LINHAS_POR_ABA, linhas_cabecalho + 1)
+        self.abas = 0
+        self.deslocamento = 0
+        self.linha_atual = 0
+        self.pendentes = {}
+        self.mesclagens = []
+        self.cabecalho = []
+        self._abrir(titulo)
+
+    def _abrir(self, titulo):
+        self._abrir_aba(titulo)
+        self.abas += 1
+
+    def _descarregar(self):
+        if not self.pendentes:
+            return
+        celulas, mesclagens = self.pendentes, self.mesclagens
+        self.pendentes, self.mesclagens = {}, []
+        self._gravar(self.linha_atual - self.deslocamento, celulas, mesclagens)
+        if self.linha_atual <= self.linhas_cabecalho:
+            self.cabecalho.append((self.linha_atual, celulas, mesclagens))
+
+    def _continuar(self, row):
+        self._abrir(titulo_continuacao(self.title, self.abas + 1))
+        for linha, celulas, mesclagens in self.cabecalho:
+            self._gravar(linha, celulas, mesclagens)
+        self.deslocamento = row - self.linhas_cabecalho - 1
+
+    def cell(self, row, column, value=None):
+        """
+        Célula da linha `row` (as linhas devem ser escritas em ordem crescente)
+        """
+        if row != self.linha_atual:
+            if row < self.linha_atual:
+                raise ValueError(f"Linha {row} escrita depois da linha {self.linha_atual} na aba {self.title}")
+            self._descarregar()
+            if row - self.deslocamento > self.linhas_por_aba:
+                self._continuar(row)
+            self.linha_atual = row
+
+        celula = self.pendentes.get(column)
+        if celula is None:
+            celula = self.pendentes[column] = self._nova_celula()
+        if value is not None:
+            celula.value = value
+        return celula
+
+    def escrever(self, row, column, value=None, estilo=None):
+        """
+        Grava um valor com um estilo pré-montado
+        """
+        celula = self.cell(row, column, value)
+        if estilo is not None:
+            self._aplicar_estilo(celula, estilo)
+        return celula
+
+    def _aplicar_estilo(self, celula, estilo):
+        if estilo.font is not None:
+            celula.font = estilo.font
+        if estilo.fill is not None:
+            celula.fill = estilo.fill
+        if estilo.alignment is not None:
+            celula.alignment = estilo.alignment
+
+    def merge_cells(self, intervalo):
+        """
+        Mescla um intervalo que começa na linha atual
+        """
+        min_col, min_row, max_col, max_row = range_boundaries(intervalo)
+        if min_row != self.linha_atual:
+            raise ValueError(f"Mesclagem {intervalo} fora da linha atual ({self.linha_atual}) na aba {self.title}")
+        self.mesclagens.append((min_col, max_col, max_row - min_row))
+
+    def fechar(self):
+        self._descarregar()
+
+
+class EscritorPlanilha:
+    """
+    Workbook gravado em `destino` (caminho ou arquivo binário) aba por aba
+    """
+
+    classe_aba = None
+
+    def __init__(self, destino, linhas_por_aba=None):
+        self.destino = destino
+        self.linhas_por_aba = linhas_por_aba
+        self.abas = []
+
+    def criar_aba(self, titulo, larguras=(), linhas_cabecalho=0):
+        aba = self.classe_aba(self, titulo, larguras, linhas_cabecalho, self.linhas_por_aba)
+        self.abas.append(aba)
+        return aba
+
+    def salvar(self):
+        for aba in self.abas:
+            aba.fechar()
+        self._salvar()
+
+
+class AbaOpenpyxl(AbaEmFluxo):
+
+    def _abrir_aba(self, titulo):
+        # No modo write_only as larguras precisam vir antes da primeira linha
+        self.ws = self.escritor.wb.create_sheet(titulo)
+        for col, largura in enumerate(self.larguras, 1):
+            self.ws.column_dimensions[get_column_letter(col)].width = largura
+        self.linha_fisica = 0
+
+    def _nova_celula(self):
+        return WriteOnlyCell(self.ws)
+
+    def _gravar(self, linha, celulas, mesclagens):
+        while self.linha_fisica < linha - 1:
+            self.ws.append([])
+            self.linha_fisica += 1
+
+        valores = [None] * max(celulas)
+        for coluna, celula in celulas.items():
+            # Células sem estilo vão como valor: o openpyxl reaproveita o objeto
+            # recebido para a célula seguinte e alteraria a cópia do cabeçalho
+            valores[coluna - 1] = celula if celula.has_style else celula.value
+        self.ws.append(valores)
+        self.linha_fisica = linha
+
+        for min_col, max_col, altura in mesclagens:
+            self.ws.merged_cells.add(
+                f"{get_column_letter(min_col)}{linha}:{get_column_letter(max_col)}{linha + altura}"
+            )
+
+
+class EscritorOpenpyxl(EscritorPlanilha):
+    """
+    Workbook write_only do openpyxl: cada aba vai para um arquivo temporário
+    conforme é preenchida; ao salvar, as partes do xlsx são comprimidas em paralelo
+    """
+
+    classe_aba = AbaOpenpyxl
+
+    def __init__(self, destino, linhas_por_aba=None):
+        super().__init__(destino, linhas_por_aba)
+        self.wb = Workbook(write_only=True)
+
+    def _salvar(self):
+        # Mesmo caminho do Workbook.save, trocando o ZipFile pelo ZipParalelo
+        self.wb.properties.modified = datetime.now(tz=timezone.utc).replace(tzinfo=None)
+        with ZipParalelo(self.destino) as pacote:
+            ExcelWriter(self.wb, pacote).save()
+
+
+class CelulaXlsxWriter:
+    """
+    Célula pendente do XlsxWriter: guarda valor e estilos (objetos do
+    openpyxl) até a linha ser gravada
+    """
+
+    __slots__ = ('value', 'font', 'fill', 'alignment', 'estilo')
+
+    def __init__(self):
+        self.value = None
+        self.font = None
+        self.fill = None
+        self.alignment = None
+        self.estilo = None
+
+
+def _cor(cor):
+    rgb = getattr(cor, 'rgb', None)
+    return f"#{rgb[-6:]}" if isinstance(rgb, str) else None
+
+
+def propriedades_formato(celula):
+    """
+    Traduz os estilos do openpyxl de uma célula para as propriedades de formato do XlsxWriter
+    """
+    propriedades = {}
+    fonte = celula.font
+    if fonte is not None:
+        if fonte.b:
+            propriedades['bold'] = True
+        if fonte.sz:
+            propriedades['font_size'] = fonte.sz
+        if _cor(fonte.color):
+            propriedades['font_color'] = _cor(fonte.color)
+
+    preenchimento = celula.fill
+    if preenchimento is not None and preenchimento.fill_type == 'solid' and _cor(preenchimento.start_color):
+        propriedades['pattern'] = 1
+        propriedades['bg_color'] = _cor(preenchimento.start_color)
+
+    alinhamento = celula.alignment
+    if alinhamento is not None:
+        if alinhamento.horizontal:
+            propriedades['align'] = alinhamento.horizontal
+        if alinhamento.vertical:
+            propriedades['valign'] = 'vcenter' if alinhamento.vertical == 'center' else alinhamento.vertical
+    return propriedades
+
+
+class AbaXlsxWriter(AbaEmFluxo):
+
+    def _abrir_aba(self, titulo):
+        self.ws = self.escritor.wb.add_worksheet(titulo)
+        for col, largura in enumerate(self.larguras):
+            self.ws.set_column(col, col, largura)
+
+    def _nova_celula(self):
+        return CelulaXlsxWriter()
+
+    def _aplicar_estilo(self, celula, estilo):
+        super()._aplicar_estilo(celula, estilo)
+        celula.estilo = estilo
+
+    def _gravar(self, linha, celulas, mesclagens):
+        # No constant_memory cada linha é gravada uma única vez, em ordem:
+        # primeiro as células soltas, depois as mescladas (que podem descer)
+        linha -= 1
+        mescladas = {col for min_col, max_col, _ in mesclagens for col in range(min_col, max_col + 1)}
+        for coluna, celula in sorted(celulas.items()):
+            if coluna not in mescladas:
+                self.ws.write(linha, coluna - 1, celula.value, self.escritor.formato(celula))
+
+        for min_col, max_col, altura in mesclagens:
+            celula = celulas.get(min_col) or CelulaXlsxWriter()
+            self.ws.merge_range(
+                linha, min_col - 1, linha + altura, max_col - 1, celula.value, self.escritor.formato(celula)
+            )
+
+
+class EscritorXlsxWriter(EscritorPlanilha):
+    """
+    Workbook do XlsxWriter em modo constant_memory: cada linha vai para
+    disco ao ser gravada; os formatos são criados uma vez por combinação de estilos
+    """
+
+    classe_aba = AbaXlsxWriter
+
+    def __init__(self, destino, linhas_por_aba=None):
+        try:
+            import xlsxwriter
+        except ImportError:
+            raise ValueError("Escritor 'xlsxwriter' indisponível: instale o pacote XlsxWriter")
+        super().__init__(destino, linhas_por_aba)
+        self.wb = xlsxwriter.Workbook(destino, {
+            'constant_memory': True,
+            'strings_to_urls': False,
+            'nan_inf_to_errors': True,
+        })
+        self.formatos = {}
+        self.formatos_estilo = {}
+
+    def formato(self, celula):
+        # Células com um estilo pré-montado (e sem ajustes depois dele) usam
+        # o formato já criado para o estilo, sem traduzir os objetos de novo
+        estilo = celula.estilo
+        if (estilo is not None and celula.font is estilo.font and celula.fill is estilo.fill
+                and celula.alignment is estilo.alignment):
+            if estilo not in self.formatos_estilo:
+                self.formatos_estilo[estilo] = self._formato(celula)
+            return self.formatos_estilo[estilo]
+        return self._formato(celula)
+
+    def _formato(self, celula):
+        propriedades = propriedades_formato(celula)
+        if not propriedades:
+            return None
+        chave = tuple(sorted(propriedades.items()))
+        formato = self.formatos.get(chave)
+        if formato is None:
+            formato = self.formatos[chave] = self.wb.add_format(propriedades)
+        return formato
+
+    def _salvar(self):
+        self.wb.close()
+
+
+ESCRITORES = {
+    ESCRITOR_OPENPYXL: EscritorOpenpyxl,
+    ESCRITOR_XLSXWRITER: EscritorXlsxWriter,
+}
+
+
+def criar_planilha(destino, escritor=None, linhas_por_aba=None):
+    """
+    Instancia o escritor pelo nome (padrão: variável ANALISE_ESCRITOR ou openpyxl)
+    """
+    escritor = escritor or ESCRITOR_PADRAO
+    if escritor not in ESCRITORES:
+        raise ValueError(f"Escritor desconhecido: {escritor}")
+    return ESCRITORES[escritor](destino, linhas_por_aba)
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import uuid
+import atexit
+import tempfile
+
+from src.services.admissao import processo_vivo
+
+# Pasta com o log de eventos de cada análise (compartilhada entre os workers)
+PASTA_PROGRESSO = os.environ.get(
+    'ANALISE_PASTA_PROGRESSO', os.path.join(tempfile.gettempdir(), 'analise_progresso')
+)
+
+# Eventos que encerram o acompanhamento
+EVENTOS_FINAIS = {'concluido', 'erro'}
+
+# Intervalo de leitura do log e tempo máximo sem novos eventos (segundos)
+INTERVALO_LEITURA = 0.25
+TEMPO_MAXIMO_SEM_EVENTOS = int(os.environ.get('ANALISE_TEMPO_MAXIMO_PROGRESSO', 600))
+
+# De quanto em quanto tempo sem eventos (segundos) o acompanhamento confere
+# se o processo que executa a análise ainda existe
+INTERVALO_VERIFICACAO_DONO = 5
+
+MENSAGEM_INTERROMPIDA = 'A análise foi interrompida pelo reinício do servidor. Envie o arquivo novamente.'
+
+# Análises executadas por este processo ainda sem evento final
+_em_andamento = {}
+
+
+def _caminho(id_analise):
+    return os.path.join(PASTA_PROGRESSO, f"{id_analise}.jsonl")
+
+
+def _caminho_dono(id_analise):
+    return os.path.join(PASTA_PROGRESSO, f"{id_analise}.dono")
+
+
+class ProgressoNulo:
+    """
+    Progresso que descarta os eventos (processamento síncrono)
+    """
+
+    def emitir(self, evento, **dados):
+        pass
+
+
+class Progresso:
+    """
+    Log de eventos de uma análise: uma linha JSON por evento, acrescentada
+    ao arquivo da análise para que qualquer worker possa acompanhá-lo
+    """
+
+    def __init__(self, id_analise=None):
+        os.makedirs(PASTA_PROGRESSO, exist_ok=True)
+        self.id = id_analise or uuid.uuid4().hex
+        self.caminho = _caminho(self.id)
+        open(self.caminho, 'a').close()
+
+    def assumir(self):
+        """
+        Registra este processo como o que executa a análise: se ele terminar
+        sem o evento final, o acompanhamento emite 'erro' no lugar
+        """
+        with open(_caminho_dono(self.id), 'w') as arquivo:
+            arquivo.write(str(os.getpid()))
+        _em_andamento[self.id] = self
+
+    def emitir(self, evento, **dados):
+        linha = json.dumps({'evento': evento, 'dados': dados}, ensure_ascii=False)
+        with open(self.caminho, 'a', encoding='utf-8') as arquivo:
+            arquivo.write(linha + '\n')
+        if evento in EVENTOS_FINAIS:
+            _em_andamento.pop(self.id, None)
+
+
+def interromper_em_andamento():
+    """
+    Emite 'erro' nas análises deste processo ainda sem evento final; chamado
+    quando o processo termina (atexit e worker_exit do gunicorn), já que as
+    threads de /iniciar morrem com ele
+    """
+    for progresso in list(_em_andamento.values()):
+        progresso.emitir('erro', error=MENSAGEM_INTERROMPIDA)
+
+
+atexit.register(interromper_em_andamento)
+
+
+def _dono_vivo(id_analise):
+    """
+    Se o processo que executa a análise ainda existe (sem registro, assume que sim)
+    """
+    try:
+        with open(_caminho_dono(id_analise)) as arquivo:
+            return processo_vivo(int(arquivo.read()))
+    except (OSError, ValueError):
+        return True
+
+
+def existe(id_analise):
+    return os.path.exists(_caminho(id_analise))
+
+
+def acompanhar(id_analise):
+    """
+    Gera os eventos da análise conforme são gravados, do início até o
+    evento final (ou até TEMPO_MAXIMO_SEM_EVENTOS sem novidades). Se o
+    processo que a executa morreu sem o evento final (reinício do worker,
+    falta de memória), grava e gera um 'erro'.
+    """
+    ultimo_evento = ultima_verificacao = time.monotonic()
+    with open(_caminho(id_analise), encoding='utf-8') as arquivo:
+        pendente = ''
+        while True:
+            pendente += arquivo.readline()
+            if pendente.endswith('\n'):
+                evento = json.loads(pendente)
+                pendente = ''
+                ultimo_evento = time.monotonic()
+                yield evento
+                if evento['evento'] in EVENTOS_FINAIS:
+                    return
+                continue
+
+            agora = time.monotonic()
+            if agora - ultimo_evento > TEMPO_MAXIMO_SEM_EVENTOS:
+                return
+            if agora - ultima_verificacao > INTERVALO_VERIFICACAO_DONO:
+                ultima_verificacao = agora
+                if not _dono_vivo(id_analise):
+                    Progresso(id_analise).emitir('erro', error=MENSAGEM_INTERROMPIDA)
+                    continue
+            time.sleep(INTERVALO_LEITURA)
+
+
+def remover_expirados(idade_maxima=TEMPO_MAXIMO_SEM_EVENTOS):
+    """
+    Apaga logs de análises antigas
+    """
+    if not os.path.isdir(PASTA_PROGRESSO):
+        return
+    agora = time.time()
+    for nome in os.listdir(PASTA_PROGRESSO):
+        caminho = os.path.join(PASTA_PROGRESSO, nome)
+        try:
+            if agora - os.path.getmtime(caminho) > idade_maxima:
+                os.remove(caminho)
+        except OSError:
+            pass
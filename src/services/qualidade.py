@@ -0,0 +1,416 @@
+"""
+Verificação de qualidade da agenda em duas passadas: a ingestão acumula,
+lote a lote, a assinatura de cada linha e os momentos da cobertura e do
+saldo por fornecedor (QualidadeParcial); ao fechar, avaliar() relê os
+detalhes lote a lote para separar as linhas duplicadas, as de chave
+repetida e as atípicas pelo z-score, que só se calcula com a média e o
+desvio do fornecedor já completos.
+"""
+import os
+import pickle
+import tempfile
+import numpy as np
+import pandas as pd
+
+from src.services.backends import COLUNAS_OBRIGATORIAS
+from src.services.delta import COLUNAS_CHAVE, COLUNAS_CONTEUDO
+from src.services.detalhes import COLUNAS_DETALHE
+from src.services.distintos import hash_linhas
+
+# Ocorrências do relatório de qualidade
+DUPLICADA = 'duplicada'
+CHAVE_REPETIDA = 'chave_repetida'
+OUTLIER_COBERTURA = 'outlier_cobertura'
+OUTLIER_SALDO = 'outlier_saldo'
+DESCARTADA = 'descartada'
+ROTULOS_QUALIDADE = {
+    DUPLICADA: '❌ Linha duplicada',
+    CHAVE_REPETIDA: '⚠️ Chave repetida',
+    OUTLIER_COBERTURA: '📈 Cobertura atípica',
+    OUTLIER_SALDO: '💰 Saldo atípico',
+    DESCARTADA: '🗑️ Descartada na limpeza',
+}
+
+# Colunas avaliadas por fornecedor e limite do z-score para linha atípica
+INDICADORES_OUTLIER = {OUTLIER_COBERTURA: 'Cobertura Atual', OUTLIER_SALDO: 'Saldo Pedido'}
+LIMITE_Z = float(os.environ.get('ANALISE_LIMITE_Z', 3.0))
+
+# Motivo do descarte pela coluna obrigatória vazia
+MOTIVOS_DESCARTE = {
+    'Cobertura Atual': 'Sem cobertura',
+    'Fornecedor': 'Sem fornecedor',
+    'Filial': 'Sem filial',
+    'Mercadoria': 'Sem mercadoria',
+}
+
+# Linha do arquivo = posição na aba + 2 (cabeçalho na linha 1)
+DESLOCAMENTO_LINHA = 2
+
+# Estado gravado em disco (modo em lotes): as assinaturas vão para partições
+# pelo hash da chave, e cada partição cabe em memória na hora de avaliar
+PARTICOES_ASSINATURAS = int(os.environ.get('ANALISE_PARTICOES_ASSINATURAS', 16))
+TIPO_ASSINATURA = np.dtype([('chave', '<u8'), ('conteudo', '<u8'), ('posicao', '<i8')])
+
+
+class RelatorioQualidade:
+    """
+    Resultado da verificação de qualidade: contagens para o resumo e uma
+    tabela com uma linha por ocorrência (duplicada, atípica ou descartada)
+    """
+
+    def __init__(self, contagens, ocorrencias):
+        self.contagens = contagens
+        self.ocorrencias = ocorrencias
+
+    def resumo(self):
+        return dict(self.contagens)
+
+
+def _linhas(posicoes, com_linhas):
+    if not com_linhas:
+        return np.full(len(posicoes), np.nan)
+    return np.asarray(posicoes, dtype=np.float64) + DESLOCAMENTO_LINHA
+
+
+def _ocorrencias(tipo, df, linhas, valor=np.nan, media=np.nan, z=np.nan, detalhe=None):
+    tabela = df[COLUNAS_CHAVE + ['Fornecedor', 'Filial', 'Mercadoria']].reset_index(drop=True)
+    tabela.insert(0, 'linha', linhas)
+    tabela.insert(0, 'tipo', tipo)
+    tabela['valor'] = valor
+    tabela['media'] = media
+    tabela['z'] = z
+    tabela['detalhe'] = detalhe
+    return tabela
+
+
+def motivos_descarte(descartadas):
+    """
+    Colunas obrigatórias vazias de cada linha descartada, separadas por vírgula
+    """
+    faltando = descartadas[COLUNAS_OBRIGATORIAS].isna().to_numpy()
+    motivos = np.full(len(descartadas), '', dtype=object)
+    for posicao, coluna in enumerate(COLUNAS_OBRIGATORIAS):
+        rotulo = MOTIVOS_DESCARTE[coluna]
+        motivos = np.where(
+            faltando[:, posicao], np.where(motivos == '', rotulo, motivos + ', ' + rotulo), motivos
+        )
+    return motivos
+
+
+def _momentos(valores, fornecedor):
+    """
+    Quantidade, média e soma dos quadrados dos desvios (M2) de cada fornecedor
+    """
+    chaves = fornecedor.to_numpy()
+    por_fornecedor = valores.groupby(chaves, sort=False)
+    media = por_fornecedor.mean()
+    desvios = (valores.to_numpy() - media.reindex(chaves).to_numpy()) ** 2
+    return pd.DataFrame({
+        'n': por_fornecedor.count(),
+        'media': media,
+        'm2': pd.Series(desvios).groupby(chaves, sort=False).sum(),
+    })
+
+
+def _combinar_momentos(a, b):
+    """
+    Combina os momentos de dois lotes por fornecedor (fórmula de Chan et al.)
+    """
+    if a is None:
+        return b
+    if b is None:
+        return a
+    a, b = a.align(b, fill_value=0)
+    a, b = a.fillna(0), b.fillna(0)
+    n = a['n'] + b['n']
+    delta = b['media'] - a['media']
+    proporcao = (b['n'] / n.where(n > 0)).fillna(0)
+    return pd.DataFrame({
+        'n': n,
+        'media': a['media'] + delta * proporcao,
+        'm2': a['m2'] + b['m2'] + delta ** 2 * a['n'] * proporcao,
+    })
+
+
+def _concatenar(partes, dtype):
+    return np.concatenate(partes) if partes else np.empty(0, dtype=dtype)
+
+
+def _repeticoes(chaves, conteudos, posicoes):
+    """
+    Linhas repetidas entre assinaturas que contêm todas as linhas de cada
+    chave: posição da linha original de cada cópia idêntica (Series indexada
+    pela posição da cópia), posições das chaves com conteúdo diferente e
+    quantas chaves conflitantes há
+    """
+    assinaturas = pd.DataFrame({'chave': chaves, 'conteudo': conteudos, 'posicao': posicoes})
+    copias = assinaturas.duplicated(['chave', 'conteudo']).to_numpy()
+    versoes = assinaturas.groupby('chave', sort=False)['conteudo'].transform('nunique').to_numpy()
+    conflitantes = ~copias & (versoes > 1)
+    originais = assinaturas.groupby(['chave', 'conteudo'], sort=False)['posicao'].transform('first')
+    originais = pd.Series(originais.to_numpy()[copias], index=posicoes[copias])
+    chaves_conflitantes = pd.unique(chaves[conflitantes]).size
+    return originais, posicoes[conflitantes], chaves_conflitantes
+
+
+def _ler_pickles(caminho):
+    """
+    Lê em sequência os objetos gravados com pickle.dump em um arquivo
+    """
+    if caminho is None or not os.path.exists(caminho):
+        return
+    with open(caminho, 'rb') as arquivo:
+        while True:
+            try:
+                yield pickle.load(arquivo)
+            except EOFError:
+                return
+
+
+class QualidadeParcial:
+    """
+    Estado mesclável da verificação de qualidade, calculado lote a lote
+    como os AgregadosParciais: por linha só a assinatura (hash da chave
+    Carga/Pedido/Cód., hash do conteúdo e posição no arquivo), por
+    fornecedor os momentos da cobertura e do saldo, e as linhas
+    descartadas na limpeza. Texto das linhas apontadas só é lido em
+    avaliar(), de novo lote a lote.
+
+    Com `pasta` (modo em lotes), assinaturas e descartadas dos lotes
+    mesclados vão para arquivos temporários, como os DetalhesEmDisco, e
+    em memória ficam só os momentos por fornecedor.
+    """
+
+    def __init__(self, pasta=None):
+        self.chaves = []
+        self.conteudos = []
+        self.posicoes = []
+        self.momentos = {tipo: None for tipo in INDICADORES_OUTLIER}
+        self.descartadas = []
+        self.particoes = None
+        self.arquivo_descartadas = None
+        self.descartadas_em_disco = 0
+        if pasta is not None:
+            self.particoes = []
+            for _ in range(PARTICOES_ASSINATURAS):
+                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.assinaturas', dir=pasta)
+                temp_file.close()
+                self.particoes.append(temp_file.name)
+            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.descartadas', dir=pasta)
+            temp_file.close()
+            self.arquivo_descartadas = temp_file.name
+
+    @classmethod
+    def de_dataframe(cls, agenda, descartadas):
+        """
+        Estado de um lote da agenda limpa (COLUNAS_DETALHE) e das suas
+        linhas descartadas; os índices são a posição da linha no arquivo
+        """
+        parcial = cls()
+        parcial.chaves.append(hash_linhas(agenda, COLUNAS_CHAVE))
+        parcial.conteudos.append(hash_linhas(agenda, COLUNAS_CONTEUDO))
+        parcial.posicoes.append(np.asarray(agenda.index, dtype=np.int64))
+        for tipo, coluna in INDICADORES_OUTLIER.items():
+            parcial.momentos[tipo] = _momentos(agenda[coluna].astype(np.float64), agenda['Fornecedor'])
+        parcial.descartadas.append(descartadas[COLUNAS_DETALHE])
+        return parcial
+
+    def mesclar(self, outro):
+        """
+        Incorpora o estado de um lote posterior a este (in-place) e retorna self
+        """
+        for tipo in INDICADORES_OUTLIER:
+            self.momentos[tipo] = _combinar_momentos(self.momentos[tipo], outro.momentos[tipo])
+        if self.particoes is None:
+            self.chaves += outro.chaves
+            self.conteudos += outro.conteudos
+            self.posicoes += outro.posicoes
+            self.descartadas += outro.descartadas
+        else:
+            self._gravar(outro)
+        return self
+
+    def _gravar(self, outro):
+        """
+        Acrescenta assinaturas e descartadas de um estado em memória aos arquivos
+        """
+        assinaturas = np.empty(sum(len(chaves) for chaves in outro.chaves), dtype=TIPO_ASSINATURA)
+        assinaturas['chave'] = _concatenar(outro.chaves, np.uint64)
+        assinaturas['conteudo'] = _concatenar(outro.conteudos, np.uint64)
+        assinaturas['posicao'] = _concatenar(outro.posicoes, np.int64)
+        particao = assinaturas['chave'] % np.uint64(len(self.particoes))
+        for numero, caminho in enumerate(self.particoes):
+            with open(caminho, 'ab') as arquivo:
+                assinaturas[particao == numero].tofile(arquivo)
+
+        with open(self.arquivo_descartadas, 'ab') as arquivo:
+            for descartadas in outro.descartadas:
+                if len(descartadas):
+                    pickle.dump(descartadas, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+                    self.descartadas_em_disco += len(descartadas)
+
+    def _iterar_descartadas(self):
+        yield from self.descartadas
+        yield from _ler_pickles(self.arquivo_descartadas)
+
+    def _iterar_particoes(self):
+        """
+        Assinaturas (chaves, conteúdos, posições) em grupos que contêm todas
+        as linhas de cada chave: uma partição em disco por vez, ou tudo junto
+        """
+        if self.particoes is None:
+            yield (_concatenar(self.chaves, np.uint64), _concatenar(self.conteudos, np.uint64),
+                   _concatenar(self.posicoes, np.int64))
+            return
+        for caminho in self.particoes:
+            assinaturas = np.fromfile(caminho, dtype=TIPO_ASSINATURA)
+            yield assinaturas['chave'], assinaturas['conteudo'], assinaturas['posicao']
+
+    def assinaturas(self):
+        """
+        Assinatura de todas as linhas (TIPO_ASSINATURA), na ordem do arquivo;
+        é o que a análise incremental compara com as linhas da base
+        """
+        partes = []
+        for chaves, conteudos, posicoes in self._iterar_particoes():
+            parte = np.empty(len(chaves), dtype=TIPO_ASSINATURA)
+            parte['chave'], parte['conteudo'], parte['posicao'] = chaves, conteudos, posicoes
+            partes.append(parte)
+        assinaturas = np.concatenate(partes)
+        return assinaturas[np.argsort(assinaturas['posicao'], kind='stable')]
+
+    def descartar(self):
+        """
+        Remove os arquivos temporários do estado em disco
+        """
+        for caminho in (self.particoes or []) + [self.arquivo_descartadas]:
+            if caminho is not None and os.path.exists(caminho):
+                os.remove(caminho)
+        self.particoes = [] if self.particoes is not None else None
+        self.arquivo_descartadas = None
+
+    def deslocar(self, deslocamento):
+        """
+        Soma `deslocamento` às posições das linhas (in-place), como
+        AgregadosParciais.deslocar_ordem; retorna self
+        """
+        self.posicoes = [posicoes + deslocamento for posicoes in self.posicoes]
+        for descartadas in self.descartadas:
+            descartadas.index = descartadas.index + deslocamento
+        return self
+
+    @property
+    def total_descartadas(self):
+        return sum(len(descartadas) for descartadas in self.descartadas) + self.descartadas_em_disco
+
+    def avaliar(self, lotes, com_linhas=True, com_linhas_descartadas=True):
+        """
+        Fecha a verificação: uma passada vetorizada sobre as assinaturas
+        acha as linhas com a mesma chave, separando as cópias idênticas (que
+        inflam o saldo) das chaves com conteúdo diferente; a segunda passada,
+        sobre `lotes` (a agenda limpa de novo, DataFrames com COLUNAS_DETALHE,
+        índice = posição no arquivo), calcula o z-score da cobertura e do
+        saldo dentro do fornecedor e traz as linhas apontadas. Completam o
+        relatório as linhas descartadas, com o motivo. Em um lote de arquivos as posições não
+        identificam o arquivo, e `com_linhas`/`com_linhas_descartadas` são
+        falsos.
+        """
+        # Duplicidade: a cópia idêntica repete chave e conteúdo de uma linha anterior.
+        # Todas as linhas de uma chave estão na mesma partição.
+        linhas_avaliadas, chaves_repetidas = 0, 0
+        originais, posicoes_conflitantes = [], []
+        for chaves, conteudos, posicoes in self._iterar_particoes():
+            originais_particao, conflitantes_particao, chaves_particao = _repeticoes(chaves, conteudos, posicoes)
+            originais.append(originais_particao)
+            posicoes_conflitantes.append(conflitantes_particao)
+            linhas_avaliadas += len(chaves)
+            chaves_repetidas += chaves_particao
+        originais = pd.concat(originais)
+        posicoes_conflitantes = np.concatenate(posicoes_conflitantes)
+
+        estatisticas = {}
+        for tipo, momentos in self.momentos.items():
+            if momentos is None:
+                momentos = pd.DataFrame(columns=['n', 'media', 'm2'], dtype=np.float64)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                desvio = np.sqrt(momentos['m2'] / (momentos['n'] - 1)).where(momentos['n'] > 1)
+            estatisticas[tipo] = pd.DataFrame({'media': momentos['media'], 'desvio': desvio})
+
+        # Segunda leitura, lote a lote: só as linhas apontadas ficam em memória
+        encontradas = {tipo: [] for tipo in [DUPLICADA, CHAVE_REPETIDA, *INDICADORES_OUTLIER]}
+        for lote in lotes:
+            posicoes = np.asarray(lote.index, dtype=np.int64)
+            encontradas[DUPLICADA].append(lote[np.isin(posicoes, originais.index)])
+            encontradas[CHAVE_REPETIDA].append(lote[np.isin(posicoes, posicoes_conflitantes)])
+
+            # Linhas atípicas: |z| acima do limite na distribuição do próprio fornecedor
+            for tipo, coluna in INDICADORES_OUTLIER.items():
+                valores = lote[coluna].to_numpy(dtype=np.float64)
+                por_linha = estatisticas[tipo].reindex(lote['Fornecedor'].to_numpy())
+                media, desvio = por_linha['media'].to_numpy(), por_linha['desvio'].to_numpy()
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    z = (valores - media) / desvio
+                fora = np.abs(np.where(desvio > 0, z, 0.0)) > LIMITE_Z
+                encontradas[tipo].append(lote[fora].assign(valor=valores[fora], media=media[fora], z=z[fora]))
+
+        def na_ordem(tipo):
+            partes = encontradas[tipo]
+            df = pd.concat(partes) if partes else descartadas_vazias()
+            return df.sort_index(kind='stable')
+
+        partes = []
+        duplicadas = na_ordem(DUPLICADA)
+        saldo_duplicadas = duplicadas['Saldo Pedido'].to_numpy(dtype=np.float64)
+        partes.append(_ocorrencias(
+            DUPLICADA, duplicadas, _linhas(duplicadas.index, com_linhas), valor=saldo_duplicadas,
+            detalhe=[f'Cópia da linha {linha:.0f}' if not np.isnan(linha) else 'Cópia de outra linha'
+                     for linha in _linhas(originais.reindex(duplicadas.index).to_numpy(), com_linhas)]
+        ))
+        repetidas = na_ordem(CHAVE_REPETIDA)
+        partes.append(_ocorrencias(
+            CHAVE_REPETIDA, repetidas, _linhas(repetidas.index, com_linhas),
+            valor=repetidas['Saldo Pedido'].to_numpy(dtype=np.float64),
+            detalhe='Mesma Carga/Pedido/Cód. com valores diferentes'
+        ))
+        atipicas = {}
+        for tipo in INDICADORES_OUTLIER:
+            linhas_atipicas = na_ordem(tipo)
+            atipicas[tipo] = len(linhas_atipicas)
+            valor, media, z = (linhas_atipicas[nome].to_numpy() if nome in linhas_atipicas else np.nan
+                               for nome in ('valor', 'media', 'z'))
+            partes.append(_ocorrencias(
+                tipo, linhas_atipicas, _linhas(linhas_atipicas.index, com_linhas), valor=valor, media=media, z=z,
+                detalhe=f'|z| > {LIMITE_Z:g} no fornecedor'
+            ))
+
+        descartadas = list(self._iterar_descartadas())
+        descartadas = pd.concat(descartadas) if descartadas else descartadas_vazias()
+        partes.append(_ocorrencias(
+            DESCARTADA, descartadas, _linhas(descartadas.index, com_linhas_descartadas),
+            valor=descartadas['Saldo Pedido'].to_numpy(dtype=np.float64), detalhe=motivos_descarte(descartadas)
+        ))
+
+        contagens = {
+            'linhas_avaliadas': linhas_avaliadas,
+            'linhas_duplicadas': len(originais),
+            'saldo_duplicado': float(np.nansum(saldo_duplicadas)),
+            'chaves_repetidas': int(chaves_repetidas),
+            'cobertura_atipica': atipicas[OUTLIER_COBERTURA],
+            'saldo_atipico': atipicas[OUTLIER_SALDO],
+            'limite_z': LIMITE_Z,
+            'linhas_descartadas': len(descartadas),
+            'descartes_por_motivo': {
+                rotulo: int(quantidade) for rotulo, quantidade in zip(
+                    [MOTIVOS_DESCARTE[coluna] for coluna in COLUNAS_OBRIGATORIAS],
+                    descartadas[COLUNAS_OBRIGATORIAS].isna().sum().to_numpy()
+                )
+            },
+        }
+        return RelatorioQualidade(contagens, pd.concat(partes, ignore_index=True))
+
+
+def descartadas_vazias():
+    """
+    DataFrame sem linhas com as colunas de detalhe (nenhum descarte)
+    """
+    return pd.DataFrame(columns=COLUNAS_DETALHE)
@@ -0,0 +1,145 @@
+import numpy as np
+
+# Compressão do t-digest: ~metade disso em centroides por grupo
+COMPRESSAO_PADRAO = 200
+
+# Quantis de cobertura exibidos nos relatórios
+QUANTIS_COBERTURA = {'p50': 0.50, 'p90': 0.90, 'p99': 0.99}
+
+
+def _escala_k(q, compressao):
+    """
+    Função de escala k1 do t-digest: centroides menores nas caudas
+    """
+    return compressao / (2 * np.pi) * np.arcsin(2 * np.clip(q, 0.0, 1.0) - 1)
+
+
+class TDigest:
+    """
+    Esboço mesclável de quantis (t-digest) com centroides (média, peso).
+
+    Pode ser montado por lote, combinado entre lotes/processos com mesclar()
+    e consultado com quantil(); o erro é menor nas caudas (p90/p99).
+    """
+
+    def __init__(self, compressao=COMPRESSAO_PADRAO):
+        self.compressao = compressao
+        self.medias = np.empty(0)
+        self.pesos = np.empty(0)
+        self.minimo = np.inf
+        self.maximo = -np.inf
+
+    @classmethod
+    def de_valores(cls, valores, compressao=COMPRESSAO_PADRAO):
+        """
+        Cria o esboço a partir de valores soltos
+        """
+        valores = np.asarray(valores, dtype=np.float64)
+        valores = np.sort(valores[~np.isnan(valores)])
+        return cls.de_ordenados(valores, compressao)
+
+    @classmethod
+    def de_ordenados(cls, valores, compressao=COMPRESSAO_PADRAO):
+        """
+        Cria o esboço a partir de valores já ordenados (sem NaN)
+        """
+        digest = cls(compressao)
+        if len(valores):
+            digest._comprimir(valores, np.ones(len(valores)))
+            digest.minimo = float(valores[0])
+            digest.maximo = float(valores[-1])
+        return digest
+
+    @property
+    def total(self):
+        return float(self.pesos.sum())
+
+    def _comprimir(self, medias, pesos):
+        """
+        Agrupa centroides ordenados em faixas de largura unitária na escala k
+        """
+        acumulado = np.cumsum(pesos)
+        total = acumulado[-1]
+        q_esquerda = (acumulado - pesos) / total
+        faixa = np.floor(_escala_k(q_esquerda, self.compressao) - _escala_k(0.0, self.compressao)).astype(np.int64)
+        faixa = np.unique(faixa, return_inverse=True)[1]
+
+        soma_pesos = np.bincount(faixa, weights=pesos)
+        self.medias = np.bincount(faixa, weights=medias * pesos) / soma_pesos
+        self.pesos = soma_pesos
+
+    def mesclar(self, outro):
+        """
+        Incorpora outro esboço a este (in-place) e retorna self
+        """
+        if len(outro.pesos) == 0:
+            return self
+        medias = np.concatenate([self.medias, outro.medias])
+        pesos = np.concatenate([self.pesos, outro.pesos])
+        ordem = np.argsort(medias, kind='stable')
+        self._comprimir(medias[ordem], pesos[ordem])
+        self.minimo = min(self.minimo, outro.minimo)
+        self.maximo = max(self.maximo, outro.maximo)
+        return self
+
+    def quantil(self, q):
+        """
+        Estima o quantil q (0 a 1) interpolando entre os centros dos centroides
+        """
+        if len(self.pesos) == 0:
+            return float('nan')
+        if len(self.pesos) == 1:
+            return float(self.medias[0])
+
+        # Posições no mesmo referencial do np.quantile (0 a n-1), exato para centroides unitários
+        ultimo = self.pesos.sum() - 1
+        alvo = q * ultimo
+        centros = np.cumsum(self.pesos) - self.pesos / 2 - 0.5
+
+        if alvo <= centros[0]:
+            if self.pesos[0] <= 1:
+                return float(self.medias[0])
+            return float(self.minimo + (self.medias[0] - self.minimo) * alvo / centros[0])
+        if alvo >= centros[-1]:
+            if self.pesos[-1] <= 1:
+                return float(self.medias[-1])
+            fracao = (alvo - centros[-1]) / (ultimo - centros[-1])
+            return float(self.medias[-1] + (self.maximo - self.medias[-1]) * fracao)
+
+        i = np.searchsorted(centros, alvo, side='right') - 1
+        fracao = (alvo - centros[i]) / (centros[i + 1] - centros[i])
+        return float(self.medias[i] + (self.medias[i + 1] - self.medias[i]) * fracao)
+
+
+def digests_por_grupo(linhas, grupos, valores, compressao=COMPRESSAO_PADRAO):
+    """
+    Monta um t-digest por grupo com uma única ordenação do lote.
+    `linhas` traz o índice (em `grupos`) do grupo de cada linha;
+    retorna dict grupo -> TDigest.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    validos = (linhas >= 0) & ~np.isnan(valores)
+    linhas, valores = linhas[validos], valores[validos]
+    if len(valores) == 0:
+        return {}
+
+    ordem = np.lexsort((valores, linhas))
+    linhas, valores = linhas[ordem], valores[ordem]
+    limites = np.flatnonzero(np.diff(linhas)) + 1
+    inicios = np.concatenate([[0], limites])
+    fins = np.concatenate([limites, [len(linhas)]])
+
+    return {grupos[linhas[inicio]]: TDigest.de_ordenados(valores[inicio:fim], compressao)
+            for inicio, fim in zip(inicios, fins)}
+
+
+def mesclar_digests(destino, origem):
+    """
+    Mescla um dict chave -> TDigest em outro (in-place)
+    """
+    for chave, digest in origem.items():
+        if chave in destino:
+            destino[chave].mesclar(digest)
+        else:
+            destino[chave] = digest
+    return destino
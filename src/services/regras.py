@@ -0,0 +1,104 @@
+import os
+import json
+import numpy as np
+
+# Decisões possíveis e o rótulo exibido nos relatórios
+APROVAR = 'aprovar'
+REVISAR = 'revisar'
+REJEITAR = 'rejeitar'
+ROTULOS_RECOMENDACAO = {
+    APROVAR: "✅ APROVAR",
+    REVISAR: "⚠️ REVISAR",
+    REJEITAR: "❌ REJEITAR",
+}
+
+# Regras por tabela agregada: cada regra é (decisão, expressão sobre as colunas
+# da tabela); vale a primeira expressão verdadeira e, se nenhuma for, o padrão.
+REGRAS_PADRAO = {
+    'fornecedores': {
+        'regras': [
+            [REJEITAR, 'perc_acima_71 > 50 or cobertura_media > 100'],
+            [REVISAR, 'perc_acima_71 > 25 or cobertura_media > 70'],
+        ],
+        'padrao': APROVAR,
+    },
+    'filiais': {
+        'regras': [
+            [REJEITAR, 'perc_acima_71 > 50'],
+            [REVISAR, 'perc_acima_71 > 25'],
+        ],
+        'padrao': APROVAR,
+    },
+    'pares': {
+        'regras': [
+            [REJEITAR, 'perc_acima_71 > 50'],
+            [REVISAR, 'perc_acima_71 > 25'],
+        ],
+        'padrao': APROVAR,
+    },
+    'faixas_valor': {
+        'regras': [
+            [APROVAR, 'cobertura_media <= 44'],
+            [REVISAR, 'cobertura_media <= 70'],
+        ],
+        'padrao': REJEITAR,
+    },
+    'faixas_valor_pares': {
+        'regras': [
+            [APROVAR, 'cobertura_media <= 44'],
+            [REVISAR, 'cobertura_media <= 70'],
+        ],
+        'padrao': REJEITAR,
+    },
+}
+
+# Arquivo JSON opcional que substitui as regras de uma ou mais tabelas
+ARQUIVO_REGRAS = os.environ.get('ANALISE_REGRAS')
+
+
+class ConjuntoRegras:
+    """
+    Regras de recomendação de uma tabela, avaliadas de uma vez sobre todas
+    as linhas (DataFrame.eval + np.select), sem laço por grupo
+    """
+
+    def __init__(self, regras, padrao):
+        for decisao in [d for d, _ in regras] + [padrao]:
+            if decisao not in ROTULOS_RECOMENDACAO:
+                raise ValueError(f"Decisão desconhecida nas regras: {decisao}")
+        self.decisoes = [decisao for decisao, _ in regras]
+        self.expressoes = [expressao for _, expressao in regras]
+        self.padrao = padrao
+
+    def classificar(self, tabela):
+        """
+        Retorna a decisão de cada linha da tabela (array de strings)
+        """
+        if len(tabela) == 0 or not self.expressoes:
+            return np.full(len(tabela), self.padrao, dtype=object)
+        condicoes = [np.asarray(tabela.eval(expressao), dtype=bool) for expressao in self.expressoes]
+        return np.select(condicoes, self.decisoes, default=self.padrao).astype(object)
+
+
+def carregar_regras(caminho=ARQUIVO_REGRAS):
+    """
+    Monta os conjuntos de regras padrão, sobrepondo as tabelas definidas no arquivo JSON
+    """
+    definicoes = dict(REGRAS_PADRAO)
+    if caminho:
+        with open(caminho, encoding='utf-8') as arquivo:
+            definicoes.update(json.load(arquivo))
+    return {tabela: ConjuntoRegras(d['regras'], d['padrao']) for tabela, d in definicoes.items()}
+
+
+REGRAS = carregar_regras()
+
+
+def aplicar_regras(nome_tabela, tabela, regras=None):
+    """
+    Acrescenta a coluna 'recomendacao' (aprovar/revisar/rejeitar) a uma tabela agregada
+    """
+    regras = regras or REGRAS
+    tabela = tabela.copy()
+    tabela['recomendacao'] = regras[nome_tabela].classificar(tabela)
+    return tabela
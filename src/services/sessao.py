@@ -0,0 +1,212 @@
+from collections import defaultdict
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert, select, tuple_, update
+from sqlalchemy.exc import SQLAlchemyError
+from src.models.user import db
+from src.models.sessao import DECISOES_SESSAO, SessaoAprovacao, ItemSessao, TotalGrupoSessao
+from src.services.agregados import FAIXAS_VALOR, classificar_faixas_valor
+from src.services.detalhes import dataframe_detalhes
+from src.services.estado import carregar_estado
+from src.services.regras import aplicar_regras
+
+# Agrupamentos com totais na sessão: tipo -> coluna do item
+GRUPOS_SESSAO = {'fornecedor': 'fornecedor', 'filial': 'filial', 'faixa': 'nome_faixa'}
+
+NOMES_FAIXAS = np.array([faixa['nome'] for faixa in FAIXAS_VALOR], dtype=object)
+
+
+def _textos(serie):
+    """
+    Carga, Pedido e Cód. como texto (números inteiros sem o '.0')
+    """
+    def texto(valor):
+        if pd.isna(valor):
+            return None
+        if isinstance(valor, float) and valor.is_integer():
+            return str(int(valor))
+        return str(valor)
+    return [texto(valor) for valor in serie]
+
+
+def _colunas_totais(itens, valor, decisao):
+    return {f'itens_{decisao}': itens, f'valor_{decisao}': valor}
+
+
+def _totais_por_decisao(linhas, coluna):
+    """
+    Itens e saldo por grupo e decisão, no formato das colunas de TotaisDecisao
+    """
+    somas = linhas.groupby([coluna, 'decisao'])['saldo'].agg(['size', 'sum']).unstack('decisao', fill_value=0)
+    somas = somas.reindex(columns=pd.MultiIndex.from_product([['size', 'sum'], DECISOES_SESSAO]), fill_value=0)
+    somas.columns = [f"{'itens' if medida == 'size' else 'valor'}_{decisao}" for medida, decisao in somas.columns]
+    return somas
+
+
+def abrir_sessao(nome_analise):
+    """
+    Cria a sessão de aprovação de uma análise salva: cada item começa com a
+    recomendação do seu fornecedor, e os totais por fornecedor, filial e
+    faixa de valor são calculados uma vez aqui
+    """
+    agregados, detalhes = carregar_estado(nome_analise)
+    recomendacoes = aplicar_regras('fornecedores', agregados.tabela_fornecedores())['recomendacao']
+    itens = dataframe_detalhes(detalhes)
+
+    saldo = itens['Saldo Pedido'].to_numpy(dtype=np.float64)
+    faixa = classificar_faixas_valor(saldo)
+    linhas = pd.DataFrame({
+        'posicao': np.arange(len(itens)),
+        'carga': _textos(itens['Carga']),
+        'pedido': _textos(itens['Pedido']),
+        'codigo': _textos(itens['Cód.']),
+        'fornecedor': itens['Fornecedor'].astype(str).to_numpy(),
+        'filial': itens['Filial'].astype(str).to_numpy(),
+        'mercadoria': itens['Mercadoria'].astype(str).to_numpy(),
+        'faixa': faixa,
+        'saldo': np.where(np.isnan(saldo), 0.0, saldo),
+        'cobertura': itens['Cobertura Atual'].to_numpy(dtype=np.float64),
+        'decisao': itens['Fornecedor'].map(recomendacoes).to_numpy(),
+    })
+    linhas['nome_faixa'] = np.where(faixa >= 0, NOMES_FAIXAS[np.maximum(faixa, 0)], None)
+
+    agora = datetime.now()
+    try:
+        sessao = SessaoAprovacao(
+            analise=nome_analise, criada=agora, atualizada=agora,
+            **_totais_por_decisao(linhas.assign(sessao=0), 'sessao').iloc[0].to_dict()
+        )
+        db.session.add(sessao)
+        db.session.flush()
+
+        db.session.execute(
+            insert(ItemSessao),
+            linhas.drop(columns='nome_faixa').assign(sessao_id=sessao.id).to_dict('records')
+        )
+        for tipo, coluna in GRUPOS_SESSAO.items():
+            totais = _totais_por_decisao(linhas[linhas[coluna].notna()], coluna)
+            totais = totais.rename_axis('grupo').reset_index().assign(sessao_id=sessao.id, tipo=tipo)
+            db.session.execute(insert(TotalGrupoSessao), totais.to_dict('records'))
+        db.session.commit()
+        return sessao
+    except SQLAlchemyError:
+        db.session.rollback()
+        raise
+
+
+def obter_sessao(id_sessao):
+    """
+    Sessão pelo id, ou None
+    """
+    return db.session.get(SessaoAprovacao, id_sessao)
+
+
+def _travar_sessao(sessao):
+    """
+    Trava a sessão para escrita antes de ler os itens, para que decisões
+    concorrentes não partam da mesma leitura. No SQLite a trava é a da base
+    inteira (BEGIN IMMEDIATE); nos demais, a linha da sessão (FOR UPDATE).
+    """
+    conexao = db.session.connection()
+    if conexao.dialect.name == 'sqlite':
+        if not conexao.connection.dbapi_connection.in_transaction:
+            conexao.exec_driver_sql('BEGIN IMMEDIATE')
+        return
+    db.session.execute(select(SessaoAprovacao.id).where(SessaoAprovacao.id == sessao.id).with_for_update())
+
+
+def decidir(sessao, decisao, itens=None, fornecedor=None):
+    """
+    Aplica a decisão aos itens dados (ids) ou a todos os itens de um
+    fornecedor. Cada item que muda de decisão ajusta em O(1) os totais do
+    seu fornecedor, filial e faixa e os da sessão, sempre como expressões
+    SQL sob a trava da sessão. Retorna (quantidade de itens alterados,
+    totais dos grupos afetados).
+    """
+    if decisao not in DECISOES_SESSAO:
+        raise ValueError(f"Decisão desconhecida: {decisao}")
+
+    filtros = [ItemSessao.sessao_id == sessao.id, ItemSessao.decisao != decisao]
+    if itens is not None:
+        filtros.append(ItemSessao.id.in_(itens))
+    if fornecedor is not None:
+        filtros.append(ItemSessao.fornecedor == fornecedor)
+
+    try:
+        _travar_sessao(sessao)
+        alterados = db.session.execute(
+            select(ItemSessao.fornecedor, ItemSessao.filial, ItemSessao.faixa, ItemSessao.saldo, ItemSessao.decisao)
+            .where(*filtros)
+        ).all()
+        if not alterados:
+            db.session.rollback()
+            return 0, []
+
+        # Variação de (itens, valor) por grupo e decisão
+        variacoes = defaultdict(lambda: defaultdict(lambda: [0, 0.0]))
+        for item in alterados:
+            grupos = [('fornecedor', item.fornecedor), ('filial', item.filial)]
+            if item.faixa >= 0:
+                grupos.append(('faixa', NOMES_FAIXAS[item.faixa]))
+            for chave in grupos + [None]:
+                anterior, nova = variacoes[chave][item.decisao], variacoes[chave][decisao]
+                anterior[0] -= 1
+                anterior[1] -= item.saldo
+                nova[0] += 1
+                nova[1] += item.saldo
+
+        for chave, por_decisao in variacoes.items():
+            tabela = SessaoAprovacao if chave is None else TotalGrupoSessao
+            valores = {}
+            for decisao_grupo, (itens_grupo, valor_grupo) in por_decisao.items():
+                for nome, variacao in _colunas_totais(itens_grupo, valor_grupo, decisao_grupo).items():
+                    valores[nome] = getattr(tabela, nome) + variacao
+            if chave is None:
+                valores['atualizada'] = datetime.now()
+                db.session.execute(update(SessaoAprovacao).where(SessaoAprovacao.id == sessao.id).values(valores))
+                continue
+            db.session.execute(
+                update(TotalGrupoSessao)
+                .where(TotalGrupoSessao.sessao_id == sessao.id, TotalGrupoSessao.tipo == chave[0],
+                       TotalGrupoSessao.grupo == chave[1])
+                .values(valores)
+            )
+
+        db.session.execute(update(ItemSessao).where(*filtros).values(decisao=decisao))
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        raise
+
+    afetados = [chave for chave in variacoes if chave is not None]
+    return len(alterados), totais_grupos(sessao, afetados)
+
+
+def totais_grupos(sessao, grupos=None, tipo=None):
+    """
+    Totais por grupo da sessão: todos, só de um `tipo` ou só os pares (tipo, grupo) dados
+    """
+    consulta = TotalGrupoSessao.query.filter(TotalGrupoSessao.sessao_id == sessao.id)
+    if tipo is not None:
+        consulta = consulta.filter(TotalGrupoSessao.tipo == tipo)
+    if grupos is not None:
+        consulta = consulta.filter(tuple_(TotalGrupoSessao.tipo, TotalGrupoSessao.grupo).in_(list(grupos)))
+    return consulta.order_by(TotalGrupoSessao.id).all()
+
+
+def listar_itens(sessao, decisao=None, fornecedor=None, filial=None, limite=None, inicio=0):
+    """
+    Itens da sessão, da maior para a menor cobertura, com filtros opcionais
+    """
+    consulta = ItemSessao.query.filter(ItemSessao.sessao_id == sessao.id)
+    if decisao is not None:
+        consulta = consulta.filter(ItemSessao.decisao == decisao)
+    if fornecedor is not None:
+        consulta = consulta.filter(ItemSessao.fornecedor == fornecedor)
+    if filial is not None:
+        consulta = consulta.filter(ItemSessao.filial == filial)
+    consulta = consulta.order_by(ItemSessao.cobertura.desc(), ItemSessao.posicao).offset(inicio)
+    if limite is not None:
+        consulta = consulta.limit(limite)
+    return consulta
@@ -1,5 +1,5 @@
 // Variáveis globais
-let selectedFile = null;
+let selectedFiles = [];
 let downloadUrl = null;
 
 // Inicialização quando a página carrega
@@ -25,9 +25,9 @@ function initializeEventListeners() {
 }
 
 function handleFileSelect(event) {
-    const file = event.target.files[0];
-    if (file) {
-        validateAndShowFile(file);
+    const files = event.target.files;
+    if (files.length > 0) {
+        validateAndShowFiles(files);
     }
 }
 
@@ -50,41 +50,51 @@ function handleDrop(event) {
     
     const files = event.dataTransfer.files;
     if (files.length > 0) {
-        validateAndShowFile(files[0]);
+        validateAndShowFiles(files);
     }
 }
 
-function validateAndShowFile(file) {
+// Vários arquivos (um por CD) são processados como uma análise consolidada
+function validateAndShowFiles(files) {
+    const arquivos = Array.from(files);
+    if (!arquivos.every(validateFile)) {
+        return;
+    }
+    
+    selectedFiles = arquivos;
+    showFileInfo(arquivos);
+    hideError();
+}
+
+function validateFile(file) {
     // Validar tipo de arquivo
     const allowedTypes = ['application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'application/vnd.ms-excel'];
-    const allowedExtensions = ['.xlsx', '.xls'];
+    const allowedExtensions = ['.xlsx', '.xls', '.csv', '.parquet'];
     
     const fileExtension = '.' + file.name.split('.').pop().toLowerCase();
     
     if (!allowedTypes.includes(file.type) && !allowedExtensions.includes(fileExtension)) {
-        showError('Tipo de arquivo não permitido. Use apenas arquivos .xlsx ou .xls');
-        return;
+        showError('Tipo de arquivo não permitido. Use arquivos .xlsx, .xls, .csv ou .parquet');
+        return false;
     }
     
     // Validar tamanho (50MB)
     const maxSize = 50 * 1024 * 1024;
     if (file.size > maxSize) {
         showError('Arquivo muito grande. O tamanho máximo é 50MB');
-        return;
+        return false;
     }
     
-    selectedFile = file;
-    showFileInfo(file);
-    hideError();
+    return true;
 }
 
-function showFileInfo(file) {
+function showFileInfo(files) {
     const fileInfo = document.getElementById('fileInfo');
     const fileName = document.getElementById('fileName');
     const fileSize = document.getElementById('fileSize');
     
-    fileName.textContent = file.name;
-    fileSize.textContent = formatFileSize(file.size);
+    fileName.textContent = files.length === 1 ? files[0].name : `${files.length} arquivos: ${files.map(file => file.name).join(', ')}`;
+    fileSize.textContent = formatFileSize(files.reduce((total, file) => total + file.size, 0));
     
     fileInfo.classList.remove('d-none');
 }
@@ -98,13 +108,13 @@ function formatFileSize(bytes) {
 }
 
 async function uploadFile() {
-    if (!selectedFile) {
+    if (selectedFiles.length === 0) {
         showError('Nenhum arquivo selecionado');
         return;
     }
     
     const formData = new FormData();
-    formData.append('file', selectedFile);
+    selectedFiles.forEach(file => formData.append('file', file));
     
     // Mostrar loading
     showLoading();
@@ -112,7 +122,8 @@ async function uploadFile() {
     hideSuccess();
     
     try {
-        const response = await fetch('/api/analise/upload', {
+        // Inicia a análise em segundo plano e acompanha o progresso
+        const response = await fetch('/api/analise/iniciar', {
             method: 'POST',
             body: formData
         });
@@ -120,21 +131,80 @@ async function uploadFile() {
         const result = await response.json();
         
         if (response.ok) {
-            downloadUrl = result.download_url;
-            showResults(result.resumo);
-            showSuccess('Arquivo processado com sucesso!');
-            document.getElementById('downloadBtn').style.display = 'inline-block';
+            acompanharProgresso(result.progresso_url);
         } else {
             showError(result.error || 'Erro ao processar arquivo');
+            hideLoading();
         }
         
     } catch (error) {
         showError('Erro de conexão: ' + error.message);
-    } finally {
         hideLoading();
     }
 }
 
+function acompanharProgresso(progressoUrl) {
+    const eventos = new EventSource(progressoUrl);
+    let resumoExibido = false;
+    
+    eventos.addEventListener('verificacao', (event) => {
+        const dados = JSON.parse(event.data);
+        if (dados.linhas) {
+            setLoadingMessage(`Arquivo com ${dados.linhas.toLocaleString('pt-BR')} linhas. Lendo dados...`);
+        }
+    });
+    
+    eventos.addEventListener('leitura', (event) => {
+        const dados = JSON.parse(event.data);
+        if (dados.arquivos_lidos !== undefined) {
+            setLoadingMessage(`${dados.arquivos_lidos} de ${dados.total_arquivos} arquivos lidos...`);
+        } else {
+            setLoadingMessage(`${dados.linhas_lidas.toLocaleString('pt-BR')} linhas lidas...`);
+        }
+    });
+    
+    eventos.addEventListener('agregacao', (event) => {
+        const dados = JSON.parse(event.data);
+        setLoadingMessage(`${dados.fornecedores} fornecedores e ${dados.filiais} filiais agregados...`);
+    });
+    
+    // O resumo chega antes da planilha: exibe já, enquanto o Excel é gerado
+    eventos.addEventListener('resumo', (event) => {
+        showResults(JSON.parse(event.data).resumo);
+        resumoExibido = true;
+    });
+    
+    eventos.addEventListener('planilha', (event) => {
+        const dados = JSON.parse(event.data);
+        setLoadingMessage(`Gerando planilha (${dados.concluidas}/${dados.total}): ${dados.aba}`);
+    });
+    
+    eventos.addEventListener('concluido', (event) => {
+        const dados = JSON.parse(event.data);
+        eventos.close();
+        downloadUrl = dados.download_url;
+        if (!resumoExibido) {
+            showResults(dados.resumo);
+        }
+        showSuccess('Arquivo processado com sucesso!');
+        document.getElementById('downloadBtn').style.display = 'inline-block';
+        hideLoading();
+    });
+    
+    eventos.addEventListener('erro', (event) => {
+        eventos.close();
+        showError(JSON.parse(event.data).error || 'Erro ao processar arquivo');
+        hideLoading();
+    });
+    
+    eventos.onerror = () => {
+        if (eventos.readyState === EventSource.CLOSED) {
+            showError('Conexão com o servidor perdida');
+            hideLoading();
+        }
+    };
+}
+
 function showResults(resumo) {
     const resultsSection = document.getElementById('resultsSection');
     
@@ -241,6 +311,7 @@ function downloadReport() {
 }
 
 function showLoading() {
+    setLoadingMessage('Processando arquivo... Isso pode levar alguns segundos.');
     document.getElementById('loadingSpinner').style.display = 'block';
     document.getElementById('uploadBtn').disabled = true;
 }
@@ -250,6 +321,10 @@ function hideLoading() {
     document.getElementById('uploadBtn').disabled = false;
 }
 
+function setLoadingMessage(message) {
+    document.getElementById('loadingMessage').textContent = message;
+}
+
 function showError(message) {
     const errorAlert = document.getElementById('errorAlert');
     const errorMessage = document.getElementById('errorMessage');
@@ -0,0 +1,78 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.services.leitura import ABA_AGENDA, STATUS_APROVACAO, filtrar_aprovacao, limpar_agenda
+
+
+def gerar_agenda(linhas=3000, semente=1):
+    """
+    Agenda sintética com o layout do ERP: 40 fornecedores, 7 filiais, outros
+    status, coberturas e mercadorias ausentes (descartadas na limpeza)
+    """
+    rng = np.random.default_rng(semente)
+    fornecedores = [f"FORNECEDOR {i:03d} LTDA" for i in range(40)]
+    filiais = [f"FILIAL {letra}" for letra in "ABCDEFG"]
+    cobertura = rng.gamma(2, 30, linhas).round(1)
+    cobertura[rng.random(linhas) < .02] = np.nan
+    df = pd.DataFrame({
+        'Status': rng.choice([STATUS_APROVACAO, 'Aprovado', 'Cancelado'], linhas, p=[.8, .1, .1]),
+        'Carga': rng.integers(1000, 1400, linhas),
+        'Pedido': rng.integers(50000, 52000, linhas),
+        'Fornecedor': rng.choice(fornecedores, linhas),
+        'Filial': rng.choice(filiais, linhas),
+        'Cód.': rng.integers(1, 900, linhas),
+        'Mercadoria': [f"PRODUTO {i}" for i in rng.integers(1, 900, linhas)],
+        'Quantidade<br />Entrega': rng.integers(1, 500, linhas),
+        'Saldo Pedido': rng.lognormal(7, 1.5, linhas).round(2),
+        'Cobertura Atual': cobertura,
+        'Nota Fiscal': np.where(rng.random(linhas) < .3, np.nan, rng.integers(1, 99999, linhas)),
+    })
+    df.loc[rng.random(linhas) < .01, 'Mercadoria'] = None
+    return df
+
+
+@pytest.fixture(scope='session')
+def agenda_df():
+    return gerar_agenda()
+
+
+@pytest.fixture(scope='session')
+def agenda_limpa(agenda_df):
+    return limpar_agenda(filtrar_aprovacao(agenda_df.copy()))
+
+
+@pytest.fixture(scope='session')
+def agenda(tmp_path_factory, agenda_df):
+    caminho = tmp_path_factory.mktemp('agenda') / 'agenda.xlsx'
+    agenda_df.to_excel(caminho, sheet_name=ABA_AGENDA, index=False)
+    return str(caminho)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """
+    App com o blueprint da análise, banco SQLite e pastas de estado,
+    coalescência e uploads temporários
+    """
+    from flask import Flask
+    from src.models.user import db
+    from src.routes import analise
+    from src.services import coalescencia, estado
+
+    monkeypatch.setattr(estado, 'PASTA_ESTADOS', str(tmp_path / 'estados'))
+    monkeypatch.setattr(coalescencia, 'PASTA_COALESCENCIA', str(tmp_path / 'coalescencia'))
+    monkeypatch.setattr(analise, 'UPLOAD_FOLDER', str(tmp_path))
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'teste.db'}"
+    db.init_app(app)
+    app.register_blueprint(analise.analise_bp, url_prefix='/api/analise')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.services.agregados import AgregadosParciais, codificar_dataframe, combinar_agregados
+from src.services.distintos import CONTAGEM_EXATA
+from src.services.paralelo import agregar_por_filial
+from src.services.quantis import QUANTIS_COBERTURA
+
+TABELAS = ['tabela_fornecedores', 'tabela_filiais', 'tabela_pares', 'tabela_faixas_valor',
+           'tabela_faixas_valor_pares']
+
+
+def comparar_agregados(agregados, esperado):
+    """
+    Mesmas métricas e tabelas; os quantis (t-digest mesclado) com tolerância
+    """
+    assert agregados.metricas_gerais() == pytest.approx(esperado.metricas_gerais())
+    for nome in TABELAS:
+        tabela, tabela_esperada = getattr(agregados, nome)(), getattr(esperado, nome)()
+        quantis = [coluna for coluna in QUANTIS_COBERTURA if coluna in tabela_esperada]
+        pd.testing.assert_frame_equal(tabela.drop(columns=quantis), tabela_esperada.drop(columns=quantis),
+                                      check_dtype=False)
+        for coluna in quantis:
+            np.testing.assert_allclose(tabela[coluna], tabela_esperada[coluna], rtol=0.05)
+
+
+def partes(df, tamanho=400):
+    return [AgregadosParciais.de_dataframe(df.iloc[inicio:inicio + tamanho], CONTAGEM_EXATA)
+            for inicio in range(0, len(df), tamanho)]
+
+
+def test_mesclar_igual_ao_todo(agenda_limpa):
+    esperado = AgregadosParciais.de_dataframe(agenda_limpa, CONTAGEM_EXATA)
+
+    agregados = AgregadosParciais()
+    for parcial in partes(agenda_limpa):
+        agregados.mesclar(parcial)
+
+    comparar_agregados(agregados, esperado)
+
+
+def test_combinar_igual_ao_todo(agenda_limpa):
+    esperado = AgregadosParciais.de_dataframe(agenda_limpa, CONTAGEM_EXATA)
+
+    comparar_agregados(combinar_agregados(partes(agenda_limpa)), esperado)
+
+
+def test_ordem_de_mescla_indiferente(agenda_limpa):
+    esperado = AgregadosParciais.de_dataframe(agenda_limpa, CONTAGEM_EXATA)
+
+    comparar_agregados(combinar_agregados(partes(agenda_limpa)[::-1]), esperado)
+
+
+def test_agregar_por_filial_igual_ao_todo(agenda_limpa, monkeypatch):
+    monkeypatch.setattr('src.services.paralelo.MINIMO_LINHAS_PARALELO', 0)
+    colunas = codificar_dataframe(agenda_limpa)
+
+    agregados = agregar_por_filial(colunas, processos=2, contagem=CONTAGEM_EXATA)
+
+    comparar_agregados(agregados, AgregadosParciais.de_colunas(colunas, CONTAGEM_EXATA))
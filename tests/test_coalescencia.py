@@ -0,0 +1,96 @@
+import fcntl
+import os
+import threading
+
+import pytest
+
+from src.routes import analise
+from src.services import coalescencia
+from src.services.admissao import CapacidadeEsgotada
+from src.services.coalescencia import executar_uma_vez
+
+
+@pytest.fixture(autouse=True)
+def pasta(tmp_path, monkeypatch):
+    monkeypatch.setattr(coalescencia, 'PASTA_COALESCENCIA', str(tmp_path))
+    return tmp_path
+
+
+def trava_livre(pasta, chave):
+    with open(pasta / f'{chave}.lock', 'a') as trava:
+        try:
+            fcntl.flock(trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        fcntl.flock(trava, fcntl.LOCK_UN)
+        return True
+
+
+class Reserva:
+    liberada = False
+
+    def liberar(self):
+        self.liberada = True
+
+
+def test_admissao_antes_da_trava(pasta):
+    reserva = Reserva()
+
+    def admitir():
+        # Quem espera na fila de admissão não segura a chave
+        assert trava_livre(pasta, 'chave')
+        return reserva
+
+    resultado = executar_uma_vez('chave', lambda recebida: {'reserva': recebida is reserva}, admitir)
+
+    assert resultado == {'reserva': True}
+    assert reserva.liberada
+
+
+def test_sem_capacidade_nao_segura_a_trava(pasta):
+    def admitir():
+        raise CapacidadeEsgotada('Servidor ocupado', tentar_novamente_em=7)
+
+    with pytest.raises(CapacidadeEsgotada):
+        executar_uma_vez('chave', lambda reserva: {'ok': True}, admitir)
+    assert trava_livre(pasta, 'chave')
+
+
+def test_calculo_em_andamento_nao_reserva():
+    calculando, liberar = threading.Event(), threading.Event()
+    admissoes, resultados = [], []
+
+    def admitir():
+        admissoes.append(Reserva())
+        return admissoes[-1]
+
+    def calcular(reserva):
+        calculando.set()
+        liberar.wait(10)
+        return {'valor': 42}
+
+    primeiro = threading.Thread(target=lambda: resultados.append(executar_uma_vez('chave', calcular, admitir)))
+    primeiro.start()
+    calculando.wait(10)
+    # Upload idêntico com o cálculo em andamento: espera o resultado sem reservar
+    segundo = threading.Thread(target=lambda: resultados.append(executar_uma_vez('chave', calcular, admitir)))
+    segundo.start()
+    liberar.set()
+    primeiro.join(10)
+    segundo.join(10)
+
+    assert resultados == [{'valor': 42}, {'valor': 42}]
+    assert len(admissoes) == 1 and admissoes[0].liberada
+
+
+def test_upload_sem_capacidade(app, agenda, monkeypatch):
+    def recusar(quantidade):
+        raise CapacidadeEsgotada('Servidor ocupado', tentar_novamente_em=7)
+    monkeypatch.setattr(analise, 'reservar_memoria', recusar)
+
+    with open(agenda, 'rb') as arquivo:
+        resposta = app.test_client().post('/api/analise/upload', data={'file': (arquivo, 'agenda.xlsx')})
+
+    assert resposta.status_code == 429
+    assert resposta.headers['Retry-After'] == '7'
+    assert not [nome for nome in os.listdir(coalescencia.PASTA_COALESCENCIA) if nome.endswith('.json')]
@@ -0,0 +1,88 @@
+import os
+
+import pandas as pd
+import pytest
+
+from src.routes import analise
+from src.services import estado
+from src.services.leitura import ABA_AGENDA, STATUS_APROVACAO, filtrar_aprovacao, limpar_agenda
+from test_agregados import comparar_agregados
+from test_modos import comparar, processar
+
+INCLUIDAS = 25
+
+
+def alterar_agenda(agenda_df):
+    """
+    Agenda do upload seguinte: saldos alterados, linhas removidas, um
+    fornecedor trocado e linhas de um fornecedor novo no topo (deslocando
+    as posições de todas as demais)
+    """
+    df = agenda_df.copy()
+    df.loc[10:40, 'Saldo Pedido'] = df.loc[10:40, 'Saldo Pedido'] * 2
+    df.loc[200:210, 'Fornecedor'] = 'FORNECEDOR 001 LTDA'
+    df = df.drop(index=range(500, 560))
+
+    novas = agenda_df[agenda_df['Status'] == STATUS_APROVACAO].dropna(subset=['Mercadoria']).head(INCLUIDAS).copy()
+    novas['Carga'] = range(9000, 9000 + INCLUIDAS)
+    novas['Fornecedor'] = 'FORNECEDOR NOVO LTDA'
+    novas['Cobertura Atual'] = 10.0
+    return pd.concat([novas, df], ignore_index=True)
+
+
+def gravar_agenda(df, caminho):
+    df.to_excel(caminho, sheet_name=ABA_AGENDA, index=False)
+    return str(caminho)
+
+
+@pytest.fixture
+def agendas(app, agenda_df, tmp_path):
+    """
+    Análise base salva e a agenda alterada (caminho), com o esperado das alterações
+    """
+    nome, resumo = analise.processar_arquivo_cargas(gravar_agenda(agenda_df, tmp_path / 'base.xlsx'),
+                                                   modo=analise.MODO_MEMORIA, gerar_planilha=False,
+                                                   nome_estado='base')
+    assert nome == 'base', resumo
+
+    atual = alterar_agenda(agenda_df)
+    base_limpa = limpar_agenda(filtrar_aprovacao(agenda_df.copy()))
+    esperado = {
+        'incluidas': INCLUIDAS,
+        'removidas': int(base_limpa.index.isin(range(500, 560)).sum()),
+        'alteradas': int(base_limpa.index.isin(range(10, 41)).sum() + (
+            base_limpa.loc[base_limpa.index.isin(range(200, 211)), 'Fornecedor'] != 'FORNECEDOR 001 LTDA').sum()),
+    }
+    return gravar_agenda(atual, tmp_path / 'atual.xlsx'), esperado
+
+
+def carregar(agenda, **opcoes):
+    carregada = analise.carregar_analise(agenda, tamanho_lote=500, **opcoes)
+    carregada.liberar()
+    return carregada
+
+
+@pytest.mark.parametrize('modo', [analise.MODO_MEMORIA, analise.MODO_LOTES])
+def test_delta_igual_analise_completa(agendas, modo):
+    atual, esperado = agendas
+    completa = carregar(atual, modo=modo)
+
+    incremental = carregar(atual, modo=modo, base='base')
+
+    assert incremental.modo == analise.MODO_DELTA
+    alteracoes = incremental.extras['delta'].resumo()
+    assert {campo: alteracoes[campo] for campo in esperado} == esperado
+    # Tabelas na ordem de exibição (coluna 'ordem' = primeira linha na agenda atual)
+    comparar_agregados(incremental.agregados, completa.agregados)
+
+
+def test_delta_com_base_sem_assinaturas(agendas):
+    atual, esperado = agendas
+    # Estado gravado antes de as assinaturas serem salvas com ele
+    os.remove(os.path.join(estado.PASTA_ESTADOS, 'base', estado.ARQUIVO_ASSINATURAS))
+
+    resumo = processar(atual, modo=analise.MODO_MEMORIA, base='base')
+
+    alteracoes = resumo.pop('alteracoes')
+    assert {campo: alteracoes[campo] for campo in esperado} == esperado
+    comparar(resumo, processar(atual, modo=analise.MODO_MEMORIA))
@@ -0,0 +1,64 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from src.services.agregados import ColunaCodificada
+from src.services.distintos import (
+    CONTAGEM_APROXIMADA, LIMITE_ESPARSO, PRECISAO_HLL, HyperLogLog, contadores_por_grupo, hash_valores
+)
+
+
+def hashes_valores(quantidade, inicio=0):
+    return hash_valores(np.arange(inicio, inicio + quantidade))
+
+
+def test_grupos_pequenos_ficam_esparsos():
+    # 1000 grupos com poucos valores: nenhum aloca registradores
+    linhas = np.repeat(np.arange(1000), 5)
+    coluna = ColunaCodificada(np.arange(len(linhas)) % 7, rotulos=np.arange(7))
+
+    contadores = contadores_por_grupo(linhas, np.arange(1000), coluna, CONTAGEM_APROXIMADA)
+
+    assert len(contadores) == 1000
+    assert all(contador.registradores is None for contador in contadores.values())
+    assert all(contador.estimar() == 5 for contador in contadores.values())
+
+
+def test_grupo_grande_passa_para_registradores():
+    linhas = np.repeat([0, 1], [10, 20000])
+    coluna = ColunaCodificada(np.arange(len(linhas)), rotulos=np.arange(len(linhas)))
+
+    contadores = contadores_por_grupo(linhas, ['pequeno', 'grande'], coluna, CONTAGEM_APROXIMADA)
+
+    assert contadores['pequeno'].estimar() == 10
+    assert contadores['grande'].hashes is None
+    assert len(contadores['grande'].registradores) == 1 << PRECISAO_HLL
+    assert contadores['grande'].estimar() == pytest.approx(20000, rel=0.05)
+
+
+def test_mescla_esparsa_igual_ao_todo():
+    hashes = hashes_valores(3 * LIMITE_ESPARSO)
+    esperado = HyperLogLog.de_hashes(hashes)
+
+    # Partes abaixo do limite que, unidas, passam dele
+    contador = HyperLogLog()
+    for parte in np.array_split(hashes, 6):
+        contador.mesclar(HyperLogLog.de_hashes(parte))
+    # Esparso mesclado em um denso
+    denso = HyperLogLog.de_hashes(hashes[:2 * LIMITE_ESPARSO])
+    denso.mesclar(HyperLogLog.de_hashes(hashes[2 * LIMITE_ESPARSO:]))
+
+    np.testing.assert_array_equal(contador.registradores, esperado.registradores)
+    np.testing.assert_array_equal(denso.registradores, esperado.registradores)
+
+
+def test_estado_antigo_so_com_registradores():
+    denso = HyperLogLog.de_hashes(hashes_valores(2 * LIMITE_ESPARSO))
+    # Objeto gravado antes da representação esparsa: sem o atributo `hashes`
+    antigo = pickle.loads(pickle.dumps(denso))
+    del antigo.__dict__['hashes']
+
+    antigo.mesclar(HyperLogLog.de_hashes(hashes_valores(10, inicio=10**6)))
+
+    assert antigo.estimar() == pytest.approx(2 * LIMITE_ESPARSO + 10, rel=0.05)
@@ -0,0 +1,75 @@
+import os
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from src.routes import analise
+from src.services.conciliacao import COLUNA_NOTA, COLUNA_QUANTIDADE_LISTAGEM
+from src.services.leitura import ABA_AGENDA, STATUS_APROVACAO
+
+
+@pytest.fixture
+def carregada(agenda):
+    carregada = analise.carregar_analise(agenda, analise.MODO_MEMORIA)
+    yield carregada
+    carregada.liberar()
+
+
+def abas(caminho):
+    wb = load_workbook(caminho, read_only=True)
+    try:
+        return wb.sheetnames
+    finally:
+        wb.close()
+
+
+def test_saidas_sem_pos_processamento(carregada):
+    resumo = analise.resumir_analise(carregada)
+    saida = analise.gerar_saidas(carregada)
+
+    try:
+        assert 'qualidade' not in resumo and 'conciliacao' not in resumo
+        assert not any('Qualidade' in aba or 'Concilia' in aba for aba in abas(saida))
+    finally:
+        os.remove(saida)
+
+
+def test_qualidade_isolada(agenda, carregada):
+    analise.verificar_qualidade(carregada)
+
+    resumo = analise.resumir_analise(carregada)
+    saida, esperado = analise.processar_arquivo_cargas(agenda, modo=analise.MODO_MEMORIA)
+    os.remove(saida)
+    assert resumo['qualidade'] == esperado['qualidade']
+    assert set(carregada.extras) == {'qualidade'}
+
+
+def test_conciliacao_isolada(tmp_path, agenda_limpa, carregada):
+    listagem = tmp_path / 'listagem.xlsx'
+    pd.DataFrame({
+        'Pedido': agenda_limpa['Pedido'], 'Cód.': agenda_limpa['Cód.'],
+        COLUNA_QUANTIDADE_LISTAGEM: agenda_limpa['Quantidade<br />Entrega'], COLUNA_NOTA: agenda_limpa[COLUNA_NOTA],
+    }).to_excel(listagem, index=False)
+
+    analise.conciliar_analise(carregada, str(listagem))
+
+    assert analise.resumir_analise(carregada)['conciliacao']['sem_agenda'] == 0
+    assert 'qualidade' not in carregada.extras
+
+
+def test_listagem_invalida_recusada(tmp_path, carregada):
+    listagem = tmp_path / 'listagem.xlsx'
+    pd.DataFrame({'Pedido': [1], 'Cód.': [2]}).to_excel(listagem, index=False)
+
+    with pytest.raises(analise.AnaliseRecusada, match=COLUNA_QUANTIDADE_LISTAGEM):
+        analise.conciliar_analise(carregada, str(listagem))
+
+
+def test_agenda_sem_aprovacao_recusada(tmp_path, agenda_df):
+    caminho = tmp_path / 'agenda.xlsx'
+    agenda_df[agenda_df['Status'] != STATUS_APROVACAO].to_excel(caminho, sheet_name=ABA_AGENDA, index=False)
+
+    with pytest.raises(analise.AnaliseRecusada, match=STATUS_APROVACAO):
+        analise.carregar_analise(str(caminho))
+    assert analise.processar_arquivo_cargas(str(caminho))[0] is None
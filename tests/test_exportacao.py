@@ -0,0 +1,59 @@
+import io
+import os
+import zipfile
+
+import pytest
+from openpyxl import load_workbook
+
+from src.routes import analise
+from src.services import admissao
+from src.services.admissao import CapacidadeEsgotada
+
+
+def analisar(agenda, modo):
+    resultado = analise.executar_analise(agenda, '20260101_120000', modo, 500, None, None,
+                                         analise.PLANILHA_SOB_DEMANDA, analise.PERFIL_COMPLETO)
+    assert 'download_url' in resultado, resultado
+    return resultado['download_url'].rsplit('/', 1)[1]
+
+
+def linhas_detalhe(conteudo):
+    wb = load_workbook(io.BytesIO(conteudo), read_only=True)
+    try:
+        ws = wb.worksheets[-1]
+        return [linha for linha in ws.iter_rows(min_row=analise.MODELO_DETALHES_MERCADORIA.primeira_linha,
+                                                values_only=True) if linha[0] is not None]
+    finally:
+        wb.close()
+
+
+@pytest.mark.parametrize('modo', [analise.MODO_MEMORIA, analise.MODO_LOTES])
+def test_uma_planilha_por_fornecedor(app, agenda, agenda_limpa, modo):
+    arquivo = analisar(agenda, modo)
+
+    resposta = app.test_client().get(f'/api/analise/fornecedores/{arquivo}')
+
+    assert resposta.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(resposta.data)) as pacote:
+        nomes = pacote.namelist()
+        assert nomes == sorted(nomes)
+        assert len(nomes) == agenda_limpa['Fornecedor'].nunique()
+        itens = {nome: len(linhas_detalhe(pacote.read(nome))) for nome in nomes[:3]}
+    with admissao._EstadoBloqueado() as estado:
+        assert not [reserva for reserva in estado.reservas.values() if reserva['pid'] == os.getpid()]
+    for nome, quantidade in itens.items():
+        fornecedor = nome.split('_', 1)[1][:-len('.xlsx')].replace('_', ' ')
+        assert quantidade == (agenda_limpa['Fornecedor'] == fornecedor).sum()
+
+
+def test_exportacao_sem_capacidade(app, agenda, monkeypatch):
+    arquivo = analisar(agenda, analise.MODO_MEMORIA)
+
+    def recusar(quantidade):
+        raise CapacidadeEsgotada('Servidor ocupado', tentar_novamente_em=7)
+    monkeypatch.setattr(analise, 'reservar_memoria', recusar)
+
+    resposta = app.test_client().get(f'/api/analise/fornecedores/{arquivo}')
+
+    assert resposta.status_code == 429
+    assert resposta.headers['Retry-After'] == '7'
@@ -0,0 +1,34 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from src.models.analise import Analise
+from src.routes import analise
+from src.services.agregados import AgregadosParciais
+from src.services.distintos import CONTAGEM_EXATA
+from src.services.estado import existe_estado
+from src.services.historico import registrar_analise
+
+
+def test_nome_repetido_nao_e_engolido(app, agenda_limpa):
+    agregados = AgregadosParciais.de_dataframe(agenda_limpa, CONTAGEM_EXATA)
+    registrar_analise('analise_repetida', agregados)
+
+    with pytest.raises(IntegrityError):
+        registrar_analise('analise_repetida', agregados)
+    assert Analise.query.filter_by(nome='analise_repetida').count() == 1
+
+
+def test_analises_do_mesmo_segundo(app, agenda):
+    # Mesmo timestamp (segundos) e parâmetros diferentes: análises distintas
+    resultados = [
+        analise.executar_analise(agenda, '20260101_120000', analise.MODO_MEMORIA, analise.TAMANHO_LOTE_PADRAO,
+                                 None, None, analise.PLANILHA_SOB_DEMANDA, perfil)
+        for perfil in (analise.PERFIL_EXECUTIVO, analise.PERFIL_FORNECEDOR)
+    ]
+
+    assert all('download_url' in resultado for resultado in resultados), resultados
+    nomes = [analise.identificar_planilha(resultado['download_url'].rsplit('/', 1)[1])[0]
+             for resultado in resultados]
+    assert nomes[0] != nomes[1]
+    assert all(existe_estado(nome) for nome in nomes)
+    assert sorted(a.nome for a in Analise.query.all()) == sorted(nomes)
@@ -0,0 +1,88 @@
+import os
+from functools import partial
+
+import pytest
+
+from src.routes import analise
+from src.services import paralelo
+from src.services.distintos import CONTAGEM_EXATA, CONTAGEM_APROXIMADA
+
+# Rótulos do modo, que mudam de propósito entre os modos
+IGNORADOS = ('modo_processamento', 'contagem_distinta')
+
+
+def processar(agenda, **opcoes):
+    saida, resumo = analise.processar_arquivo_cargas(agenda, **opcoes)
+    assert saida is not None, resumo
+    os.remove(saida)
+    return resumo
+
+
+def comparar(resumo, esperado, aproximados=(), rel=0.05, caminho=''):
+    """
+    Compara dois resumos campo a campo; os campos em `aproximados`
+    (e tudo abaixo deles) admitem erro relativo `rel`
+    """
+    if isinstance(esperado, dict):
+        assert set(resumo) == set(esperado), caminho
+        for chave in esperado:
+            if chave in IGNORADOS:
+                continue
+            proximos = aproximados if chave not in aproximados else ('*',)
+            comparar(resumo[chave], esperado[chave], proximos, rel, f'{caminho}/{chave}')
+    elif isinstance(esperado, list):
+        assert len(resumo) == len(esperado), caminho
+        for i, (valor, valor_esperado) in enumerate(zip(resumo, esperado)):
+            comparar(valor, valor_esperado, aproximados, rel, f'{caminho}[{i}]')
+    elif isinstance(esperado, float):
+        tolerancia = rel if '*' in aproximados else 1e-9
+        assert resumo == pytest.approx(esperado, rel=tolerancia), caminho
+    else:
+        assert resumo == esperado, caminho
+
+
+@pytest.fixture(scope='module')
+def resumo_memoria(agenda):
+    return processar(agenda, modo=analise.MODO_MEMORIA)
+
+
+def test_lotes_igual_memoria(agenda, resumo_memoria, tmp_path, monkeypatch):
+    # Detalhes e estado de qualidade dos lotes vão para a pasta de uploads
+    monkeypatch.setattr(analise, 'UPLOAD_FOLDER', str(tmp_path))
+
+    resumo = processar(agenda, modo=analise.MODO_LOTES, tamanho_lote=500)
+
+    assert resumo['metricas_gerais']['modo_processamento'] == analise.MODO_LOTES
+    # Contagem exata também em lotes, a menos que a aproximada seja pedida
+    assert resumo['metricas_gerais']['contagem_distinta'] == CONTAGEM_EXATA
+    assert list(tmp_path.iterdir()) == []
+    # Quantis por filial vêm de t-digests mesclados entre os lotes
+    comparar(resumo, resumo_memoria, aproximados=('quantis_cobertura',))
+
+
+def test_lotes_contagem_aproximada(agenda, resumo_memoria):
+    resumo = processar(agenda, modo=analise.MODO_LOTES, tamanho_lote=500, contagem=CONTAGEM_APROXIMADA)
+
+    assert resumo['metricas_gerais']['contagem_distinta'] == CONTAGEM_APROXIMADA
+    for campo in ('total_cargas', 'total_pedidos', 'total_codigos'):
+        assert resumo['metricas_gerais'][campo] == pytest.approx(
+            resumo_memoria['metricas_gerais'][campo], rel=0.05)
+
+
+def test_paralelo_igual_memoria(agenda, resumo_memoria, monkeypatch):
+    # Força o pool de processos mesmo com a agenda pequena e um único núcleo
+    monkeypatch.setattr(paralelo, 'MINIMO_LINHAS_PARALELO', 0)
+    monkeypatch.setattr(analise, 'agregar_por_filial', partial(paralelo.agregar_por_filial, processos=2))
+
+    resumo = processar(agenda, modo=analise.MODO_PARALELO)
+
+    assert resumo['metricas_gerais']['modo_processamento'] == analise.MODO_PARALELO
+    comparar(resumo, resumo_memoria)
+
+
+def test_polars_igual_memoria(agenda, resumo_memoria):
+    pytest.importorskip('polars')
+
+    resumo = processar(agenda, modo=analise.MODO_MEMORIA, backend='polars')
+
+    comparar(resumo, resumo_memoria)
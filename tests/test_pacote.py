@@ -0,0 +1,90 @@
+import io
+import shutil
+import struct
+import subprocess
+import zipfile
+
+import numpy as np
+import pytest
+
+from src.services.pacote import TAMANHO_BLOCO, ZipParalelo, compactar_em_fluxo
+
+
+@pytest.fixture
+def membros():
+    rng = np.random.default_rng(7)
+    return {
+        'vazio.txt': b'',
+        'texto.xml': ('<linha>Análise de cargas</linha>\n' * 5000).encode('utf-8'),
+        # Vários blocos, para o dicionário de 32 KB entre blocos ser usado
+        'binario.bin': rng.integers(0, 4, 3 * TAMANHO_BLOCO + 123, dtype=np.uint8).tobytes(),
+        'pasta/planilha.xlsx': bytes(range(256)) * 100,
+    }
+
+
+def conferir(dados, membros):
+    with zipfile.ZipFile(io.BytesIO(dados)) as pacote:
+        assert pacote.testzip() is None
+        assert pacote.namelist() == list(membros)
+        for nome, conteudo in membros.items():
+            assert pacote.read(nome) == conteudo
+
+
+@pytest.mark.parametrize('nivel', [0, 1, 6])
+def test_zip_paralelo_ida_e_volta(tmp_path, membros, nivel):
+    caminho = tmp_path / 'pacote.zip'
+    with ZipParalelo(caminho, nivel=nivel, threads=3) as pacote:
+        for nome, conteudo in membros.items():
+            pacote.writestr(nome, conteudo)
+        assert pacote.namelist() == list(membros)
+
+    conferir(caminho.read_bytes(), membros)
+
+
+def test_zip_paralelo_write(tmp_path, membros):
+    for nome, conteudo in membros.items():
+        (tmp_path / nome.replace('/', '_')).write_bytes(conteudo)
+
+    saida = io.BytesIO()
+    with ZipParalelo(saida) as pacote:
+        for nome in membros:
+            pacote.write(tmp_path / nome.replace('/', '_'), nome)
+
+    conferir(saida.getvalue(), membros)
+
+
+def test_compactar_em_fluxo(membros):
+    pedacos = list(compactar_em_fluxo(membros.items()))
+
+    assert len(pedacos) > 1
+    conferir(b''.join(pedacos), membros)
+
+
+@pytest.mark.parametrize('nivel', [0, 6])
+def test_unzip_aceita(tmp_path, membros, nivel):
+    unzip = shutil.which('unzip')
+    if unzip is None:
+        pytest.skip('unzip não instalado')
+    caminho = tmp_path / 'pacote.zip'
+    with ZipParalelo(caminho, nivel=nivel) as pacote:
+        for nome, conteudo in membros.items():
+            pacote.writestr(nome, conteudo)
+
+    resultado = subprocess.run([unzip, '-t', str(caminho)], capture_output=True, text=True)
+
+    assert resultado.returncode == 0, resultado.stdout + resultado.stderr
+    assert 'No errors detected' in resultado.stdout
+
+
+def test_armazenado_sem_descritor(membros):
+    dados = b''.join(compactar_em_fluxo(membros.items(), nivel=0))
+
+    # Cabeçalhos locais com CRC e tamanhos, e nenhum descritor após os dados
+    with zipfile.ZipFile(io.BytesIO(dados)) as pacote:
+        for info in pacote.infolist():
+            assert info.compress_type == zipfile.ZIP_STORED
+            assert not info.flag_bits & 0x08
+            inicio = info.header_offset
+            crc, comprimido, tamanho = struct.unpack('<III', dados[inicio + 14:inicio + 26])
+            assert (crc, comprimido, tamanho) == (info.CRC, info.file_size, info.file_size)
+    assert b'PK\x07\x08' not in dados
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+from openpyxl import load_workbook
+
+from src.routes import analise
+from src.services.agregados import AgregadosParciais
+from src.services.detalhes import DetalhesMemoria
+from src.services.distintos import CONTAGEM_EXATA
+from src.services.planilha import (ESCRITOR_OPENPYXL, ESCRITOR_XLSXWRITER, LIMITE_TITULO_ABA,
+                                   titulo_continuacao)
+
+
+def aparar(linha):
+    linha = list(linha)
+    while linha and linha[-1] is None:
+        linha.pop()
+    return linha
+
+
+def valores(caminho):
+    """
+    Valores das células de cada aba (sem as células vazias do fim de cada
+    linha, que dependem da dimensão gravada) e sem a linha com a data de geração
+    """
+    wb = load_workbook(caminho, read_only=True)
+    try:
+        abas = {}
+        for ws in wb.worksheets:
+            linhas = [aparar(linha) for linha in ws.iter_rows(values_only=True)]
+            abas[ws.title] = [linha for linha in linhas
+                              if not (linha and isinstance(linha[0], str) and linha[0].startswith('Data:'))]
+        return abas
+    finally:
+        wb.close()
+
+
+def gerar(agenda_limpa, escritor):
+    agregados = AgregadosParciais.de_dataframe(agenda_limpa, CONTAGEM_EXATA)
+    caminho = analise.gerar_excel_analise(agregados, DetalhesMemoria(agenda_limpa),
+                                          perfil=analise.PERFIL_COMPLETO, escritor=escritor)
+    try:
+        return valores(caminho)
+    finally:
+        os.remove(caminho)
+
+
+def test_escritores_mesmas_celulas(agenda_limpa):
+    pytest.importorskip('xlsxwriter')
+
+    openpyxl = gerar(agenda_limpa, ESCRITOR_OPENPYXL)
+    xlsxwriter = gerar(agenda_limpa, ESCRITOR_XLSXWRITER)
+
+    assert list(xlsxwriter) == list(openpyxl)
+    for titulo in openpyxl:
+        assert xlsxwriter[titulo] == openpyxl[titulo], titulo
+
+
+def test_escritor_desconhecido(agenda_limpa):
+    with pytest.raises(ValueError):
+        gerar(agenda_limpa, 'csv')
+
+
+def test_titulo_continuacao():
+    assert titulo_continuacao('Detalhes', 2) == 'Detalhes 2'
+    titulo = titulo_continuacao('Faixas por Fornecedor e Filial X', 12)
+    assert len(titulo) <= LIMITE_TITULO_ABA and titulo.endswith(' 12')
@@ -0,0 +1,42 @@
+import subprocess
+import sys
+
+import pytest
+
+from src.services import progresso as modulo
+from src.services.progresso import MENSAGEM_INTERROMPIDA, Progresso, acompanhar, interromper_em_andamento
+
+
+@pytest.fixture(autouse=True)
+def pasta(tmp_path, monkeypatch):
+    monkeypatch.setattr(modulo, 'PASTA_PROGRESSO', str(tmp_path))
+    monkeypatch.setattr(modulo, 'INTERVALO_VERIFICACAO_DONO', 0)
+    monkeypatch.setattr(modulo, 'TEMPO_MAXIMO_SEM_EVENTOS', 10)
+
+
+def test_processo_encerrado_sem_evento_final():
+    progresso = Progresso()
+    progresso.emitir('leitura', linhas_lidas=10)
+    # Worker que morreu no meio da análise
+    morto = subprocess.Popen([sys.executable, '-c', 'pass'])
+    morto.wait()
+    with open(modulo._caminho_dono(progresso.id), 'w') as arquivo:
+        arquivo.write(str(morto.pid))
+
+    eventos = list(acompanhar(progresso.id))
+
+    assert [evento['evento'] for evento in eventos] == ['leitura', 'erro']
+    assert eventos[-1]['dados'] == {'error': MENSAGEM_INTERROMPIDA}
+
+
+def test_interromper_so_as_em_andamento():
+    concluida, interrompida = Progresso(), Progresso()
+    for progresso in (concluida, interrompida):
+        progresso.assumir()
+    concluida.emitir('concluido', download_url='/x')
+
+    interromper_em_andamento()
+
+    assert [evento['evento'] for evento in acompanhar(concluida.id)] == ['concluido']
+    assert [evento['evento'] for evento in acompanhar(interrompida.id)] == ['erro']
+    assert modulo._em_andamento == {}
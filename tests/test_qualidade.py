@@ -0,0 +1,36 @@
+import pandas as pd
+
+from src.services.qualidade import QualidadeParcial
+
+
+def lotes_com_repeticoes(agenda_limpa, tamanho=400):
+    """
+    Agenda limpa com cópias idênticas e uma chave com conteúdo diferente,
+    em lotes com o índice contínuo (posição no arquivo)
+    """
+    agenda = pd.concat([agenda_limpa, agenda_limpa.iloc[:25]], ignore_index=True)
+    agenda.loc[len(agenda_limpa) + 3, 'Saldo Pedido'] += 1
+    return [agenda.iloc[inicio:inicio + tamanho] for inicio in range(0, len(agenda), tamanho)]
+
+
+def avaliar(qualidade, lotes, descartadas):
+    for numero, lote in enumerate(lotes):
+        qualidade.mesclar(QualidadeParcial.de_dataframe(lote, descartadas if numero == 0 else descartadas.iloc[:0]))
+    try:
+        return qualidade.avaliar(lotes)
+    finally:
+        qualidade.descartar()
+
+
+def test_em_disco_igual_memoria(agenda_df, agenda_limpa, tmp_path):
+    lotes = lotes_com_repeticoes(agenda_limpa)
+    descartadas = agenda_df[agenda_limpa.columns].iloc[:7]
+
+    esperado = avaliar(QualidadeParcial(), lotes, descartadas)
+    relatorio = avaliar(QualidadeParcial(pasta=str(tmp_path)), lotes, descartadas)
+
+    assert esperado.contagens['linhas_duplicadas'] == 24
+    assert esperado.contagens['chaves_repetidas'] >= 1
+    assert relatorio.contagens == esperado.contagens
+    pd.testing.assert_frame_equal(relatorio.ocorrencias, esperado.ocorrencias)
+    assert list(tmp_path.iterdir()) == []
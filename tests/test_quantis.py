@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from src.services.quantis import QUANTIS_COBERTURA, TDigest, digests_por_grupo
+
+
+@pytest.fixture
+def valores():
+    gerador = np.random.default_rng(7)
+    return gerador.lognormal(mean=3.0, sigma=1.0, size=20000)
+
+
+def test_poucos_valores_exatos():
+    valores = np.array([5.0, 1.0, 3.0, np.nan, 2.0])
+    digest = TDigest.de_valores(valores)
+
+    for q in QUANTIS_COBERTURA.values():
+        assert digest.quantil(q) == pytest.approx(np.nanquantile(valores, q))
+
+
+def test_mesclado_perto_do_exato(valores):
+    digest = TDigest()
+    for parte in np.array_split(valores, 37):
+        digest.mesclar(TDigest.de_valores(parte))
+
+    assert digest.total == len(valores)
+    for q in QUANTIS_COBERTURA.values():
+        assert digest.quantil(q) == pytest.approx(np.quantile(valores, q), rel=0.02)
+
+
+def test_digests_por_grupo(valores):
+    grupos = ['a', 'b', 'c']
+    linhas = np.arange(len(valores)) % 3
+
+    digests = digests_por_grupo(linhas, grupos, valores)
+
+    assert set(digests) == set(grupos)
+    for indice, grupo in enumerate(grupos):
+        esperado = np.quantile(valores[linhas == indice], 0.9)
+        assert digests[grupo].quantil(0.9) == pytest.approx(esperado, rel=0.02)
+
+
+def test_vazio():
+    assert np.isnan(TDigest.de_valores([np.nan]).quantil(0.5))
@@ -0,0 +1,50 @@
+import json
+
+import pandas as pd
+import pytest
+
+from src.services.regras import APROVAR, REJEITAR, REVISAR, ConjuntoRegras, aplicar_regras, carregar_regras
+
+
+def test_fornecedores_pelos_limites():
+    tabela = pd.DataFrame({
+        'perc_acima_71': [10.0, 30.0, 60.0, 10.0, 10.0],
+        'cobertura_media': [20.0, 20.0, 20.0, 80.0, 120.0],
+    })
+
+    resultado = aplicar_regras('fornecedores', tabela)
+
+    assert list(resultado['recomendacao']) == [APROVAR, REVISAR, REJEITAR, REVISAR, REJEITAR]
+    assert 'recomendacao' not in tabela
+
+
+def test_faixas_pelo_padrao():
+    tabela = pd.DataFrame({'cobertura_media': [44.0, 44.1, 70.0, 70.1]})
+
+    resultado = aplicar_regras('faixas_valor', tabela)
+
+    assert list(resultado['recomendacao']) == [APROVAR, REVISAR, REVISAR, REJEITAR]
+
+
+def test_tabela_vazia():
+    tabela = pd.DataFrame({'perc_acima_71': pd.Series(dtype=float)})
+
+    assert len(aplicar_regras('filiais', tabela)['recomendacao']) == 0
+
+
+def test_arquivo_substitui_tabela(tmp_path):
+    caminho = tmp_path / 'regras.json'
+    caminho.write_text(json.dumps({'filiais': {'regras': [[REJEITAR, 'perc_acima_71 > 5']], 'padrao': APROVAR}}))
+
+    regras = carregar_regras(str(caminho))
+    tabela = pd.DataFrame({'perc_acima_71': [4.0, 6.0]})
+
+    assert list(aplicar_regras('filiais', tabela, regras)['recomendacao']) == [APROVAR, REJEITAR]
+    # As demais tabelas continuam com as regras padrão
+    assert list(aplicar_regras('pares', tabela.assign(perc_acima_71=[30.0, 60.0]), regras)['recomendacao']) == [
+        REVISAR, REJEITAR]
+
+
+def test_decisao_desconhecida():
+    with pytest.raises(ValueError):
+        ConjuntoRegras([['talvez', 'perc_acima_71 > 1']], APROVAR)